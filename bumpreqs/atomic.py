@@ -0,0 +1,38 @@
+import contextlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, IO, Iterator, Union
+
+
+@contextlib.contextmanager
+def atomic_write(path: Union[str, Path], mode: str = "w") -> Iterator[IO[Any]]:
+    """
+    A temporary file that replaces `path` only once the block finishes without
+    an exception, so readers (and a crash part way) never see half a file.
+
+    An existing file's permissions are kept, and a new one gets the usual
+    ones for the umask.  A symlink is written through, not replaced.
+    """
+    path = Path(os.path.realpath(path))
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        try:
+            shutil.copymode(path, tmp)
+        except FileNotFoundError:
+            # mkstemp's 0600 otherwise
+            os.chmod(tmp, 0o666 & ~_umask())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def _umask() -> int:
+    # The only way to read it is to set it.
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
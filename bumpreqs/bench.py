@@ -0,0 +1,258 @@
+"""
+Benchmarks for the expensive parts of a run, against a local fake index.
+
+    python -m bumpreqs.bench --output results.json
+
+Everything is generated from a seed, so two runs of the same version on the
+same machine should be comparable.  Note that the fake index runs in-process,
+so the fetch numbers include serving the responses.
+"""
+
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import click
+
+from packaging.markers import Marker
+
+from .core import fix
+from .discover import discover, DISCOVER_CONCURRENCY
+from .fake_index import FakeIndex, FakeProject
+from .index import Index, JsonIndex, SimpleIndex
+from .marker_extract import extract_python
+from .vrange import TooComplicated, VersionIntervals
+
+REQUIRES_PYTHON = [
+    None,
+    ">=2.7",
+    ">=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*",
+    ">=3.6",
+    ">=3.7",
+    ">=3.8",
+    ">=3.8,<4",
+    ">=3.9",
+    ">=3.10",
+]
+
+MARKERS = [
+    "",
+    "; python_version < '3.8'",
+    "; python_version >= '3.9'",
+    "; python_version >= '3.7' and python_version < '3.11'",
+    "; sys_platform == 'win32'",
+    "; python_full_version >= '3.8.1' and sys_platform != 'darwin'",
+]
+
+
+def make_projects(
+    count: int, max_releases: int, rng: random.Random
+) -> Dict[str, FakeProject]:
+    projects: Dict[str, FakeProject] = {}
+    for i in range(count):
+        name = f"project-{i}"
+        # Mostly small projects with a long tail of huge ones, like pypi.
+        n = min(max_releases, 1 + int(rng.paretovariate(0.8) * 5))
+        releases: FakeProject = {}
+        for j in range(n):
+            version = f"{j // 100}.{j // 10 % 10}.{j % 10}"
+            if rng.random() < 0.05:
+                version += f"rc{rng.randrange(3)}"
+            # requires_python only ever gets stricter over time
+            rp = REQUIRES_PYTHON[min(len(REQUIRES_PYTHON) - 1, j * 9 // (n + 1))]
+            releases[version] = [
+                (f"{name}-{version}.tar.gz", rp),
+                (f"{name.replace('-', '_')}-{version}-py3-none-any.whl", rp),
+            ]
+        projects[name] = releases
+    return projects
+
+
+def make_tree(root: str, dirs: int, rng: random.Random) -> None:
+    """
+    A monorepo-ish tree of `dirs` directories, ten to a parent, with a
+    requirements file in about one in twenty and some of them gitignored.
+    """
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("build/\n*.egg-info/\n/vendor\n")
+    paths = [root]
+    for i in range(1, dirs):
+        parent = paths[(i - 1) // 10]
+        name = "build" if rng.random() < 0.02 else f"d{i}"
+        path = os.path.join(parent, name)
+        os.makedirs(path, exist_ok=True)
+        paths.append(path)
+        if rng.random() < 0.05:
+            with open(os.path.join(path, "requirements.txt"), "w") as f:
+                f.write("foo==1.0\n")
+        with open(os.path.join(path, "setup.py"), "w"):
+            pass
+
+
+def make_requirements(
+    lines: int, project_names: Sequence[str], rng: random.Random
+) -> str:
+    buf: List[str] = []
+    for i in range(lines):
+        r = rng.random()
+        if r < 0.05:
+            buf.append(f"# section {i}\n")
+        elif r < 0.08:
+            buf.append("\n")
+        else:
+            name = rng.choice(project_names)
+            comment = "  # pinned for reasons" if rng.random() < 0.1 else ""
+            buf.append(f"{name}==0.0.1{rng.choice(MARKERS)}{comment}\n")
+    return "".join(buf)
+
+
+def summarize(samples: List[float], items: int = 1) -> Dict[str, Any]:
+    """Latency percentiles (in ms) per sample and overall items per second."""
+    samples = sorted(samples)
+    total = sum(samples)
+
+    def pct(p: float) -> float:
+        return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 3)
+
+    return {
+        "samples": len(samples),
+        "total_s": round(total, 4),
+        "throughput_per_s": round(items * len(samples) / total, 1) if total else None,
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def _time(func: Callable[[], Any], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def bench_markers(repeat: int) -> Dict[str, Any]:
+    markers = [Marker(m[2:]) for m in MARKERS if m]
+
+    def run() -> None:
+        for m in markers:
+            try:
+                extract_python(m)
+            except TooComplicated:  # pragma: no cover
+                pass
+
+    return summarize(_time(run, repeat), len(markers))
+
+
+def bench_vrange(repeat: int, rng: random.Random) -> Dict[str, Any]:
+    constraint = VersionIntervals.from_str(">=3.7,<3.11")
+    choices = [s for s in REQUIRES_PYTHON if s]
+    specs = [rng.choice(choices) for _ in range(1000)]
+
+    def run() -> None:
+        for s in specs:
+            constraint.intersect(VersionIntervals.from_str(s))
+
+    return summarize(_time(run, repeat), len(specs))
+
+
+def bench_fetch(index: Index, names: Sequence[str]) -> Dict[str, Any]:
+    return summarize([_time(lambda: index.fetch(n), 1)[0] for n in names])
+
+
+def bench_discover(dirs: int, repeat: int, rng: random.Random) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, dirs, rng)
+        with ThreadPoolExecutor(DISCOVER_CONCURRENCY) as executor:
+            return summarize(_time(lambda: discover(root, executor), repeat), dirs)
+
+
+def bench_fix(text: str, index: Index, repeat: int, concurrency: int) -> Dict[str, Any]:
+    return summarize(
+        _time(lambda: fix(text, index=index, concurrency=concurrency), repeat),
+        text.count("\n"),
+    )
+
+
+@click.command()
+@click.option("--seed", default=0, show_default=True)
+@click.option("--projects", default=200, show_default=True)
+@click.option("--max-releases", default=5000, show_default=True)
+@click.option(
+    "--sizes",
+    default="10,100,1000,10000",
+    show_default=True,
+    help="Comma-separated requirements file sizes, in lines",
+)
+@click.option(
+    "--tree-dirs",
+    default=20000,
+    show_default=True,
+    help="Directories in the tree for the discovery benchmark",
+)
+@click.option("--repeat", default=5, show_default=True)
+@click.option("--concurrency", default=8, show_default=True)
+@click.option("--output", type=click.File("w"), help="Write json here [stdout]")
+def main(
+    seed: int,
+    projects: int,
+    max_releases: int,
+    sizes: str,
+    tree_dirs: int,
+    repeat: int,
+    concurrency: int,
+    output: Optional[Any],
+) -> None:
+    rng = random.Random(seed)
+    fake_projects = make_projects(projects, max_releases, rng)
+    names = sorted(fake_projects)
+
+    results: Dict[str, Any] = {
+        "python": sys.version.split()[0],
+        "params": {
+            "seed": seed,
+            "projects": projects,
+            "max_releases": max_releases,
+            "total_releases": sum(len(p) for p in fake_projects.values()),
+            "tree_dirs": tree_dirs,
+            "repeat": repeat,
+            "concurrency": concurrency,
+        },
+        "stages": {},
+    }
+    stages = results["stages"]
+
+    stages["marker_extract"] = bench_markers(repeat)
+    stages["vrange"] = bench_vrange(repeat, rng)
+    stages["discover"] = bench_discover(tree_dirs, repeat, rng)
+
+    with FakeIndex(fake_projects) as fake:
+        indexes = {
+            "json": JsonIndex(fake.url + "/pypi/"),
+            "simple": SimpleIndex(fake.url + "/simple/"),
+        }
+        for fmt, index in indexes.items():
+            stages[f"fetch_{fmt}"] = bench_fetch(index, names)
+
+        for size in (int(s) for s in sizes.split(",")):
+            text = make_requirements(size, names, rng)
+            for fmt, index in indexes.items():
+                stages[f"fix_{fmt}_{size}"] = bench_fix(
+                    text, index, repeat, concurrency
+                )
+
+    click.echo(json.dumps(results, indent=2), file=output)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main(prog_name="python -m bumpreqs.bench")
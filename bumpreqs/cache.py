@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Union
+from urllib.parse import quote
+
+# Entries younger than this are used without contacting the index at all.
+DEFAULT_TTL = 10 * 60
+
+# ...and for a project the index said doesn't exist, which may only be because
+# it hasn't been uploaded yet.
+DEFAULT_MISSING_TTL = 60
+
+# Once the directory grows past this, the least recently written entries go.
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "bumpreqs"
+
+
+class CacheEntry(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    # The entry's mtime; revalidating it just touches the file.
+    fetched_at: float = 0.0
+    # The index's X-PyPI-Last-Serial for the project, when it sends one.
+    serial: Optional[int] = None
+    # The status (404 or 410) if the index said there's no such project, in
+    # which case there's no body.
+    missing: Optional[int] = None
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for a conditional request that revalidates this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class MetadataCache:
+    """
+    A directory of index responses, one file per key.
+
+    Each file is a single line of json holding the validators, followed by the
+    response body verbatim.  Bodies are only ever streamed in and out, never
+    held in memory whole.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl: float = DEFAULT_TTL,
+        max_size: int = DEFAULT_MAX_SIZE,
+        missing_ttl: float = DEFAULT_MISSING_TTL,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    def _filename(self, key: str) -> Path:
+        return self.path / (quote(key, safe="") + ".cache")
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        try:
+            with open(self._filename(key), "rb") as f:
+                header = json.loads(f.readline())
+                mtime = os.fstat(f.fileno()).st_mtime
+            return CacheEntry(
+                header["etag"],
+                header["last_modified"],
+                mtime,
+                header.get("serial"),
+                header.get("missing"),
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        ttl = self.ttl if entry.missing is None else self.missing_ttl
+        return time.time() - entry.fetched_at < ttl
+
+    def read(self, key: str) -> Iterator[bytes]:
+        """The body stored for `key`, in chunks."""
+        with open(self._filename(key), "rb") as f:
+            f.readline()
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    def touch(self, key: str) -> None:
+        """Marks the entry as just fetched, e.g. after a 304."""
+        try:
+            os.utime(self._filename(key))
+        except OSError:  # pragma: no cover
+            pass
+
+    def write(
+        self, key: str, entry: CacheEntry, chunks: Iterable[bytes]
+    ) -> Iterator[bytes]:
+        """
+        Passes `chunks` through while storing them; the entry only appears once
+        they have all been consumed.
+        """
+        header = {
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "serial": entry.serial,
+            "missing": entry.missing,
+        }
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so that concurrent runs never see a
+        # partial entry.
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(header).encode() + b"\n")
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+                size = f.tell()
+            self._replace(tmp, self._filename(key), size)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def _replace(self, tmp: str, filename: Path, size: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            try:
+                self._size -= filename.stat().st_size
+            except OSError:
+                pass
+
+            os.replace(tmp, filename)
+            self._size += size
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self.path.glob("*.cache"))
+
+    def _evict(self) -> None:
+        entries = []
+        for p in self.path.glob("*.cache"):
+            try:
+                st = p.stat()
+            except OSError:  # pragma: no cover
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= self.max_size:
+                break
+            try:
+                p.unlink()
+            except OSError:  # pragma: no cover
+                continue
+            total -= size
+        self._size = total
@@ -0,0 +1,172 @@
+import functools
+import heapq
+import threading
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from packaging.version import InvalidVersion, Version
+
+from .index import first_upload, ReleaseFile, Releases
+from .vrange import overlaps, VersionIntervals
+from .wheels import WheelTargets
+
+PARSE_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_version(s: str) -> Optional[Version]:
+    """
+    Memoized, since "1.0.0" and friends show up in nearly every project; legacy
+    versions that modern packaging can't order come back as None.
+    """
+    try:
+        return Version(s)
+    except InvalidVersion:
+        return None
+
+
+class Matrix(NamedTuple):
+    """
+    Pythons (like "3.9") to pick the latest version for all at once.  With
+    `split`, lines whose answer differs between them become one line per
+    answer, with a python_version marker.
+    """
+
+    pythons: Sequence[str]
+    split: bool = False
+
+
+class _Newest:
+    # Inverts ordering so that heapq's min-heap pops the newest version first.
+    __slots__ = ("version", "files")
+
+    def __init__(self, version: Version, files: List[ReleaseFile]) -> None:
+        self.version = version
+        self.files = files
+
+    def __lt__(self, other: "_Newest") -> bool:
+        return self.version > other.version
+
+
+class Candidates:
+    """
+    The releases of one project that could be chosen under a python constraint,
+    worked out lazily from newest to oldest.
+
+    Only releases that could be the answer have their requires_python (and
+    with `wheels`, their files) checked, so picking the latest of a project
+    with thousands of releases usually only looks at the first few.
+
+    With `as_of` (seconds since the epoch), releases first uploaded after then,
+    or whose upload time the index didn't give, are left out; again only for
+    the releases that could be the answer.
+    """
+
+    def __init__(
+        self,
+        releases: Releases,
+        only_for_python: Optional[VersionIntervals] = None,
+        wheels: Optional[WheelTargets] = None,
+        as_of: Optional[float] = None,
+    ) -> None:
+        self.only_for_python = only_for_python
+        self.wheels = wheels
+        self.as_of = as_of
+        self._heap = []
+        for k, files in releases.items():
+            # Skip older releases that have no archives
+            if not files:
+                continue
+            v = parse_version(k)
+            if v is not None:
+                self._heap.append(_Newest(v, files))
+        heapq.heapify(self._heap)
+        self._ordered: List[Tuple[Version, Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    def _newest_first(self) -> Iterator[Tuple[Version, Optional[str]]]:
+        i = 0
+        while True:
+            with self._lock:
+                while i == len(self._ordered):
+                    if not self._heap:
+                        return
+                    item = heapq.heappop(self._heap)
+                    if self._available(item.files):
+                        self._ordered.append(
+                            (item.version, item.files[0].requires_python)
+                        )
+                entry = self._ordered[i]
+            yield entry
+            i += 1
+
+    def _available(self, files: List[ReleaseFile]) -> bool:
+        if self.wheels is not None and not self.wheels.supports(files):
+            return False
+        if self.as_of is not None:
+            uploaded = first_upload(files)
+            return uploaded is not None and uploaded <= self.as_of
+        return True
+
+    def _compatible(self) -> Iterator[Tuple[Version, Optional[str]]]:
+        for version, requires_python in self._newest_first():
+            if (
+                requires_python
+                and self.only_for_python
+                and not overlaps(self.only_for_python, requires_python)
+            ):
+                continue
+            yield version, requires_python
+
+    def __iter__(self) -> Iterator[Version]:
+        """Compatible versions, newest first."""
+        for version, _ in self._compatible():
+            yield version
+
+    def latest(self, prereleases: Optional[bool] = False) -> Optional[Version]:
+        for version in self:
+            if prereleases or not version.is_prerelease:
+                return version
+        return None
+
+    def latest_for(
+        self, pythons: Sequence[VersionIntervals], prereleases: Optional[bool] = False
+    ) -> Tuple[List[Optional[Version]], Optional[Version]]:
+        """
+        The latest version for each of `pythons`, and the latest that supports
+        all of them, from one sweep that stops as soon as every answer is in.
+        """
+        answers: List[Optional[Version]] = [None] * len(pythons)
+        common: Optional[Version] = None
+        missing = len(pythons)
+        for version, requires_python in self._compatible():
+            if version.is_prerelease and not prereleases:
+                continue
+            supported = [
+                not requires_python or overlaps(p, requires_python) for p in pythons
+            ]
+            for i, ok in enumerate(supported):
+                if ok and answers[i] is None:
+                    answers[i] = version
+                    missing -= 1
+            if common is None and all(supported):
+                common = version
+            if not missing and common is not None:
+                break
+        return answers, common
+
+    def representatives(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        For each distinct requires_python, the newest release and the newest
+        final release.  Whatever python or prerelease policy is asked about
+        later, the answer is among these, so they're enough to keep.
+        """
+        seen: Set[Tuple[Optional[str], bool]] = set()
+        kept = []
+        for version, requires_python in self._newest_first():
+            keys = {(requires_python, True)}
+            if not version.is_prerelease:
+                keys.add((requires_python, False))
+            if not keys <= seen:
+                seen |= keys
+                kept.append((str(version), requires_python))
+        return kept
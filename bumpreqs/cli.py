@@ -1,18 +1,305 @@
+import contextlib
+import datetime
+import functools
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
 
 import click
-from moreorless.click import echo_color_unified_diff
 
-from .core import fix
+from .atomic import atomic_write
+from .cache import default_cache_dir, DEFAULT_TTL
+from .candidates import Matrix
+from .client import DEFAULT_CONCURRENCY, DEFAULT_RETRIES, DEFAULT_TIMEOUT
+from .daemon import Daemon, DaemonError, default_socket_path, fix_remote
+from .discover import DEFAULT_PATTERNS, discover, DISCOVER_CONCURRENCY
+from .includes import read_tree
+from .index import Index, INDEX_FORMATS, IndexOptions, Releases
+from .multiindex import POLICIES
+from .snapshot import SnapshotIndex, write_snapshot
+from .state import IncrementalState
+from .stats import Stats, timed
+from .wheels import WheelTargets
 
+# `core` (and through it packaging's requirement and marker parsers) and
+# moreorless are imported only where they're used, and requests only once
+# there's a request to make, so that `--help` and runs that hand everything to
+# a daemon start quickly.  See tests/startup.py.
+if TYPE_CHECKING:
+    from .core import LineResult
 
-@click.command()
+
+class _DefaultGroup(click.Group):
+    """
+    Runs `fix` when the first argument isn't the name of a subcommand, so that
+    `bumpreqs requirements.txt` keeps working.
+    """
+
+    def parse_args(self, ctx: click.Context, args: List[str]) -> List[str]:
+        if not args or (args[0] not in self.commands and args[0] != "--help"):
+            args = ["fix", *args]
+        return super().parse_args(ctx, args)
+
+
+def _check_pythons(
+    ctx: click.Context, param: click.Parameter, value: Tuple[str, ...]
+) -> Tuple[str, ...]:
+    for python in value:
+        if not re.fullmatch(r"\d+\.\d+", python):
+            raise click.BadParameter(f"{python!r} isn't a python like 3.12")
+    return value
+
+
+_INDEX_OPTIONS = [
+    click.option(
+        "--concurrency",
+        type=click.IntRange(min=1),
+        default=DEFAULT_CONCURRENCY,
+        show_default=True,
+        help="Maximum number of metadata requests in flight",
+    ),
+    click.option(
+        "--cache-dir",
+        type=click.Path(file_okay=False),
+        default=default_cache_dir,
+        show_default="~/.cache/bumpreqs",
+        help="Where to keep index responses between runs",
+    ),
+    click.option("--no-cache", is_flag=True, help="Always fetch from the index"),
+    click.option(
+        "--index-url",
+        help="Base url of the index, e.g. a devpi mirror [default: pypi]",
+    ),
+    click.option(
+        "--extra-index-url",
+        "extra_index_urls",
+        multiple=True,
+        help="Another index to look in too (repeat for several)",
+    ),
+    click.option(
+        "--index-policy",
+        type=click.Choice(POLICIES),
+        default="first",
+        show_default=True,
+        help="Take the first index, in order, that has a project, "
+        "or merge what they all have",
+    ),
+    click.option(
+        "--index-budget",
+        type=click.FloatRange(min=0, min_open=True),
+        help="Seconds an index gets to answer before it's skipped for a project",
+    ),
+    click.option(
+        "--pin-index",
+        "index_pins",
+        multiple=True,
+        metavar="PROJECT=URL",
+        help="Only look for PROJECT on the index at URL (repeat for several)",
+    ),
+    click.option(
+        "--index-format",
+        type=click.Choice(sorted(INDEX_FORMATS)),
+        default="json",
+        show_default=True,
+        help="json is /pypi/<name>/json, simple is the PEP 691 simple api",
+    ),
+    click.option(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT[1],
+        show_default=True,
+        help="Seconds to wait on a slow index response",
+    ),
+    click.option(
+        "--retries",
+        type=click.IntRange(min=0),
+        default=DEFAULT_RETRIES,
+        show_default=True,
+        help="Retries for timeouts, 429 and 5xx",
+    ),
+    click.option(
+        "--max-rate",
+        type=click.FloatRange(min=0, min_open=True),
+        help="Maximum requests per second to the index",
+    ),
+]
+
+
+def index_options(func: Callable[..., None]) -> Callable[..., None]:
+    """
+    Adds the options that pick and tune the index, and passes the command them
+    gathered up as `index_options` instead.
+    """
+
+    @functools.wraps(func)
+    def wrapper(
+        *,
+        concurrency: int,
+        cache_dir: str,
+        no_cache: bool,
+        index_url: Optional[str],
+        extra_index_urls: Tuple[str, ...],
+        index_policy: str,
+        index_budget: Optional[float],
+        index_pins: Tuple[str, ...],
+        index_format: str,
+        timeout: float,
+        retries: int,
+        max_rate: Optional[float],
+        **kwargs: Any,
+    ) -> None:
+        urls = {
+            url.rstrip("/")
+            for url in (index_url or INDEX_FORMATS[index_format].default_url,)
+            + extra_index_urls
+        }
+        pins = []
+        for pin in index_pins:
+            name, _, url = pin.partition("=")
+            if not name or url.rstrip("/") not in urls:
+                raise click.BadParameter(
+                    f"{pin!r} isn't PROJECT= the --index-url or an --extra-index-url",
+                    param_hint="--pin-index",
+                )
+            pins.append((name, url))
+        options = IndexOptions(
+            concurrency=concurrency,
+            # Absolute, so that it means the same to a daemon in another cwd
+            cache_dir=None if no_cache else os.path.abspath(cache_dir),
+            index_url=index_url,
+            index_format=index_format,
+            timeout=timeout,
+            retries=retries,
+            max_rate=max_rate,
+            extra_index_urls=extra_index_urls,
+            index_policy=index_policy,
+            index_budget=index_budget,
+            index_pins=tuple(pins),
+        )
+        func(index_options=options, **kwargs)
+
+    for option in reversed(_INDEX_OPTIONS):
+        wrapper = option(wrapper)
+    return wrapper
+
+
+@click.group(cls=_DefaultGroup)
+def main() -> None:
+    pass
+
+
+@main.command("fix")
 @click.option("--diff", is_flag=True, default=None)
 @click.option("--write", is_flag=True)
+@click.option(
+    "--follow-includes",
+    is_flag=True,
+    help="Also bump every file reached through -r and -c",
+)
+@click.option(
+    "-R",
+    "--recursive",
+    is_flag=True,
+    help="Look for requirements files under any directories given",
+)
+@click.option(
+    "--pattern",
+    "patterns",
+    multiple=True,
+    default=DEFAULT_PATTERNS,
+    show_default=True,
+    help="File names to look for with --recursive (repeat for several)",
+)
+@click.option(
+    "--python",
+    "pythons",
+    multiple=True,
+    callback=_check_pythons,
+    help="Pick versions that support this python (repeat for several)",
+)
+@click.option(
+    "--split-markers",
+    is_flag=True,
+    help="With several --python, split lines whose answers differ by marker",
+)
+@click.option(
+    "--require-wheel",
+    "wheel_platforms",
+    metavar="PLATFORM",
+    multiple=True,
+    help=(
+        "Only pick versions with a wheel for this platform, e.g."
+        " manylinux_2_28_aarch64, and each --python (repeat for several)"
+    ),
+)
+@click.option(
+    "--as-of",
+    type=click.DateTime(),
+    help="Only pick versions uploaded by this date (or date and time), in UTC",
+)
+@index_options
+@click.option(
+    "--snapshot",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Read versions from this snapshot file instead of the index",
+)
+@click.option(
+    "--state",
+    "state_file",
+    type=click.Path(dir_okay=False),
+    help="Remember what was chosen here, and skip projects unchanged since",
+)
+@click.option(
+    "--stats", "show_stats", is_flag=True, help="Print timings and cache stats"
+)
+@click.option(
+    "--stats-json",
+    type=click.Path(dir_okay=False),
+    help="Write timings and cache stats as json to this file",
+)
+@click.option(
+    "--results-json",
+    type=click.Path(dir_okay=False),
+    help="Write what happened to each requirement line, and why, to this file",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=default_socket_path,
+    show_default="$XDG_RUNTIME_DIR/bumpreqs.sock",
+    help="Where to find a running `bumpreqs serve`",
+)
+@click.option("--no-daemon", is_flag=True, help="Never hand the work to a daemon")
 @click.argument("filenames", nargs=-1)
-def main(diff: Optional[bool], write: bool, filenames: List[str]) -> None:
+def fix_command(
+    diff: Optional[bool],
+    write: bool,
+    follow_includes: bool,
+    recursive: bool,
+    patterns: List[str],
+    pythons: List[str],
+    split_markers: bool,
+    wheel_platforms: List[str],
+    as_of: Optional[datetime.datetime],
+    index_options: IndexOptions,
+    snapshot: Optional[str],
+    state_file: Optional[str],
+    show_stats: bool,
+    stats_json: Optional[str],
+    results_json: Optional[str],
+    socket_path: str,
+    no_daemon: bool,
+    filenames: List[str],
+) -> None:
+    """
+    Bump the pins in requirements files (the default command).
+    """
     if not filenames:
         click.echo("Provide filenames")
         return
@@ -20,15 +307,302 @@ def main(diff: Optional[bool], write: bool, filenames: List[str]) -> None:
     if diff is None and not write:
         diff = True
 
-    for f in filenames:
-        print(f)
-        old_text = Path(f).read_text()
-        new_text = fix(old_text)
+    if split_markers and not pythons:
+        raise click.UsageError("--split-markers needs at least one --python")
+    matrix = Matrix(pythons, split_markers) if pythons else None
+
+    wheels = None
+    if wheel_platforms:
+        if snapshot or state_file:
+            raise click.UsageError(
+                "--require-wheel needs filenames, which --snapshot and --state"
+                " don't keep"
+            )
+        wheels = WheelTargets(
+            wheel_platforms, pythons or ["{}.{}".format(*sys.version_info)]
+        )
+
+    cutoff = None
+    if as_of is not None:
+        if state_file:
+            raise click.UsageError(
+                "--as-of needs upload times, which --state doesn't keep"
+            )
+        cutoff = as_of.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+    index = SnapshotIndex(snapshot) if snapshot else index_options.make_index()
+    state = IncrementalState(state_file) if state_file else None
+    collector = Stats() if show_stats or stats_json else None
+
+    # A daemon has its own index and no view of local state or stats, and only
+    # answers with text, so it's only asked when none of those are in play.
+    remote = None
+    if not (
+        no_daemon
+        or snapshot
+        or state
+        or collector
+        or results_json
+        or wheels
+        or cutoff is not None
+    ) and os.path.exists(socket_path):
+        remote = functools.partial(
+            fix_remote, socket_path, options=index_options, matrix=matrix
+        )
+
+    with collector or contextlib.nullcontext():
+        with timed("total"):
+            if recursive:
+                with timed("discover"):
+                    filenames = _discover(filenames, patterns)
+                if not filenames:
+                    click.echo("No requirements files found", err=True)
+            _run(
+                filenames,
+                diff,
+                write,
+                index_options.concurrency,
+                index,
+                state,
+                follow_includes,
+                matrix,
+                remote,
+                results_json,
+                wheels,
+                cutoff,
+            )
+
+    if state:
+        state.save()
+
+    if collector and show_stats:
+        click.echo(collector.summary(), err=True)
+    if collector and stats_json:
+        Path(stats_json).write_text(json.dumps(collector.to_json(), indent=2))
+
+
+@main.command("snapshot")
+@index_options
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    required=True,
+    help="Snapshot file to write",
+)
+@click.option(
+    "-r",
+    "--requirements",
+    "requirements_files",
+    type=click.Path(exists=True, dir_okay=False),
+    multiple=True,
+    help="Include every project named in this requirements file",
+)
+@click.argument("projects", nargs=-1)
+def snapshot_command(
+    index_options: IndexOptions,
+    output: str,
+    requirements_files: List[str],
+    projects: List[str],
+) -> None:
+    """
+    Save the versions of some projects to a file, for `fix --snapshot`.
+    """
+    from .core import requirement_names
+
+    names = list(projects)
+    for filename in requirements_files:
+        names.extend(requirement_names(Path(filename).read_text()))
+    if not names:
+        click.echo("Provide projects or requirements files")
+        return
+
+    names = list(dict.fromkeys(names))
+    index = index_options.make_index()
+    fetched: Dict[str, Releases] = {}
+    with ThreadPoolExecutor(max_workers=index_options.concurrency) as executor:
+        futures = {name: executor.submit(index.fetch, name) for name in names}
+        for name, future in futures.items():
+            try:
+                fetched[name] = future.result()
+            except Exception as e:
+                click.echo(f"Skipping {name}: {e!r}", err=True)
+
+    write_snapshot(output, fetched)
+    click.echo(f"Wrote {len(fetched)} projects to {output}")
+
+
+@main.command("serve")
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=default_socket_path,
+    show_default="$XDG_RUNTIME_DIR/bumpreqs.sock",
+    help="Where to listen",
+)
+@click.option(
+    "--ttl",
+    type=click.FloatRange(min=0),
+    default=DEFAULT_TTL,
+    show_default=True,
+    help="Seconds to trust a project's versions before asking the index again",
+)
+def serve_command(socket_path: str, ttl: float) -> None:
+    """
+    Keep indexes warm in memory and do `fix` runs for other invocations.
+    """
+    try:
+        daemon = Daemon(socket_path, ttl)
+    except DaemonError as e:
+        raise click.ClickException(str(e))
+    with daemon:
+        click.echo(f"Serving on {socket_path}", err=True)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def _run(
+    filenames: List[str],
+    diff: Optional[bool],
+    write: bool,
+    concurrency: int,
+    index: Index,
+    state: Optional[IncrementalState] = None,
+    follow_includes: bool = False,
+    matrix: Optional[Matrix] = None,
+    remote: Optional[Callable[[Dict[str, str]], Dict[str, str]]] = None,
+    results_json: Optional[str] = None,
+    wheels: Optional[WheelTargets] = None,
+    as_of: Optional[float] = None,
+) -> None:
+    if (
+        write
+        and not diff
+        and not follow_includes
+        and remote is None
+        and results_json is None
+    ):
+        # Nothing needs a whole file at once, so stream each one through.
+        with timed("rewrite"):
+            _rewrite_all(filenames, concurrency, index, state, matrix, wheels, as_of)
+        for f in filenames:
+            print(f)
+        return
+
+    from moreorless import unified_diff
+    from moreorless.click import echo_color_precomputed_diff
+
+    # One planning pass over every file, so a project that appears in many of
+    # them is still only fetched once.
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        with timed("read"):
+            if follow_includes:
+                old_texts, _ = read_tree(filenames, executor)
+            else:
+                old_texts = dict(
+                    zip(
+                        filenames,
+                        executor.map(lambda f: Path(f).read_text(), filenames),
+                    )
+                )
+        new_texts = None
+        if remote:
+            try:
+                new_texts = remote(old_texts)
+            except (OSError, DaemonError) as e:
+                click.echo(f"Daemon failed, running in-process: {e!r}", err=True)
+        if new_texts is None:
+            from .core import bump_many
+
+            results = bump_many(
+                old_texts,
+                concurrency=concurrency,
+                index=index,
+                state=state,
+                matrix=matrix,
+                wheels=wheels,
+                as_of=as_of,
+            )
+            new_texts = {
+                f: "".join(r.text for r in lines) for f, lines in results.items()
+            }
+            if results_json:
+                _write_results(results_json, results)
+
+        diffs = []
         if diff:
-            echo_color_unified_diff(old_text, new_text, f)
+            with timed("diff"):
+                diffs = list(
+                    executor.map(
+                        lambda f: unified_diff(old_texts[f], new_texts[f], f),
+                        old_texts,
+                    )
+                )
         if write:
-            Path(f).write_text(new_text)
+            with timed("write"):
+                list(executor.map(lambda f: _write(f, new_texts[f]), old_texts))
+
+    for i, f in enumerate(old_texts):
+        print(f)
+        if diff:
+            echo_color_precomputed_diff(diffs[i])
+
+
+def _write_results(filename: str, results: Dict[str, List["LineResult"]]) -> None:
+    # Only the lines that name a project or were skipped; blank lines and
+    # comments would just be noise.
+    Path(filename).write_text(
+        json.dumps(
+            {
+                f: [r.to_json() for r in lines if r.project or r.skipped]
+                for f, lines in results.items()
+            },
+            indent=2,
+        )
+    )
+
+
+def _discover(paths: List[str], patterns: List[str]) -> List[str]:
+    found = []
+    with ThreadPoolExecutor(max_workers=DISCOVER_CONCURRENCY) as executor:
+        for path in paths:
+            if os.path.isdir(path):
+                found.extend(discover(path, executor, patterns))
+            else:
+                found.append(path)
+    # The same file could be reached from two of the paths given.
+    return list(dict.fromkeys(found))
+
+
+def _write(filename: str, text: str) -> None:
+    with atomic_write(filename) as f:
+        f.write(text)
+
+
+def _rewrite_all(
+    filenames: List[str],
+    concurrency: int,
+    index: Index,
+    state: Optional[IncrementalState],
+    matrix: Optional[Matrix],
+    wheels: Optional[WheelTargets],
+    as_of: Optional[float],
+) -> None:
+    from .core import Resolver
+
+    # The files share a resolver, so each project is still only fetched once.
+    with Resolver(concurrency, index, state, wheels, as_of) as resolver:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+            def rewrite(filename: str) -> None:
+                with open(filename) as src, atomic_write(filename) as dst:
+                    dst.writelines(resolver.fix_iter(src, matrix=matrix))
+
+            list(executor.map(rewrite, filenames))
 
 
-if __name__ == "__main__":
+if __name__ == "__main__":  # pragma: no cover
     main()
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import email.utils
+import functools
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, TYPE_CHECKING
+
+from . import stats
+
+if TYPE_CHECKING:
+    import requests
+
+LOG = logging.getLogger(__name__)
+
+# Number of metadata requests allowed in flight at once.
+DEFAULT_CONCURRENCY = 8
+
+# (connect, read) in seconds
+DEFAULT_TIMEOUT = (5.0, 30.0)
+DEFAULT_RETRIES = 3
+DEFAULT_POOL_SIZE = 10
+
+# Statuses that mean "try again later" rather than "this will never work".
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Backoff is exponential from BACKOFF_BASE, with full jitter, and never more
+# than BACKOFF_MAX even if the server's Retry-After asks for longer.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# After this many requests in a row fail (retries and all), the rest fail at
+# once for BREAKER_COOLDOWN seconds, rather than each waiting out the same
+# timeouts.
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+
+class IndexUnavailable(Exception):
+    """
+    Raised instead of making a request while a client's circuit breaker is
+    open.
+    """
+
+
+class RateLimiter:
+    """
+    A token bucket: up to `burst` requests at once, refilling at `rate` per
+    second.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(self.burst)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            # Going negative reserves a future token, so waiters queue up in
+            # order rather than all waking at once.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self._sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive failed requests, and once there are `threshold` of them
+    refuses any more for `cooldown` seconds.  After that a single request is
+    let through to see whether things are better; the rest keep failing until
+    it's answered.
+    """
+
+    def __init__(
+        self,
+        threshold: int = BREAKER_THRESHOLD,
+        cooldown: float = BREAKER_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self, url: str) -> None:
+        """Raises `IndexUnavailable` if a request to `url` shouldn't be made."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if not self._probing and self._clock() - self._opened_at >= self.cooldown:
+                self._probing = True
+                return
+            failures = self._failures
+        raise IndexUnavailable(f"Not requesting {url} after {failures} failures")
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._failures >= self.threshold:
+                if self._opened_at is None:
+                    LOG.warning(
+                        "%d requests in a row failed; pausing for %.0fs",
+                        self._failures,
+                        self.cooldown,
+                    )
+                self._opened_at = self._clock()
+
+
+class IndexClient:
+    """
+    The one place that talks http to an index.
+
+    Holds a keep-alive connection pool, and retries timeouts, connection errors
+    and 429/5xx responses with jittered exponential backoff (honoring
+    Retry-After), optionally under a request rate cap.  Requests that still
+    fail trip a `CircuitBreaker`, so an index that is down costs a few
+    timeouts rather than one per project.
+    """
+
+    def __init__(
+        self,
+        timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        max_rate: Optional[float] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        sleep: Callable[[float], None] = time.sleep,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = RateLimiter(max_rate, sleep=sleep) if max_rate else None
+        self._sleep = sleep
+        self._pool_size = pool_size
+        self._session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Made on first use, since requests is slow to import and plenty of runs
+        never make a request.
+        """
+        with self._lock:
+            if self._session is None:
+                import requests.adapters
+
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=self._pool_size, pool_maxsize=self._pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def get(
+        self, url: str, headers: Optional[Dict[str, str]] = None
+    ) -> requests.Response:
+        """
+        A streaming GET; the caller is responsible for closing the response.
+        Statuses that are not retryable (or retries that ran out) are returned
+        rather than raised, and `IndexUnavailable` is raised without trying
+        while the breaker is open.
+        """
+        return self._request(self.session.get, url, headers)
+
+    def post(
+        self, url: str, data: bytes, headers: Optional[Dict[str, str]] = None
+    ) -> requests.Response:
+        """Like `get`, for the few index apis that need a request body."""
+        return self._request(self.session.post, url, headers, data=data)
+
+    def _request(
+        self,
+        send: Callable[..., requests.Response],
+        url: str,
+        headers: Optional[Dict[str, str]],
+        **kwargs: Any,
+    ) -> requests.Response:
+        self.breaker.check(url)
+        ok = False
+        try:
+            resp = self._retrying(send, url, headers, **kwargs)
+            # Anything else, even a 404, means the index is up and answering.
+            ok = resp.status_code not in RETRY_STATUSES
+            return resp
+        finally:
+            self.breaker.record(ok)
+
+    def _retrying(
+        self,
+        send: Callable[..., requests.Response],
+        url: str,
+        headers: Optional[Dict[str, str]],
+        **kwargs: Any,
+    ) -> requests.Response:
+        import requests
+
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                resp = send(
+                    url,
+                    headers=headers or {},
+                    stream=True,
+                    timeout=self.timeout,
+                    **kwargs,
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.retries:
+                    raise
+                delay = self._backoff(attempt)
+                LOG.info("Retrying %s in %.1fs after %r", url, delay, e)
+                stats.emit("retry", url=url, reason=repr(e))
+            else:
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return resp
+                retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+                if retry_after is not None:
+                    delay = min(retry_after, BACKOFF_MAX)
+                else:
+                    delay = self._backoff(attempt)
+                resp.close()
+                LOG.info(
+                    "Retrying %s in %.1fs after status %s",
+                    url,
+                    delay,
+                    resp.status_code,
+                )
+                stats.emit("retry", url=url, reason=resp.status_code)
+
+            self._sleep(delay)
+            attempt += 1
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+@functools.lru_cache(maxsize=None)
+def default_client() -> IndexClient:
+    """Shared by every index that isn't given its own client."""
+    return IndexClient()
@@ -1,118 +1,601 @@
+import copy
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
-from typing import List, Optional
-
-import requests
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
+from packaging.markers import Marker
 from packaging.requirements import Requirement
 from packaging.specifiers import SpecifierSet
-from packaging.version import parse as parse_version, Version
+from packaging.utils import canonicalize_name
+from packaging.version import Version
 
+from . import stats
+from .candidates import Candidates, Matrix
+from .client import DEFAULT_CONCURRENCY, IndexUnavailable
+from .index import Index, JsonIndex, ReleaseFile, Releases
 from .marker_extract import extract_python
+from .state import IncrementalState
 
-from .vrange import TooComplicated, VersionIntervals
+from .vrange import compile_specifier, TooComplicated, VersionIntervals
+from .wheels import WheelTargets
 
 LOG = logging.getLogger(__name__)
 
+# How many lines `fix_iter` reads ahead of the oldest one it hasn't emitted.
+STREAM_WINDOW = 10000
 
-def fix(text: str, force: Optional[bool] = False) -> str:
-    new_lines = []
-    for line in text.splitlines(True):
-        # This is an overly simplistic parser for requirements files, see
-        # pip/req/req_file.py for the real one.
-        (value, _, comment) = line.strip().partition("#")
-        right_whitespace = value[len(value.rstrip()) :]
+FetchKey = Tuple[str, Optional[VersionIntervals]]
+K = TypeVar("K")
 
-        # See COMMENT_RE in pip/req/req_file.py
-        if value and comment and not right_whitespace:
-            value = line.strip()
-            comment = ""
-        else:
-            value = value.rstrip()
 
-        if not value:
-            new_lines.append(line)
-            continue
+class LineResult(NamedTuple):
+    """
+    What became of one line of a document.
+    """
 
-        if value.startswith("-") or "://" in value:
-            # Skip git, etc
-            LOG.warning("Not bumping option/url line for %r", value)
-            new_lines.append(line)
-            continue
+    # 1-based
+    lineno: int
+    # None for lines that aren't requirements at all
+    project: Optional[str]
+    # The specifier as it was, e.g. "==1.0", or "" for none
+    old: str
+    # The version(s) now pinned: one, or one per python range with
+    # `Matrix.split`, or none when the line was left alone.
+    new: Tuple[str, ...]
+    # Why a requirement (or option) line was left alone
+    skipped: Optional[str]
+    # How long looking up the project took, shared by every line naming it
+    seconds: float
+    line: str
+    # What replaces `line`; several lines when split by python version
+    text: str
 
-        req = Requirement(value)
-        assert not req.url
+    @property
+    def changed(self) -> bool:
+        return self.text != self.line
 
-        try:
-            only_on_python = extract_python(req.marker)
-        except TooComplicated:
-            LOG.warning("Python version comparison too complex for %r", value)
-            new_lines.append(line)
-            continue
+    def to_json(self) -> Dict[str, Any]:
+        """Everything but the text itself."""
+        return {
+            "lineno": self.lineno,
+            "project": self.project,
+            "old": self.old,
+            "new": list(self.new),
+            "skipped": self.skipped,
+            "seconds": round(self.seconds, 6),
+            "changed": self.changed,
+        }
 
-        # Only operate on `project` and `project==ver` for now.
-        # Skip non-concrete specifiers in the hackiest way possible.
-        if "==" not in line and any(x in line for x in "<>=~") and not force:
-            new_lines.append(line)
-            continue
 
+class _Line(NamedTuple):
+    line: str
+    # The remaining fields are only set for requirement lines.
+    req: Optional[Requirement] = None
+    value: str = ""
+    comment: str = ""
+    right_whitespace: str = ""
+    only_on_python: Optional[VersionIntervals] = None
+    skipped: Optional[str] = None
+
+    @property
+    def lookup(self) -> bool:
+        """Whether the line's project needs looking up."""
+        return self.req is not None and self.skipped is None
+
+    @property
+    def key(self) -> FetchKey:
+        assert self.req is not None
+        return (canonicalize_name(self.req.name), self.only_on_python)
+
+
+def fix(
+    text: str,
+    force: Optional[bool] = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    index: Optional[Index] = None,
+    state: Optional[IncrementalState] = None,
+    matrix: Optional[Matrix] = None,
+    wheels: Optional[WheelTargets] = None,
+    as_of: Optional[float] = None,
+) -> str:
+    return fix_many(
+        {"": text}, force, concurrency, index, state, matrix, wheels, as_of
+    )[""]
+
+
+def fix_many(
+    texts: Mapping[K, str],
+    force: Optional[bool] = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    index: Optional[Index] = None,
+    state: Optional[IncrementalState] = None,
+    matrix: Optional[Matrix] = None,
+    wheels: Optional[WheelTargets] = None,
+    as_of: Optional[float] = None,
+) -> Dict[K, str]:
+    """
+    Like `fix` but for several documents at once, keyed by e.g. filename.
+
+    Each project is only fetched once no matter how many of the documents
+    mention it, and the documents are then rewritten in parallel.
+
+    With a `state`, projects that the index's changelog says are unchanged
+    since the state was recorded aren't fetched at all, and what was fetched
+    is recorded in it (saving it is up to the caller).
+
+    With a `matrix`, each pin is the latest that supports all of its pythons
+    (see `Matrix`), and with `wheels`, the latest that has wheels for all of
+    its targets.  With `as_of` (seconds since the epoch), it's the latest that
+    had been uploaded by then.
+    """
+    return {
+        k: "".join(r.text for r in results)
+        for k, results in bump_many(
+            texts, force, concurrency, index, state, matrix, wheels, as_of
+        ).items()
+    }
+
+
+def bump_many(
+    texts: Mapping[K, str],
+    force: Optional[bool] = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    index: Optional[Index] = None,
+    state: Optional[IncrementalState] = None,
+    matrix: Optional[Matrix] = None,
+    wheels: Optional[WheelTargets] = None,
+    as_of: Optional[float] = None,
+) -> Dict[K, List[LineResult]]:
+    """
+    Like `fix_many`, but says what happened to each line rather than just
+    giving the new text, which is the `text` of each line's result joined.
+    """
+    with Resolver(concurrency, index, state, wheels, as_of) as resolver:
+        # Each document's fetches start as soon as it's parsed, so they overlap
+        # parsing the rest.
+        parsed = {}
+        with stats.timed("parse"):
+            for k, text in texts.items():
+                parsed[k] = _parse(text, force)
+                for line in parsed[k]:
+                    if line.lookup:
+                        resolver.submit(line)
+
+        with stats.timed("fetch"):
+            wait(resolver.futures.values())
+
+        with stats.timed("render"):
+            results = dict(
+                zip(
+                    parsed,
+                    resolver.executor.map(
+                        lambda lines: resolver.resolve_all(lines, matrix),
+                        parsed.values(),
+                    ),
+                )
+            )
+
+    return results
+
+
+def fix_iter(
+    lines: Iterable[str],
+    force: Optional[bool] = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    index: Optional[Index] = None,
+    state: Optional[IncrementalState] = None,
+    matrix: Optional[Matrix] = None,
+    wheels: Optional[WheelTargets] = None,
+    as_of: Optional[float] = None,
+) -> Iterator[str]:
+    """
+    Like `fix` but a line at a time, e.g. from an open file.
+
+    A project's fetch starts as soon as its first line is read, and each line
+    comes back (in order) as soon as its answer is in, so only a window of
+    lines is ever held in memory.
+    """
+    with Resolver(concurrency, index, state, wheels, as_of) as resolver:
+        yield from resolver.fix_iter(lines, force, matrix)
+
+
+class Resolver:
+    """
+    Looks up each project exactly once, however many lines or documents ask
+    for it and under whatever markers, with up to `concurrency` requests in
+    flight.  One can be shared by several `fix_iter` calls on different
+    threads.
+
+    With a `state`, projects that the changelog says are unchanged are answered
+    from it instead (see `fix_many`).
+
+    Lookups that failed fast because the index's breaker was open are logged
+    together on exit, rather than once per line.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        index: Optional[Index] = None,
+        state: Optional[IncrementalState] = None,
+        wheels: Optional[WheelTargets] = None,
+        as_of: Optional[float] = None,
+    ) -> None:
+        if state is not None and wheels is not None:
+            raise ValueError("A state has no filenames to check wheels against")
+        if state is not None and as_of is not None:
+            raise ValueError("A state has no upload times to check as_of against")
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.index = index
+        self.state = state
+        self.wheels = wheels
+        self.as_of = as_of
+        # One fetch per project, however many python constraints it's asked
+        # about under...
+        self.releases: Dict[str, "Future[Releases]"] = {}
+        # ...and the candidates for each of those constraints, from it.
+        self.futures: Dict[FetchKey, "Future[Candidates]"] = {}
+        # How long each project's lookup took, once it's done
+        self.seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+        self._known: Set[str] = set()
+        if state is not None:
+            if self.index is None:
+                self.index = JsonIndex()
+            with stats.timed("changelog"):
+                changelog = self.index.changelog(state.serial)
+            if changelog is not None:
+                self._known = state.sync(*changelog)
+
+    def __enter__(self) -> "Resolver":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.executor.shutdown()
+        names = self.unavailable()
+        if names:
+            LOG.warning(
+                "Index unavailable, skipped %d projects: %s",
+                len(names),
+                ", ".join(names),
+            )
+
+    def unavailable(self) -> List[str]:
+        """The projects not looked up because the index was unavailable."""
+        return sorted(
+            name
+            for name, future in self.releases.items()
+            if future.done() and isinstance(future.exception(), IndexUnavailable)
+        )
+
+    def submit(self, line: _Line) -> "Future[Candidates]":
+        assert line.lookup and line.req is not None
+        with self._lock:
+            future = self.futures.get(line.key)
+            if future is None:
+                name = line.key[0]
+                releases = self.releases.get(name)
+                if releases is None:
+                    releases = self.releases[name] = self._start(line.req.name)
+                future = self.futures[line.key] = self._candidates(releases, line.key)
+            return future
+
+    def _start(self, project_name: str) -> "Future[Releases]":
+        name = canonicalize_name(project_name)
+        if self.state is None:
+            return self.executor.submit(
+                self._timed, name, _fetch_releases, project_name, index=self.index
+            )
+
+        releases = self.state.releases(name)
+        if name in self._known and releases is not None:
+            future: "Future[Releases]" = Future()
+            self.seconds[name] = 0.0
+            future.set_result({v: [ReleaseFile("", rp)] for v, rp in releases})
+            return future
+
+        assert self.index is not None
+        return self.executor.submit(
+            self._timed, name, _fetch_and_record, project_name, self.index, self.state
+        )
+
+    def _candidates(
+        self, releases: "Future[Releases]", key: FetchKey
+    ) -> "Future[Candidates]":
+        future: "Future[Candidates]" = Future()
+
+        def done(f: "Future[Releases]") -> None:
+            try:
+                future.set_result(
+                    Candidates(f.result(), key[1], self.wheels, self.as_of)
+                )
+            except Exception as e:
+                future.set_exception(e)
+
+        releases.add_done_callback(done)
+        return future
+
+    def _timed(
+        self, name: str, func: Callable[..., Releases], *args: Any, **kwargs: Any
+    ) -> Releases:
+        t0 = time.perf_counter()
         try:
-            releases = _fetch_versions(req.name, only_on_python)
-        except Exception as e:
-            LOG.warning("Failed to fetch versions for %r: %s", req.name, repr(e))
-            new_lines.append(line)
-            continue
+            return func(*args, **kwargs)
+        finally:
+            self.seconds[name] = time.perf_counter() - t0
 
-        # TODO this ought to use the install_requires from the project if easily
-        # accessible, which would also give a hint on whether pre are allowed.
-        # For now we just get the pre- intent from the existing pin
-        if req.specifier.prereleases:
-            candidates = releases
-        else:
-            candidates = [v for v in releases if not v.is_prerelease]
-
-        if not candidates:
-            LOG.warning("No candidate versions for %r", value)
-            new_lines.append(line)
-            continue
+    def resolve(
+        self, parsed: _Line, lineno: int, matrix: Optional[Matrix] = None
+    ) -> LineResult:
+        """The result for a line once its project is looked up (if it was)."""
+        if not parsed.lookup:
+            return _resolve(parsed, lineno, None, 0.0, matrix)
+        future = self.futures[parsed.key]
+        return _resolve(
+            parsed, lineno, future, self.seconds.get(parsed.key[0], 0.0), matrix
+        )
+
+    def resolve_all(
+        self, lines: List[_Line], matrix: Optional[Matrix] = None
+    ) -> List[LineResult]:
+        return [self.resolve(line, i, matrix) for i, line in enumerate(lines, 1)]
+
+    def fix_iter(
+        self,
+        lines: Iterable[str],
+        force: Optional[bool] = False,
+        matrix: Optional[Matrix] = None,
+    ) -> Iterator[str]:
+        for result in self.resolve_iter(lines, force, matrix):
+            yield result.text
+
+    def resolve_iter(
+        self,
+        lines: Iterable[str],
+        force: Optional[bool] = False,
+        matrix: Optional[Matrix] = None,
+    ) -> Iterator[LineResult]:
+        """Like `fix_iter`, but with each line's result."""
+        pending: Deque[Tuple[_Line, int, "Optional[Future[Candidates]]"]] = deque()
+        for lineno, line in enumerate(lines, 1):
+            parsed = _parse_line(line, force)
+            pending.append(
+                (parsed, lineno, self.submit(parsed) if parsed.lookup else None)
+            )
+            # Emit whatever is ready, and once too far ahead, wait for the
+            # oldest line rather than keep reading.
+            while pending and (
+                len(pending) > STREAM_WINDOW
+                or pending[0][2] is None
+                or pending[0][2].done()
+            ):
+                yield self.resolve(*pending.popleft()[:2], matrix)
+        while pending:
+            yield self.resolve(*pending.popleft()[:2], matrix)
+
+
+def requirement_names(text: str) -> List[str]:
+    """
+    The projects that `fix(text, force=True)` would look up, in order.
+    """
+    return list(
+        dict.fromkeys(
+            line.req.name for line in _parse(text, True) if line.lookup and line.req
+        )
+    )
+
+
+def _parse(text: str, force: Optional[bool] = False) -> List[_Line]:
+    return [_parse_line(line, force) for line in text.splitlines(True)]
+
+
+def _parse_line(line: str, force: Optional[bool] = False) -> _Line:
+    # This is an overly simplistic parser for requirements files, see
+    # pip/req/req_file.py for the real one.
+    (value, _, comment) = line.strip().partition("#")
+    right_whitespace = value[len(value.rstrip()) :]
+
+    # See COMMENT_RE in pip/req/req_file.py
+    if value and comment and not right_whitespace:
+        value = line.strip()
+        comment = ""
+    else:
+        value = value.rstrip()
 
-        latest_version = max(candidates)
+    if not value:
+        return _Line(line)
 
-        new_specifier = SpecifierSet(f"=={latest_version}")
-        if req.specifier != new_specifier:
-            # print(f"Bump {req.name} from {req.specifier} to {new_specifier}")
-            pass
+    if value.startswith("-") or "://" in value:
+        # Skip git, etc
+        LOG.warning("Not bumping option/url line for %r", value)
+        return _Line(line, skipped="option or url")
 
-        req.specifier = new_specifier
+    req = Requirement(value)
+    assert not req.url
 
-        new_line = str(req)
-        if comment:
-            new_line += right_whitespace + "#" + comment
-        new_lines.append(new_line + "\n")  # Not sorry
+    try:
+        only_on_python = extract_python(req.marker)
+    except TooComplicated:
+        LOG.warning("Python version comparison too complex for %r", value)
+        return _Line(line, req, value, skipped="marker too complex")
 
-    return "".join(new_lines)
+    # Only operate on `project` and `project==ver` for now.
+    # Skip non-concrete specifiers in the hackiest way possible.
+    if "==" not in line and any(x in line for x in "<>=~") and not force:
+        return _Line(line, req, value, skipped="not a pin")
 
+    return _Line(line, req, value, comment, right_whitespace, only_on_python)
 
-def _fetch_versions(
-    project_name: str,
-    only_for_python: Optional[VersionIntervals] = None,
-) -> List[Version]:
-    resp = requests.get(f"https://pypi.org/pypi/{project_name}/json")
-    resp.raise_for_status()
-    obj = resp.json()
 
-    versions: List[Version] = []
-    for k, v in obj["releases"].items():
-        # Skip older releases that have no archives
-        if not v:
+def _resolve(
+    parsed: _Line,
+    lineno: int,
+    future: "Optional[Future[Candidates]]",
+    seconds: float,
+    matrix: Optional[Matrix] = None,
+) -> LineResult:
+    line, req, value, comment, right_whitespace, only_on_python, skipped = parsed
+
+    def result(
+        text: str = line, new: Tuple[Version, ...] = (), skipped: Optional[str] = None
+    ) -> LineResult:
+        return LineResult(
+            lineno,
+            req.name if req else None,
+            str(req.specifier) if req else "",
+            tuple(str(v) for v in new),
+            skipped,
+            seconds,
+            line,
+            text,
+        )
+
+    if req is None or future is None:
+        return result(skipped=skipped)
+
+    # TODO this ought to use the install_requires from the project if easily
+    # accessible, which would also give a hint on whether pre are allowed.
+    # For now we just get the pre- intent from the existing pin
+    per_python: List[Tuple[str, Optional[Version]]] = []
+    try:
+        with stats.timed("select"):
+            if matrix is None:
+                latest_version = future.result().latest(req.specifier.prereleases)
+            else:
+                latest_version, per_python = _select_matrix(
+                    future.result(), only_on_python, matrix, req.specifier.prereleases
+                )
+    except IndexUnavailable as e:
+        # Reported all together by the `Resolver`
+        return result(skipped=f"fetch failed: {e!r}")
+    except Exception as e:
+        LOG.warning("Failed to fetch versions for %r: %s", req.name, repr(e))
+        return result(skipped=f"fetch failed: {e!r}")
+
+    answered = [(python, v) for python, v in per_python if v is not None]
+    if (
+        matrix is not None
+        and matrix.split
+        and len(answered) == len(per_python)
+        and len({v for _, v in answered}) > 1
+    ):
+        ranges = list(_python_ranges(answered))
+        return result(
+            "".join(
+                _format(req, version, comment if i == 0 else "", right_whitespace, r)
+                for i, (r, version) in enumerate(ranges)
+            ),
+            tuple(version for _, version in ranges),
+        )
+
+    if latest_version is None:
+        LOG.warning("No candidate versions for %r", value)
+        return result(skipped="no candidates")
+
+    return result(
+        _format(req, latest_version, comment, right_whitespace), (latest_version,)
+    )
+
+
+def _format(
+    req: Requirement,
+    version: Version,
+    comment: str,
+    right_whitespace: str,
+    python_range: str = "",
+) -> str:
+    req = copy.copy(req)
+    req.specifier = SpecifierSet(f"=={version}")
+    if python_range:
+        req.marker = Marker(
+            f"({req.marker}) and {python_range}" if req.marker else python_range
+        )
+
+    new_line = str(req)
+    if comment:
+        new_line += right_whitespace + "#" + comment
+    return new_line + "\n"  # Not sorry
+
+
+def _select_matrix(
+    candidates: Candidates,
+    only_on_python: Optional[VersionIntervals],
+    matrix: Matrix,
+    prereleases: Optional[bool],
+) -> Tuple[Optional[Version], List[Tuple[str, Optional[Version]]]]:
+    """
+    The latest version for all of the matrix's pythons that the line applies
+    to, and the latest for each of them.
+    """
+    targets = []
+    for python in sorted(matrix.pythons, key=Version):
+        vi = compile_specifier(f"=={python}.*")
+        if only_on_python is not None:
+            vi = vi.intersect(only_on_python)
+        if vi:
+            targets.append((python, vi))
+    answers, common = candidates.latest_for([vi for _, vi in targets], prereleases)
+    return common, [(python, a) for (python, _), a in zip(targets, answers)]
+
+
+def _python_ranges(
+    per_python: List[Tuple[str, Version]]
+) -> Iterator[Tuple[str, Version]]:
+    """
+    Runs of consecutive pythons with the same answer, as markers that between
+    them cover every python.
+    """
+    start = 0
+    for i in range(1, len(per_python) + 1):
+        if i < len(per_python) and per_python[i][1] == per_python[start][1]:
             continue
-        requires_python = v[0].get("requires_python")
-        if requires_python and only_for_python:
-            if only_for_python.intersect(VersionIntervals.from_str(requires_python)):
-                # TODO try/except
-                versions.append(parse_version(k))
-        else:
-            # TODO try/except
-            versions.append(parse_version(k))
-
-    return versions
+        parts = []
+        if start > 0:
+            parts.append(f'python_version >= "{per_python[start][0]}"')
+        if i < len(per_python):
+            parts.append(f'python_version < "{per_python[i][0]}"')
+        yield " and ".join(parts), per_python[start][1]
+        start = i
+
+
+def _fetch_and_record(
+    project_name: str, index: Index, state: IncrementalState
+) -> Releases:
+    # Not from a cache, whose serial may be older than the changelog the state
+    # has just been synced to.
+    releases = index.fetch_current(project_name)
+    serial = index.serial(project_name)
+    if serial is not None:
+        # Whatever the python constraint, so that any line can be answered
+        # from the state later.
+        state.record(
+            canonicalize_name(project_name),
+            serial,
+            Candidates(releases).representatives(),
+        )
+    return releases
+
+
+def _fetch_releases(project_name: str, index: Optional[Index] = None) -> Releases:
+    if index is None:
+        index = JsonIndex()
+    return index.fetch(project_name)
@@ -0,0 +1,199 @@
+"""
+A resident `bumpreqs serve` that keeps indexes, what they returned, and the
+compiled version intervals warm between runs, and the client `fix` uses to hand
+it work over a Unix socket.  It's imported by every `bumpreqs` run to look for
+one, so keeps its own imports light.
+
+The protocol is one json request per connection: the client sends it and shuts
+down its side, the daemon answers and closes.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from packaging.utils import canonicalize_name
+
+from .cache import default_cache_dir, DEFAULT_TTL
+from .candidates import Matrix
+from .index import Index, IndexOptions, Releases
+
+LOG = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+
+# How long `fix_remote` waits on the daemon, in seconds: long enough for a cold
+# one to look everything up, but a wedged one doesn't hang the run.
+CLIENT_TIMEOUT = 120.0
+
+
+def default_socket_path() -> str:
+    base = os.environ.get("XDG_RUNTIME_DIR") or default_cache_dir()
+    return str(Path(base) / "bumpreqs.sock")
+
+
+class DaemonError(Exception):
+    """The daemon was reached, but couldn't do what was asked."""
+
+
+class WarmIndex(Index):
+    """
+    Remembers what another index returned for `ttl` seconds, so that a project
+    asked about by run after run is fetched (or even read from disk) once.
+    """
+
+    def __init__(self, index: Index, ttl: float = DEFAULT_TTL) -> None:
+        self.index = index
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Releases]] = {}
+
+    def fetch(self, project_name: str) -> Releases:
+        key = canonicalize_name(project_name)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        return self._remember(key, self.index.fetch(project_name))
+
+    def fetch_current(self, project_name: str) -> Releases:
+        key = canonicalize_name(project_name)
+        return self._remember(key, self.index.fetch_current(project_name))
+
+    def _remember(self, key: str, releases: Releases) -> Releases:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), releases)
+        return releases
+
+    def serial(self, project_name: str) -> Optional[int]:
+        return self.index.serial(project_name)
+
+    def changelog(self, since: Optional[int]) -> Optional[Tuple[int, Dict[str, int]]]:
+        return self.index.changelog(since)
+
+
+class Daemon(socketserver.ThreadingUnixStreamServer):
+    """
+    Serves `fix_many` on `path`, with one long-lived index per distinct set of
+    index options clients have asked for.
+
+        with Daemon(path) as daemon:
+            daemon.serve_forever()
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: str, ttl: float = DEFAULT_TTL) -> None:
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._indexes: Dict[IndexOptions, Index] = {}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(path):
+            if is_running(path):
+                raise DaemonError(f"Already serving on {path}")
+            # Left behind by one that was killed
+            os.unlink(path)
+        super().__init__(path, _Handler)
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        # Only this user may hand us work (and name files in cache_dir).
+        os.chmod(self.path, 0o600)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def index(self, options: IndexOptions) -> Index:
+        with self._lock:
+            if options not in self._indexes:
+                self._indexes[options] = WarmIndex(options.make_index(), self.ttl)
+            return self._indexes[options]
+
+    def fix(self, request: Dict[str, Any]) -> Dict[str, str]:
+        from .core import fix_many
+
+        if request.get("version") != PROTOCOL_VERSION:
+            raise DaemonError(f"Unsupported protocol {request.get('version')!r}")
+        options = IndexOptions.from_json(request["options"])
+        pythons = request.get("pythons") or []
+        matrix = Matrix(pythons, request.get("split", False)) if pythons else None
+        return fix_many(
+            request["texts"],
+            concurrency=options.concurrency,
+            index=self.index(options),
+            matrix=matrix,
+        )
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: Daemon
+
+    def handle(self) -> None:
+        body = self.rfile.read()
+        if not body:
+            # Just checking that we're here
+            return
+        try:
+            response: Dict[str, Any] = {"texts": self.server.fix(json.loads(body))}
+        except Exception as e:
+            LOG.warning("Request failed: %r", e)
+            response = {"error": repr(e)}
+        self.wfile.write(json.dumps(response).encode())
+
+
+def is_running(path: str) -> bool:
+    """Whether something is listening on `path`."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def fix_remote(
+    path: str,
+    texts: Dict[str, str],
+    options: IndexOptions,
+    matrix: Optional[Matrix] = None,
+    timeout: float = CLIENT_TIMEOUT,
+) -> Dict[str, str]:
+    """
+    `fix_many`, done by the daemon on `path`.
+
+    Raises OSError when there's no daemon there to ask or it doesn't answer
+    within `timeout` seconds, and DaemonError when it fails, so callers can
+    fall back to doing the work themselves.
+    """
+    request = {
+        "version": PROTOCOL_VERSION,
+        "texts": texts,
+        "options": options._asdict(),
+        "pythons": list(matrix.pythons) if matrix else [],
+        "split": bool(matrix and matrix.split),
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(path)
+        s.sendall(json.dumps(request).encode())
+        s.shutdown(socket.SHUT_WR)
+        with s.makefile("rb") as f:
+            body = f.read()
+    try:
+        response = json.loads(body)
+    except ValueError:
+        raise DaemonError(f"Unreadable response {body[:100]!r}")
+    if "error" in response:
+        raise DaemonError(response["error"])
+    texts = response["texts"]
+    assert isinstance(texts, dict)
+    return texts
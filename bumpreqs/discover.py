@@ -0,0 +1,180 @@
+"""
+Finding requirements files under a directory, for `--recursive`, skipping what
+git would ignore.
+"""
+
+import fnmatch
+import os
+import re
+from concurrent.futures import Executor
+from typing import Iterable, List, NamedTuple, Optional, Pattern, Sequence, Tuple
+
+# Matched against file names.  `*.in` would also catch MANIFEST.in, so pip-tools
+# style inputs with other names need a --pattern.
+DEFAULT_PATTERNS = ("requirements*.txt", "requirements*.in", "constraints*.txt")
+
+# Listing directories is all waiting on the filesystem, so more threads than
+# there are cores still help.
+DISCOVER_CONCURRENCY = 32
+
+# Never worth looking inside, whatever .gitignore says.
+SKIP_DIRS = frozenset({".git", ".hg", ".svn"})
+
+
+class _Rule(NamedTuple):
+    regex: Pattern[str]
+    negate: bool
+    dir_only: bool
+    # Matched against the whole path relative to the .gitignore, rather than
+    # just the name.
+    anchored: bool
+
+
+class GitIgnore:
+    """
+    The patterns of one .gitignore, which apply to paths under `base`.
+
+    Covers what requirements files are likely to meet: `!` negation, trailing
+    `/` for directories, anchoring by a leading or inner `/`, and `*`, `?`,
+    `[...]` and `**`.
+    """
+
+    def __init__(self, base: str, lines: Iterable[str]) -> None:
+        self.base = base
+        self.rules = [r for r in map(_compile, lines) if r is not None]
+
+    def match(self, path: str, is_dir: bool) -> Optional[bool]:
+        """
+        True if `path` is ignored, False if a `!` pattern un-ignores it, and
+        None if no pattern mentions it.
+        """
+        # Paths come from walking down from `base`, so it's a prefix; this is
+        # much cheaper than relpath across a big tree.
+        rel = path[len(self.base) + 1 :].replace(os.sep, "/")
+        name = rel.rsplit("/", 1)[-1]
+        # The last pattern that matches wins.
+        for rule in reversed(self.rules):
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.fullmatch(rel if rule.anchored else name):
+                return not rule.negate
+        return None
+
+
+def _compile(line: str) -> Optional[_Rule]:
+    line = line.rstrip("\n").rstrip()
+    if not line or line.startswith("#"):
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\"):
+        # \# and \! for names that really start with them
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    anchored = "/" in line
+    line = line.lstrip("/")
+    if not line:
+        return None
+    return _Rule(re.compile(_translate(line)), negate, dir_only, anchored)
+
+
+def _translate(pattern: str) -> str:
+    # Like fnmatch.translate, except that only ** crosses a /.
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+def _ignored(ignores: Sequence[GitIgnore], path: str, is_dir: bool) -> bool:
+    # A deeper .gitignore overrides the ones above it.
+    for gitignore in reversed(ignores):
+        decision = gitignore.match(path, is_dir)
+        if decision is not None:
+            return decision
+    return False
+
+
+def discover(
+    root: str,
+    executor: Executor,
+    patterns: Sequence[str] = DEFAULT_PATTERNS,
+) -> List[str]:
+    """
+    The files under `root` whose names match any of `patterns`, sorted, leaving
+    out anything a .gitignore at or below `root` excludes.
+
+    Each level of the tree is listed in parallel, as in `read_tree`, and an
+    ignored directory is never entered.  Symlinked directories aren't
+    followed.
+    """
+    regex = re.compile("|".join(fnmatch.translate(p) for p in patterns))
+    # Ignore files and the walk both rely on paths starting with `root` plus a
+    # separator.
+    root = os.path.normpath(root)
+    found: List[str] = []
+    level: List[Tuple[str, Tuple[GitIgnore, ...]]] = [(root, ())]
+    while level:
+        frontier = []
+        for files, subdirs in executor.map(
+            lambda item: _scan(item[0], item[1], regex), level
+        ):
+            found.extend(files)
+            frontier.extend(subdirs)
+        level = frontier
+    return sorted(found)
+
+
+def _scan(
+    directory: str, ignores: Tuple[GitIgnore, ...], regex: Pattern[str]
+) -> Tuple[List[str], List[Tuple[str, Tuple[GitIgnore, ...]]]]:
+    try:
+        with open(os.path.join(directory, ".gitignore")) as f:
+            ignores = (*ignores, GitIgnore(directory, f))
+    except OSError:
+        pass
+
+    files = []
+    subdirs = []
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return [], []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in SKIP_DIRS and not _ignored(ignores, entry.path, True):
+                subdirs.append((entry.path, ignores))
+        elif (
+            regex.match(entry.name)
+            and entry.is_file()
+            and not _ignored(ignores, entry.path, False)
+        ):
+            files.append(entry.path)
+    return files, subdirs
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import threading
+import xmlrpc.client
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from packaging.utils import canonicalize_name
+
+from .index import SIMPLE_JSON_CONTENT_TYPE
+
+# version -> [(filename, requires_python)]
+FakeProject = Dict[str, List[Tuple[str, Optional[str]]]]
+
+
+class FakeIndex:
+    """
+    A local stand-in for pypi, serving both the legacy json api under `/pypi/`
+    and the PEP 691 simple api under `/simple/`, plus the xml-rpc changelog at
+    `/pypi`.
+
+    Use as a context manager; `requests` counts hits per path.
+    """
+
+    def __init__(
+        self,
+        projects: Dict[str, FakeProject],
+        upload_times: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.projects: Dict[str, FakeProject] = {}
+        # filename -> ISO 8601, for the files that say when they were uploaded
+        self.upload_times = upload_times or {}
+        # Like pypi, every change gets the next serial.
+        self.serial = 0
+        self.serials: Dict[str, int] = {}
+        self.changelog: List[Tuple[str, int]] = []
+        for name, releases in projects.items():
+            self.update(name, releases)
+        self.requests: Counter[str] = Counter()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.fake = self  # type: ignore[attr-defined]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def __enter__(self) -> "FakeIndex":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def update(self, name: str, releases: FakeProject) -> None:
+        name = canonicalize_name(name)
+        self.serial += 1
+        self.projects[name] = releases
+        self.serials[name] = self.serial
+        self.changelog.append((name, self.serial))
+
+    def xmlrpc(self, method: str, params: Tuple[Any, ...]) -> Any:
+        if method == "changelog_last_serial":
+            return self.serial
+        elif method == "changelog_since_serial":
+            return [
+                (name, "", 0, "new release", serial)
+                for name, serial in self.changelog
+                if serial > params[0]
+            ]
+        raise xmlrpc.client.Fault(1, f"no method {method}")
+
+    def legacy_json(self, name: str) -> Dict[str, Any]:
+        return {
+            "info": {"name": name},
+            "releases": {
+                version: [
+                    {
+                        "filename": filename,
+                        "requires_python": rp,
+                        "upload_time_iso_8601": self.upload_times.get(filename),
+                        "digests": {"sha256": "0" * 64},
+                        "url": f"https://files.example.com/{filename}",
+                    }
+                    for filename, rp in files
+                ]
+                for version, files in self.projects[name].items()
+            },
+        }
+
+    def simple_json(self, name: str) -> Dict[str, Any]:
+        return {
+            "meta": {"api-version": "1.1"},
+            "name": name,
+            "versions": list(self.projects[name]),
+            "files": [
+                {
+                    "filename": filename,
+                    "requires-python": rp,
+                    "upload-time": self.upload_times.get(filename),
+                    "hashes": {"sha256": "0" * 64},
+                    "url": f"https://files.example.com/{filename}",
+                }
+                for files in self.projects[name].values()
+                for filename, rp in files
+            ],
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        fake: FakeIndex = self.server.fake  # type: ignore[attr-defined]
+        fake.requests[self.path] += 1
+
+        parts = self.path.strip("/").split("/")
+        obj: Any = None
+        content_type = "application/json"
+        if len(parts) == 3 and parts[0] == "pypi" and parts[2] == "json":
+            name = canonicalize_name(parts[1])
+            if name in fake.projects:
+                obj = fake.legacy_json(name)
+        elif len(parts) == 2 and parts[0] == "simple":
+            # Real indexes redirect non-normalized names; we just 404 them.
+            if parts[1] in fake.projects:
+                obj = fake.simple_json(parts[1])
+                content_type = SIMPLE_JSON_CONTENT_TYPE
+
+        if obj is None:
+            self.send_error(404)
+            return
+
+        body = json.dumps(obj).encode()
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        serial = str(fake.serials[name if parts[0] == "pypi" else parts[1]])
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("X-PyPI-Last-Serial", serial)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("X-PyPI-Last-Serial", serial)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        fake: FakeIndex = self.server.fake  # type: ignore[attr-defined]
+        fake.requests[self.path] += 1
+        if self.path != "/pypi":
+            self.send_error(404)
+            return
+
+        params, method = xmlrpc.client.loads(
+            self.rfile.read(int(self.headers["Content-Length"]))
+        )
+        try:
+            result = xmlrpc.client.dumps(
+                (fake.xmlrpc(str(method), params),), None, True
+            )
+        except xmlrpc.client.Fault as e:
+            result = xmlrpc.client.dumps(e)
+        body = result.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
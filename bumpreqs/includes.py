@@ -0,0 +1,115 @@
+"""
+Following `-r` and `-c` from one requirements file to the next, so that a whole
+tree of them can be bumped together.
+"""
+
+import logging
+import os
+import re
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LOG = logging.getLogger(__name__)
+
+# -r other.txt, -rother.txt, --requirement=other.txt, and the same for -c
+INCLUDE_RE = re.compile(
+    r"^(?:-[rc]\s*|--(?:requirement|constraint)(?:\s*=\s*|\s+))(?P<path>\S+)"
+)
+# See COMMENT_RE in pip/req/req_file.py
+COMMENT_RE = re.compile(r"(^|\s+)#.*$")
+
+# filename -> the files it includes
+IncludeGraph = Dict[str, List[str]]
+
+
+def includes(text: str) -> List[str]:
+    """The paths named by `-r` and `-c` lines, as written."""
+    found = []
+    for line in text.splitlines():
+        m = INCLUDE_RE.match(COMMENT_RE.sub("", line).strip())
+        if m and "://" not in m.group("path"):
+            found.append(m.group("path"))
+    return found
+
+
+def read_tree(
+    filenames: Sequence[str], executor: Executor
+) -> Tuple[Dict[str, str], IncludeGraph]:
+    """
+    Reads `filenames` and everything they include, recursively.
+
+    The graph is built a level at a time, with each level read in parallel, and
+    every file is read once however many others include it.  Includes are
+    relative to the file that names them, like pip.  Returns the texts in the
+    order found, and the graph, with any cycles in it logged.
+    """
+    texts: Dict[str, str] = {}
+    graph: IncludeGraph = {}
+    # One name per file, however it was spelled.
+    names: Dict[str, str] = {}
+
+    frontier = [(f, True) for f in filenames]
+    while frontier:
+        level = []
+        for filename, required in frontier:
+            real = os.path.realpath(filename)
+            if real not in names:
+                names[real] = filename
+                level.append((filename, required))
+
+        frontier = []
+        for (filename, _), text in zip(level, executor.map(_read, level)):
+            if text is None:
+                continue
+            texts[filename] = text
+            graph[filename] = []
+            for path in includes(text):
+                included = os.path.normpath(
+                    os.path.join(os.path.dirname(filename), path)
+                )
+                graph[filename].append(included)
+                frontier.append((included, False))
+
+    for filename, edges in graph.items():
+        resolved = (names[os.path.realpath(e)] for e in edges)
+        graph[filename] = [e for e in resolved if e in texts]
+
+    for cycle in find_cycles(graph):
+        LOG.warning("Requirements files include each other: %s", " -> ".join(cycle))
+
+    return texts, graph
+
+
+def _read(item: Tuple[str, bool]) -> Optional[str]:
+    filename, required = item
+    try:
+        return Path(filename).read_text()
+    except OSError as e:
+        if required:
+            raise
+        LOG.warning("Can't read included %s: %s", filename, repr(e))
+        return None
+
+
+def find_cycles(graph: IncludeGraph) -> List[List[str]]:
+    """Each cycle once, starting and ending at the file first reached in it."""
+    cycles = []
+    # 1 while on the current path, 2 once finished with
+    state: Dict[str, int] = {}
+
+    def visit(node: str, path: List[str]) -> None:
+        state[node] = 1
+        path.append(node)
+        for nxt in graph.get(node, ()):
+            if state.get(nxt) == 1:
+                cycles.append(path[path.index(nxt) :] + [nxt])
+            elif nxt not in state:
+                visit(nxt, path)
+        path.pop()
+        state[node] = 2
+
+    for node in graph:
+        if node not in state:
+            visit(node, [])
+    return cycles
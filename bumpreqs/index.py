@@ -0,0 +1,489 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+from packaging.utils import (
+    canonicalize_name,
+    InvalidSdistFilename,
+    InvalidWheelFilename,
+    parse_sdist_filename,
+    parse_wheel_filename,
+)
+from packaging.version import InvalidVersion
+
+from . import stats
+from .cache import CacheEntry, CHUNK_SIZE, DEFAULT_MISSING_TTL, MetadataCache
+from .client import default_client, DEFAULT_TIMEOUT, IndexClient
+from .jsonstream import JsonStream
+
+if TYPE_CHECKING:
+    import requests
+
+LOG = logging.getLogger(__name__)
+
+PYPI_JSON_URL = "https://pypi.org/pypi/"
+PYPI_XMLRPC_URL = "https://pypi.org/pypi"
+PYPI_SIMPLE_URL = "https://pypi.org/simple/"
+
+SIMPLE_JSON_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+
+# Statuses that mean the index has no such project (or had, and deleted it).
+MISSING_STATUSES = frozenset({404, 410})
+
+
+class ProjectNotFound(LookupError):
+    """The index has no such project, e.g. a private name in a public file."""
+
+
+class ReleaseFile(NamedTuple):
+    filename: str
+    requires_python: Optional[str]
+    # ISO 8601, as the index gave it; parsed only if something asks (see
+    # `upload_timestamp`).
+    upload_time: Optional[str] = None
+
+
+def upload_timestamp(upload_time: str) -> float:
+    """
+    Seconds since the epoch for an upload time like pypi's, which are UTC
+    whether or not they say so.
+    """
+    # fromisoformat only learned "Z" in 3.11
+    if upload_time.endswith("Z"):
+        upload_time = upload_time[:-1] + "+00:00"
+    when = datetime.datetime.fromisoformat(upload_time)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return when.timestamp()
+
+
+def first_upload(files: List[ReleaseFile]) -> Optional[float]:
+    """When the earliest of a release's files was uploaded, if the index said."""
+    times = [upload_timestamp(f.upload_time) for f in files if f.upload_time]
+    return min(times) if times else None
+
+
+# Version string -> files in that release, in the order the index lists them.
+Releases = Dict[str, List[ReleaseFile]]
+
+
+class Index:
+    """
+    Somewhere to get the list of releases for a project from.
+    """
+
+    def fetch(self, project_name: str) -> Releases:  # pragma: no cover
+        raise NotImplementedError
+
+    def fetch_current(self, project_name: str) -> Releases:
+        """
+        Like `fetch`, but checked with the index rather than answered from
+        anything kept from before, so that its serial is current too.
+        """
+        return self.fetch(project_name)
+
+    def serial(self, project_name: str) -> Optional[int]:
+        """
+        The index's serial for what `fetch` last returned for this project, if
+        the index numbers its changes.
+        """
+        return None
+
+    def changelog(self, since: Optional[int]) -> Optional[Tuple[int, Dict[str, int]]]:
+        """
+        The index's current serial, and the serial of the latest change to each
+        project changed after `since` (none at all when `since` is None).
+
+        None if the index can't say, in which case everything must be fetched.
+        """
+        return None
+
+
+class HttpIndex(Index):
+    """
+    An index that is fetched over http.
+
+    Subclasses say what url to ask for and how to read the response; fetching
+    and caching are shared.  A project that isn't there is remembered for a
+    short while (in the cache too, if there is one), so asking again raises
+    `ProjectNotFound` without a request.
+    """
+
+    format: str
+    default_url: str
+    headers: Dict[str, str] = {}
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        cache: Optional[MetadataCache] = None,
+        client: Optional[IndexClient] = None,
+    ) -> None:
+        self.url = url or self.default_url
+        if not self.url.endswith("/"):
+            self.url += "/"
+        self.cache = cache
+        self.client = client or default_client()
+        # Distinguishes this index's entries from those of any other index
+        # sharing the same cache directory.
+        self._cache_suffix = hashlib.sha1(
+            f"{self.format} {self.url}".encode()
+        ).hexdigest()[:8]
+        self._serials: Dict[str, int] = {}
+        self.missing_ttl = cache.missing_ttl if cache else DEFAULT_MISSING_TTL
+        # Canonical name -> (when, status) of each project found missing
+        self._missing: Dict[str, Tuple[float, int]] = {}
+        self._missing_lock = threading.Lock()
+
+    @property
+    def changelog_url(self) -> Optional[str]:  # pragma: no cover
+        """Where pypi's xml-rpc changelog api is, if this index has one."""
+        return None
+
+    def project_url(self, project_name: str) -> str:  # pragma: no cover
+        raise NotImplementedError
+
+    def parse(self, stream: JsonStream) -> Releases:  # pragma: no cover
+        raise NotImplementedError
+
+    def fetch(self, project_name: str) -> Releases:
+        return self._fetch(project_name, revalidate=False)
+
+    def fetch_current(self, project_name: str) -> Releases:
+        return self._fetch(project_name, revalidate=True)
+
+    def _fetch(self, project_name: str, revalidate: bool) -> Releases:
+        t0 = time.perf_counter()
+        source, serial, chunks = self._get_body(project_name, revalidate)
+        size = 0
+
+        def counted() -> Iterator[bytes]:
+            nonlocal size
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+
+        stream = JsonStream(counted())
+        releases = self.parse(stream)
+        # Drains the body, which is what commits it to the cache.
+        stream.finish()
+
+        key = canonicalize_name(project_name)
+        if serial is None:
+            self._serials.pop(key, None)
+        else:
+            self._serials[key] = serial
+
+        stats.emit(
+            "fetch",
+            project=project_name,
+            seconds=time.perf_counter() - t0,
+            bytes=size,
+            source=source,
+        )
+        return releases
+
+    def serial(self, project_name: str) -> Optional[int]:
+        return self._serials.get(canonicalize_name(project_name))
+
+    def changelog(self, since: Optional[int]) -> Optional[Tuple[int, Dict[str, int]]]:
+        if self.changelog_url is None:
+            return None
+        try:
+            if since is None:
+                return self._xmlrpc("changelog_last_serial"), {}
+
+            current = since
+            changes: Dict[str, int] = {}
+            # Keep asking until caught up, in case the index pages its answer.
+            while rows := self._xmlrpc("changelog_since_serial", current):
+                for name, _version, _timestamp, _action, serial in rows:
+                    key = canonicalize_name(name)
+                    changes[key] = max(changes.get(key, 0), serial)
+                    current = max(current, serial)
+            return current, changes
+        except Exception as e:
+            LOG.warning("No changelog from %s: %s", self.changelog_url, repr(e))
+            return None
+
+    def _xmlrpc(self, method: str, *params: Any) -> Any:
+        import xmlrpc.client
+
+        assert self.changelog_url is not None
+        resp = self.client.post(
+            self.changelog_url,
+            xmlrpc.client.dumps(params, method).encode(),
+            {"Content-Type": "text/xml"},
+        )
+        with resp:
+            resp.raise_for_status()
+            return xmlrpc.client.loads(resp.content)[0][0]
+
+    def _get_body(
+        self, project_name: str, revalidate: bool
+    ) -> Tuple[str, Optional[int], Iterator[bytes]]:
+        name = canonicalize_name(project_name)
+        with self._missing_lock:
+            missing = self._missing.get(name)
+        if missing and time.monotonic() - missing[0] < self.missing_ttl:
+            raise self._not_found(project_name, missing[1])
+
+        url = self.project_url(project_name)
+        if self.cache is None:
+            resp = self.client.get(url, self.headers)
+            self._check_missing(project_name, resp)
+            return "network", _serial(resp), _iter_response(resp)
+
+        key = f"{name}.{self._cache_suffix}"
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            if entry.missing is not None:
+                raise self._not_found(project_name, entry.missing)
+            if not revalidate:
+                return "cache", entry.serial, self.cache.read(key)
+
+        headers = dict(self.headers)
+        if entry is not None and entry.missing is None:
+            headers.update(entry.validators())
+        resp = self.client.get(url, headers)
+        if resp.status_code == 304 and entry is not None:
+            # Unchanged; restart the ttl without downloading the body again.
+            resp.close()
+            self.cache.touch(key)
+            return "revalidated", entry.serial, self.cache.read(key)
+
+        if resp.status_code in MISSING_STATUSES:
+            # Consuming the (empty) body is what stores the entry.
+            list(
+                self.cache.write(
+                    key, CacheEntry(None, None, missing=resp.status_code), ()
+                )
+            )
+        self._check_missing(project_name, resp)
+
+        serial = _serial(resp)
+        return (
+            "network",
+            serial,
+            self.cache.write(
+                key,
+                CacheEntry(
+                    resp.headers.get("ETag"),
+                    resp.headers.get("Last-Modified"),
+                    serial=serial,
+                ),
+                _iter_response(resp),
+            ),
+        )
+
+    def _check_missing(self, project_name: str, resp: requests.Response) -> None:
+        if resp.status_code not in MISSING_STATUSES:
+            return
+        resp.close()
+        with self._missing_lock:
+            self._missing[canonicalize_name(project_name)] = (
+                time.monotonic(),
+                resp.status_code,
+            )
+        raise self._not_found(project_name, resp.status_code)
+
+    def _not_found(self, project_name: str, status: int) -> ProjectNotFound:
+        return ProjectNotFound(f"{project_name} is not on {self.url} ({status})")
+
+
+def _serial(resp: requests.Response) -> Optional[int]:
+    try:
+        return int(resp.headers["X-PyPI-Last-Serial"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _iter_response(resp: requests.Response) -> Iterator[bytes]:
+    try:
+        resp.raise_for_status()
+    except Exception:
+        resp.close()
+        raise
+
+    def body() -> Iterator[bytes]:
+        # Releases the connection even if the caller stops reading part way.
+        with resp:
+            yield from resp.iter_content(CHUNK_SIZE)
+
+    return body()
+
+
+class JsonIndex(HttpIndex):
+    """
+    The legacy `/pypi/<project>/json` api, which is what pypi and devpi serve.
+
+    This has every file's metadata for every release, which for projects that
+    release often can be many megabytes.
+    """
+
+    format = "json"
+    default_url = PYPI_JSON_URL
+
+    @property
+    def changelog_url(self) -> Optional[str]:
+        # pypi (and warehouse-alikes) serve xml-rpc at the same url, unslashed.
+        return self.url[:-1]
+
+    def project_url(self, project_name: str) -> str:
+        return f"{self.url}{project_name}/json"
+
+    def parse(self, stream: JsonStream) -> Releases:
+        releases: Releases = {}
+        for key in stream.object_items():
+            if key != "releases":
+                stream.skip()
+                continue
+            # Each file's digests, urls, etc are dropped as soon as it's read.
+            for version in stream.object_items():
+                releases[version] = [
+                    _legacy_file(stream.value()) for _ in stream.array_items()
+                ]
+        return releases
+
+
+def _legacy_file(f: Any) -> ReleaseFile:
+    return ReleaseFile(
+        f["filename"],
+        f.get("requires_python"),
+        f.get("upload_time_iso_8601") or f.get("upload_time"),
+    )
+
+
+class SimpleIndex(HttpIndex):
+    """
+    The PEP 691 json form of the simple repository api.
+
+    This only lists files, so the versions come from the filenames.
+    """
+
+    format = "simple"
+    default_url = PYPI_SIMPLE_URL
+    headers = {"Accept": SIMPLE_JSON_CONTENT_TYPE}
+
+    @property
+    def changelog_url(self) -> Optional[str]:
+        return PYPI_XMLRPC_URL if self.url == PYPI_SIMPLE_URL else None
+
+    def project_url(self, project_name: str) -> str:
+        return f"{self.url}{canonicalize_name(project_name)}/"
+
+    def parse(self, stream: JsonStream) -> Releases:
+        releases: Releases = {}
+        for key in stream.object_items():
+            if key != "files":
+                stream.skip()
+                continue
+            for _ in stream.array_items():
+                _add_simple_file(releases, stream.value())
+        return releases
+
+
+def _add_simple_file(releases: Releases, f: Any) -> None:
+    filename = f["filename"]
+    try:
+        if filename.endswith(".whl"):
+            version = parse_wheel_filename(filename)[1]
+        else:
+            version = parse_sdist_filename(filename)[1]
+    except (InvalidSdistFilename, InvalidWheelFilename, InvalidVersion):
+        # eggs, installers and other things pip won't use
+        return
+    releases.setdefault(str(version), []).append(
+        # upload-time is from PEP 700, so older indexes won't have it.
+        ReleaseFile(filename, f.get("requires-python"), f.get("upload-time"))
+    )
+
+
+INDEX_FORMATS = {cls.format: cls for cls in (JsonIndex, SimpleIndex)}
+
+
+class IndexOptions(NamedTuple):
+    """
+    What the command line says about the index, as plain values so they can be
+    compared, and sent to a daemon that builds the same index.
+    """
+
+    concurrency: int
+    # None for no cache
+    cache_dir: Optional[str]
+    index_url: Optional[str]
+    index_format: str
+    timeout: float
+    retries: int
+    max_rate: Optional[float]
+    # Asked as well as `index_url`, with `index_policy` saying how the answers
+    # combine; see `MultiIndex`.
+    extra_index_urls: Tuple[str, ...] = ()
+    index_policy: str = "first"
+    index_budget: Optional[float] = None
+    # (project, url) for projects that are only on some of the indexes
+    index_pins: Tuple[Tuple[str, str], ...] = ()
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "IndexOptions":
+        """The inverse of `_asdict` after a round trip through json."""
+        return cls(
+            **{
+                **data,
+                "extra_index_urls": tuple(data.get("extra_index_urls", ())),
+                "index_pins": tuple(
+                    (name, url) for name, url in data.get("index_pins", ())
+                ),
+            }
+        )
+
+    def make_index(self) -> Index:
+        cache = MetadataCache(self.cache_dir) if self.cache_dir else None
+        cls = INDEX_FORMATS[self.index_format]
+        urls = [_slashed(self.index_url or cls.default_url)]
+        urls.extend(_slashed(url) for url in self.extra_index_urls)
+        timeout = (DEFAULT_TIMEOUT[0], self.timeout)
+        if self.index_budget is not None:
+            # No request outlives the budget it's abandoned after.
+            timeout = (
+                min(timeout[0], self.index_budget),
+                min(timeout[1], self.index_budget),
+            )
+        # Each index gets its own client, and so its own circuit breaker.
+        indexes = {
+            url: cls(
+                url,
+                cache=cache,
+                client=IndexClient(
+                    timeout=timeout,
+                    retries=self.retries,
+                    max_rate=self.max_rate,
+                    pool_size=self.concurrency,
+                ),
+            )
+            for url in urls
+        }
+        if len(indexes) == 1 and not self.index_pins and self.index_budget is None:
+            return indexes[urls[0]]
+
+        # Here rather than at the top, since it imports this module.
+        from .multiindex import MultiIndex
+
+        pins: Dict[str, List[Index]] = {}
+        for name, url in self.index_pins:
+            pins.setdefault(name, []).append(indexes[_slashed(url)])
+        return MultiIndex(
+            list(indexes.values()),
+            self.index_policy,
+            self.index_budget,
+            pins,
+        )
+
+
+def _slashed(url: str) -> str:
+    return url if url.endswith("/") else url + "/"
@@ -0,0 +1,175 @@
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# What `_scan` looks for inside a string, inside a container, and after a
+# number or literal.
+_STRING_BODY = re.compile(r'(?:[^"\\]+|\\.)*', re.DOTALL)
+_STRUCTURE = re.compile(r'["\[\]{}]')
+_SCALAR_END = re.compile(r"[ \t\n\r,:\]}]")
+
+
+class JsonStream:
+    """
+    Walks a json document as its bytes arrive.
+
+    Callers descend into the containers they care about with `object_items`
+    and `array_items`, and `value` (or `skip`) everything else, so only one
+    leaf value at a time is ever materialized rather than the whole document.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        while not self._eof:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                text = self._decoder.decode(b"", final=True)
+            else:
+                text = self._decoder.decode(chunk)
+            if text:
+                self._buf = self._buf[self._pos :] + text
+                self._pos = 0
+                return True
+        return False
+
+    def _peek(self) -> str:
+        while True:
+            m = _WHITESPACE.match(self._buf, self._pos)
+            assert m is not None
+            self._pos = m.end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of json")
+
+    def _expect(self, chars: str) -> str:
+        c = self._peek()
+        if c not in chars:
+            raise ValueError(f"Expected one of {chars!r}, got {c!r}")
+        self._pos += 1
+        return c
+
+    def value(self) -> Any:
+        return _DECODER.decode(self._scan(keep=True))
+
+    def _scan(self, keep: bool) -> str:
+        """
+        Moves past the next value, returning its text if `keep`.  Only finds
+        where it ends, so that the text is decoded once, however many chunks
+        it spans, and needn't be held at all when skipped.
+        """
+        first = self._peek()
+        if first in ",:]}":
+            raise ValueError(f"Expected a value, got {first!r}")
+        scalar = first not in '"[{'
+        in_string = first == '"'
+        depth = int(first in "[{")
+        pieces = []
+        start = self._pos
+        i = start if scalar else start + 1
+        while True:
+            buf = self._buf
+            end = None
+            while end is None and i < len(buf):
+                if in_string:
+                    m = _STRING_BODY.match(buf, i)
+                    assert m is not None
+                    i = m.end()
+                    if i == len(buf) or buf[i] == "\\":
+                        # An escape split across chunks
+                        break
+                    i += 1
+                    in_string = False
+                    if not depth:
+                        end = i
+                elif scalar:
+                    m = _SCALAR_END.search(buf, i)
+                    if m is None:
+                        i = len(buf)
+                    else:
+                        end = m.start()
+                else:
+                    m = _STRUCTURE.search(buf, i)
+                    if m is None:
+                        i = len(buf)
+                        continue
+                    i = m.end()
+                    if m.group() == '"':
+                        in_string = True
+                    elif m.group() in "[{":
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if not depth:
+                            end = i
+            if end is not None:
+                if keep:
+                    pieces.append(buf[start:end])
+                self._pos = end
+                return "".join(pieces)
+            if keep:
+                pieces.append(buf[start:i])
+            # Keeps anything after `i` for the next pass.
+            self._pos = i
+            if not self._fill():
+                if scalar:
+                    return "".join(pieces)
+                raise ValueError("Unexpected end of json")
+            start = i = 0
+
+    def finish(self) -> None:
+        """
+        Reads to the end of the input, which must only be whitespace.
+        """
+        while True:
+            m = _WHITESPACE.match(self._buf, self._pos)
+            assert m is not None
+            if m.end() < len(self._buf):
+                raise ValueError("Extra data after json")
+            self._pos = m.end()
+            if not self._fill():
+                return
+
+    def skip(self) -> None:
+        self._scan(keep=False)
+
+    def object_items(self) -> Iterator[str]:
+        """
+        Yields each key of an object; the caller must consume its value before
+        asking for the next one.
+        """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"Expected a key, got {key!r}")
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def array_items(self) -> Iterator[None]:
+        """
+        Yields once per element of an array; the caller must consume it.
+        """
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self._expect(",]") == "]":
+                return
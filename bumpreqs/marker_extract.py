@@ -1,60 +1,147 @@
-from typing import Any, Iterator, Optional, Tuple
+import functools
+from typing import Any, Optional
 
 from packaging._parser import Variable
 
 from packaging.markers import Marker
+from packaging.version import InvalidVersion, Version
 
-from .vrange import TooComplicated, VersionIntervals
+from .vrange import (
+    compile_specifier,
+    IN,
+    MAX,
+    MIN,
+    OUT,
+    TooComplicated,
+    VersionIntervals,
+)
 
-# This does not include all operators, notably the string comparisons "in", "not
-# in", and "~=" have no way to flip.
+# For moving the variable to the left, `"3.8" > python_version` being
+# `python_version < "3.8"`.  This does not include all operators, notably the
+# string comparisons "in", "not in", and "~=" have no way to flip.
 CONVERSE_MAP = {
     "===": "===",
     "==": "==",
     "!=": "!=",
-    "<": ">=",
-    "<=": ">",
-    ">": "<=",
-    ">=": "<",
+    "<": ">",
+    "<=": ">=",
+    ">": "<",
+    ">=": "<=",
 }
 
+# How many components the variable's value has; `python_version` is "3.8" even
+# on 3.8.10, so `python_version > "3.8"` means 3.9 and up.
+PRECISION = {"python_version": 2, "python_full_version": 3}
 
-# This is largely patterend after packaging/markers.py:_evaluate_markers
-# The  tuple is e.g. ("python_version", ">=", "3.0") and the version will always
-# be the last item.
-def _extract_python_internal(markers: Any) -> Iterator[Tuple[str, str, str]]:
-    for marker in markers:
-        if isinstance(marker, list):
-            yield from _extract_python_internal(marker)
-        elif isinstance(marker, tuple):
-            lhs, op, rhs = marker
-
-            # packaging appears to have an additional restriction not mentioned
-            # in the grammar, that you can't compare two Variables or two
-            # literals.  Duplicate that here.
-            if isinstance(lhs, Variable):
-                if lhs.value in ("python_version", "python_full_version"):
-                    yield (lhs.value, op.value, rhs.value)
-            else:
-                if rhs.value in ("python_version", "python_full_version"):
-                    if op.value in CONVERSE_MAP:
-                        yield (rhs.value, CONVERSE_MAP[op.value], lhs.value)
-                    else:
-                        raise TooComplicated
-        # TODO: else 'and' 'or'
+# How a comparison against "X.Y.Z" becomes one against "X.Y" for a variable
+# that's only ever "X.Y".
+PAST_PRECISION_MAP = {"<": "<=", "<=": "<=", ">": ">", ">=": ">"}
 
+# The same handful of markers repeat across every line and file.
+MARKER_CACHE_SIZE = 4096
 
-def extract_python(markers: Optional[Marker]) -> Optional[VersionIntervals]:
-    allow_all = VersionIntervals()
-    vi = VersionIntervals()
 
+def extract_python(markers: Optional[Marker]) -> Optional[VersionIntervals]:
+    """
+    The pythons that `markers` can be true on, or None if that's all of them.
+    """
     if markers is None:
         return None
 
-    for var, op, value in _extract_python_internal(markers._markers):
-        vi = vi.intersect(VersionIntervals.from_str(f"{op}{value}"))
-
-    if vi == allow_all:
+    vi = compile_marker(markers)
+    if vi == VersionIntervals():
         return None
+    return vi
+
 
+def compile_marker(marker: Marker) -> VersionIntervals:
+    """
+    Like `extract_python` but with everything as VersionIntervals().  Memoized
+    by the marker's string form, so the result is shared and must not be
+    modified.
+    """
+    vi = _compile(str(marker))
+    if vi is None:
+        raise TooComplicated(str(marker))
     return vi
+
+
+@functools.lru_cache(maxsize=MARKER_CACHE_SIZE)
+def _compile(s: str) -> Optional[VersionIntervals]:
+    try:
+        return _compile_markers(Marker(s)._markers)
+    except TooComplicated:
+        return None
+
+
+# This is largely patterned after packaging/markers.py:_evaluate_markers, where
+# "and" binds tighter than "or".  Anything that doesn't mention the python
+# version could be true on any python.
+def _compile_markers(markers: Any) -> VersionIntervals:
+    union = VersionIntervals([])
+    group = VersionIntervals()
+    for marker in markers:
+        if isinstance(marker, list):
+            group = group.intersect(_compile_markers(marker))
+        elif isinstance(marker, tuple):
+            group = group.intersect(_compile_comparison(*marker))
+        elif marker == "or":
+            union = union.union(group)
+            group = VersionIntervals()
+    return union.union(group)
+
+
+def _compile_comparison(lhs: Any, op: Any, rhs: Any) -> VersionIntervals:
+    # packaging appears to have an additional restriction not mentioned in the
+    # grammar, that you can't compare two Variables or two literals.  Duplicate
+    # that here.
+    if isinstance(lhs, Variable):
+        var, operator, value = lhs.value, op.value, rhs.value
+    else:
+        var, value = rhs.value, lhs.value
+        if var in PRECISION:
+            if op.value not in CONVERSE_MAP:
+                raise TooComplicated(op.value)
+            operator = CONVERSE_MAP[op.value]
+
+    if var not in PRECISION:
+        return VersionIntervals()
+
+    if "*" in value and operator in ("==", "!="):
+        return compile_specifier(f"{operator}{value}")
+
+    parts = value.split(".")
+    if var == "python_version" and len(parts) == PRECISION["python_full_version"]:
+        # "3.8" sorts before "3.8.1" (but equals "3.8.0"), so on all of 3.8
+        # `python_version < "3.8.1"` is true and `== "3.8.1"` false.
+        if not parts[2].isdigit():
+            raise TooComplicated(value)
+        if int(parts[2]):
+            if operator == "==":
+                return VersionIntervals([])
+            elif operator == "!=":
+                return VersionIntervals()
+            operator = PAST_PRECISION_MAP.get(operator, operator)
+        parts = parts[:2]
+    if len(parts) > PRECISION[var]:
+        raise TooComplicated(value)
+    parts += ["0"] * (PRECISION[var] - len(parts))
+    try:
+        v = Version(".".join(parts))
+        following = Version(".".join(parts[:-1] + [str(int(parts[-1]) + 1)]))
+    except (InvalidVersion, ValueError):
+        raise TooComplicated(value)
+
+    if operator == "<":
+        return VersionIntervals([(MIN, IN), (v, OUT)])
+    elif operator == "<=":
+        return VersionIntervals([(MIN, IN), (following, OUT)])
+    elif operator == ">":
+        return VersionIntervals([(following, IN), (MAX, OUT)])
+    elif operator == ">=":
+        return VersionIntervals([(v, IN), (MAX, OUT)])
+    elif operator == "==":
+        return VersionIntervals([(v, IN), (following, OUT)])
+    elif operator == "!=":
+        return VersionIntervals([(MIN, IN), (v, OUT), (following, IN), (MAX, OUT)])
+    raise TooComplicated(operator)
@@ -0,0 +1,131 @@
+"""
+Looking for projects on several indexes at once, e.g. a private one for
+internal packages and pypi for the rest.
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Mapping, Optional, Sequence
+
+from packaging.utils import canonicalize_name
+
+from .index import Index, ProjectNotFound, Releases
+
+LOG = logging.getLogger(__name__)
+
+# "first": the releases of the first index, in order, that has the project.
+#          Any index before it must say it doesn't: one that failed or didn't
+#          answer might have it, and answering from a later one could pick up
+#          a public project squatting on a private name.
+# "merge": every version from every index that has it.
+POLICIES = ("first", "merge")
+
+
+class MultiIndex(Index):
+    """
+    Asks each of `indexes` for a project at the same time, and combines their
+    answers according to `policy` (see `POLICIES`).
+
+    An index that hasn't answered within `budget` seconds of being asked is
+    treated as having failed for that project, so a slow mirror costs at most
+    that much.  Each index is asked on a daemon thread of its own, so one that
+    overruns the budget doesn't hold up the interpreter's exit either.  `pins`
+    maps project names to the only indexes worth asking for them.
+
+    Serials from different indexes can't be compared, so there's no changelog,
+    and a state always fetches everything.
+    """
+
+    def __init__(
+        self,
+        indexes: Sequence[Index],
+        policy: str = "first",
+        budget: Optional[float] = None,
+        pins: Optional[Mapping[str, Sequence[Index]]] = None,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}")
+        self.indexes = list(indexes)
+        self.policy = policy
+        self.budget = budget
+        self.pins: Dict[str, List[Index]] = {
+            canonicalize_name(name): list(pinned)
+            for name, pinned in (pins or {}).items()
+        }
+
+    def indexes_for(self, project_name: str) -> List[Index]:
+        return self.pins.get(canonicalize_name(project_name), self.indexes)
+
+    def fetch(self, project_name: str) -> Releases:
+        indexes = self.indexes_for(project_name)
+        if len(indexes) == 1 and self.budget is None:
+            return indexes[0].fetch(project_name)
+
+        deadline = None if self.budget is None else time.monotonic() + self.budget
+        futures = [_fetch_in_background(index, project_name) for index in indexes]
+        found: List[Releases] = []
+        errors: List[Exception] = []
+        # In order, so that "first" needn't wait on indexes after the one that
+        # has the project.
+        for index, future in zip(indexes, futures):
+            timeout = (
+                None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+            try:
+                releases = future.result(timeout)
+            except concurrent.futures.TimeoutError:
+                LOG.info(
+                    "No answer from %s for %r in time", _describe(index), project_name
+                )
+                errors.append(
+                    TimeoutError(f"No answer from {_describe(index)} in {self.budget}s")
+                )
+            except Exception as e:
+                errors.append(e)
+            else:
+                if self.policy == "first":
+                    return releases
+                found.append(releases)
+                continue
+            if self.policy == "first" and not isinstance(errors[-1], ProjectNotFound):
+                # Only "not here" lets a later index answer.
+                raise errors[-1]
+
+        if found:
+            return _merge(found)
+        # An index that failed might well have had it.
+        raise next(
+            (error for error in errors if not isinstance(error, ProjectNotFound)),
+            errors[0],
+        )
+
+
+def _fetch_in_background(index: Index, project_name: str) -> "Future[Releases]":
+    future: "Future[Releases]" = Future()
+
+    def run() -> None:
+        try:
+            future.set_result(index.fetch(project_name))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _describe(index: Index) -> str:
+    return getattr(index, "url", type(index).__name__)
+
+
+def _merge(found: Sequence[Releases]) -> Releases:
+    # The same file can be on several indexes, e.g. a mirror and its upstream.
+    merged: Releases = {}
+    for releases in found:
+        for version, files in releases.items():
+            have = merged.setdefault(version, [])
+            names = {f.filename for f in have}
+            have.extend(f for f in files if f.filename not in names)
+    return merged
@@ -0,0 +1,160 @@
+"""
+A compact, memory-mappable copy of the versions, requires_python and first
+upload times of a set of projects, for bumping without any network access.
+
+The layout is:
+
+    header   magic, project count
+    entries  one fixed-size record per project, sorted by normalized name:
+             (name offset, name length, data offset, data length)
+    data     names, and per project
+             "version<TAB>requires_python<TAB>first upload<LF>" lines
+
+so finding a project is a binary search over the entries, and only that
+project's data is ever decoded.
+"""
+
+import datetime
+import mmap
+import struct
+import time
+from pathlib import Path
+from typing import Iterator, List, Mapping, Optional, Tuple, Union
+
+from packaging.utils import canonicalize_name
+
+from . import stats
+from .atomic import atomic_write
+from .index import first_upload, Index, ProjectNotFound, ReleaseFile, Releases
+
+MAGIC = b"BRSNAP\x00\x02"
+# Before upload times were kept; still readable.
+OLD_MAGICS = (b"BRSNAP\x00\x01",)
+HEADER = struct.Struct("<8sQ")
+ENTRY = struct.Struct("<QIQI")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def write_snapshot(path: Union[str, Path], projects: Mapping[str, Releases]) -> None:
+    """
+    Only releases that have files are kept, and only the requires_python of
+    their first file and when their earliest was uploaded, which is all that
+    version selection looks at.
+    """
+    items: List[Tuple[bytes, bytes]] = []
+    for name, releases in projects.items():
+        lines = [
+            f"{version}\t{files[0].requires_python or ''}\t{_iso(files)}\n"
+            for version, files in releases.items()
+            if files
+        ]
+        items.append((canonicalize_name(name).encode(), "".join(lines).encode()))
+    items.sort()
+
+    offset = HEADER.size + ENTRY.size * len(items)
+    entries = []
+    for key, data in items:
+        entries.append(ENTRY.pack(offset, len(key), offset + len(key), len(data)))
+        offset += len(key) + len(data)
+
+    with atomic_write(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(items)))
+        f.writelines(entries)
+        for key, data in items:
+            f.write(key)
+            f.write(data)
+
+
+def _iso(files: List[ReleaseFile]) -> str:
+    uploaded = first_upload(files)
+    if uploaded is None:
+        return ""
+    return datetime.datetime.fromtimestamp(uploaded, datetime.timezone.utc).isoformat()
+
+
+class Snapshot:
+    """
+    A read-only view of a snapshot file.  Opening one only maps it; nothing is
+    parsed until a project is looked up.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        with open(path, "rb") as f:
+            try:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"{path} is empty")
+        if self._mm[: len(MAGIC)] not in (MAGIC, *OLD_MAGICS):
+            self._mm.close()
+            raise SnapshotError(f"{path} is not a bumpreqs snapshot")
+        self._count = HEADER.unpack_from(self._mm)[1]
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return int(self._count)
+
+    def _entry(self, i: int) -> Tuple[int, ...]:
+        return ENTRY.unpack_from(self._mm, HEADER.size + ENTRY.size * i)
+
+    def _name(self, i: int) -> bytes:
+        name_offset, name_len, _, _ = self._entry(i)
+        return self._mm[name_offset : name_offset + name_len]
+
+    def names(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self._name(i).decode()
+
+    def get(self, project_name: str) -> Optional[Releases]:
+        target = canonicalize_name(project_name).encode()
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._count or self._name(lo) != target:
+            return None
+
+        _, _, data_offset, data_len = self._entry(lo)
+        releases: Releases = {}
+        for line in (
+            self._mm[data_offset : data_offset + data_len].decode().splitlines()
+        ):
+            version, requires_python, uploaded = (line.split("\t") + [""])[:3]
+            releases[version] = [
+                ReleaseFile("", requires_python or None, uploaded or None)
+            ]
+        return releases
+
+    def __contains__(self, project_name: object) -> bool:
+        return isinstance(project_name, str) and self.get(project_name) is not None
+
+
+class SnapshotIndex(Index):
+    """
+    Answers entirely from a snapshot file; projects that aren't in it fail
+    just like they would if the index returned a 404.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.snapshot = Snapshot(path)
+
+    def fetch(self, project_name: str) -> Releases:
+        t0 = time.perf_counter()
+        releases = self.snapshot.get(project_name)
+        if releases is None:
+            raise ProjectNotFound(f"{project_name} is not in the snapshot")
+        stats.emit(
+            "fetch",
+            project=project_name,
+            seconds=time.perf_counter() - t0,
+            bytes=0,
+            source="snapshot",
+        )
+        return releases
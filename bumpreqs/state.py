@@ -0,0 +1,97 @@
+"""
+What was chosen for each project last time, and at which index serial, so that
+a later run can skip every project the index says hasn't changed since.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple, Union
+
+from .atomic import atomic_write
+
+STATE_VERSION = 2
+
+
+class IncrementalState:
+    """
+    A small json file:
+
+        {
+          "version": 2,
+          "serial": <the index's serial when the last run started>,
+          "projects": {
+            <normalized name>: {
+              "serial": <the project's serial when it was last fetched>,
+              "releases": [[<version>, <requires_python>], ...]
+            }
+          }
+        }
+
+    where the releases are just enough to make the same choices again (see
+    `Candidates.representatives`).
+
+    A project's entry stays valid until the changelog shows a change to it
+    newer than its serial; `sync` drops any that are stale.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        self.serial: Optional[int] = None
+        self.projects: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get("version") == STATE_VERSION:
+            self.serial = data["serial"]
+            self.projects = data["projects"]
+
+    def sync(self, serial: int, changes: Mapping[str, int]) -> Set[str]:
+        """
+        Moves up to the index's current `serial`, forgetting every project
+        changed since it was recorded.  Returns the projects that are still
+        known, and so don't need fetching.
+        """
+        with self._lock:
+            if self.serial is None:
+                # Recorded without a starting point, so can't be trusted.
+                self.projects.clear()
+            for name, changed_at in changes.items():
+                entry = self.projects.get(name)
+                if entry is not None and changed_at > entry["serial"]:
+                    del self.projects[name]
+            self.serial = serial
+            return set(self.projects)
+
+    def releases(self, name: str) -> Optional[List[Tuple[str, Optional[str]]]]:
+        entry = self.projects.get(name)
+        if entry is None:
+            return None
+        return [
+            (version, requires_python) for version, requires_python in entry["releases"]
+        ]
+
+    def record(
+        self, name: str, serial: int, releases: List[Tuple[str, Optional[str]]]
+    ) -> None:
+        with self._lock:
+            self.projects[name] = {
+                "serial": serial,
+                "releases": [list(r) for r in releases],
+            }
+
+    def save(self) -> None:
+        with self._lock:
+            text = json.dumps(
+                {
+                    "version": STATE_VERSION,
+                    "serial": self.serial,
+                    "projects": self.projects,
+                },
+                sort_keys=True,
+            )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.path) as f:
+            f.write(text)
@@ -0,0 +1,135 @@
+import contextlib
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List
+
+# Called with an event name and its data, from whichever thread it happened on.
+#   phase:  name, seconds
+#   fetch:  project, seconds, bytes, source ("network", "cache" or "revalidated")
+#   retry:  url, reason
+Hook = Callable[[str, Dict[str, Any]], None]
+
+_HOOKS: List[Hook] = []
+
+
+def add_hook(hook: Hook) -> None:
+    _HOOKS.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    _HOOKS.remove(hook)
+
+
+def enabled() -> bool:
+    """Whether anyone is listening; instrumentation is skipped otherwise."""
+    return bool(_HOOKS)
+
+
+def emit(event: str, **data: Any) -> None:
+    for hook in _HOOKS:
+        hook(event, data)
+
+
+@contextlib.contextmanager
+def timed(phase: str) -> Iterator[None]:
+    if not _HOOKS:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        emit("phase", name=phase, seconds=time.perf_counter() - t0)
+
+
+class Stats:
+    """
+    A hook that totals up everything emitted while it's registered.
+
+        with Stats() as stats:
+            fix(...)
+        print(stats.summary())
+    """
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, float] = {}
+        self.fetches: List[Dict[str, Any]] = []
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            if event == "phase":
+                self.phases[data["name"]] = (
+                    self.phases.get(data["name"], 0.0) + data["seconds"]
+                )
+            elif event == "fetch":
+                self.fetches.append(data)
+            elif event == "retry":
+                self.retries += 1
+
+    def __enter__(self) -> "Stats":
+        add_hook(self)
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        remove_hook(self)
+
+    def to_json(self) -> Dict[str, Any]:
+        sources = Counter(f["source"] for f in self.fetches)
+        latencies = sorted(f["seconds"] for f in self.fetches)
+        return {
+            "phases": {k: round(v, 6) for k, v in self.phases.items()},
+            "fetch": {
+                "count": len(self.fetches),
+                "bytes": sum(f["bytes"] for f in self.fetches),
+                "p50_s": _percentile(latencies, 0.5),
+                "p90_s": _percentile(latencies, 0.9),
+                "max_s": latencies[-1] if latencies else None,
+                "retries": self.retries,
+            },
+            "cache": {
+                "hits": sources["cache"],
+                "revalidated": sources["revalidated"],
+                "misses": sources["network"],
+            },
+            "projects": {
+                f["project"]: {k: v for k, v in f.items() if k != "project"}
+                for f in self.fetches
+            },
+        }
+
+    def summary(self) -> str:
+        data = self.to_json()
+        lines = ["Phases:"]
+        for name, seconds in data["phases"].items():
+            lines.append(f"  {name:<10} {seconds:8.3f}s")
+
+        fetch = data["fetch"]
+        lines.append(
+            f"Fetches: {fetch['count']} projects, {fetch['bytes'] / 1e6:.1f} MB, "
+            f"{fetch['retries']} retries"
+        )
+        if fetch["count"]:
+            lines.append(
+                f"  latency p50 {fetch['p50_s'] * 1000:.0f}ms"
+                f" p90 {fetch['p90_s'] * 1000:.0f}ms"
+                f" max {fetch['max_s'] * 1000:.0f}ms"
+            )
+
+        cache = data["cache"]
+        if cache["hits"] or cache["revalidated"]:
+            total = sum(cache.values())
+            hits = cache["hits"] + cache["revalidated"]
+            lines.append(
+                f"Cache: {cache['hits']} hits, {cache['revalidated']} revalidated, "
+                f"{cache['misses']} misses ({hits / total:.0%} hit rate)"
+            )
+        return "\n".join(lines)
+
+
+def _percentile(sorted_values: List[float], p: float) -> Any:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
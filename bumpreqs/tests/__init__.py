@@ -1,10 +1,45 @@
+from .atomic import AtomicWriteTest
+from .bench import BenchTest
+from .cache import MetadataCacheTest
+from .candidates import CandidatesTest
+from .cli import CliTest
+from .client import IndexClientTest, RateLimiterTest
 from .core import FetchVersionsTest, FixTest
+from .daemon import DaemonTest
+from .discover import DiscoverTest
+from .includes import IncludesTest
+from .index import IndexTest
+from .jsonstream import JsonStreamTest
 from .marker_extract import MarkerExtractTest
+from .multiindex import MultiIndexTest
+from .snapshot import SnapshotTest
+from .startup import StartupTest
+from .state import IncrementalStateTest
+from .stats import StatsTest
 from .vrange import VersionIntervalsTest
+from .wheels import WheelsTest
 
 __all__ = [
+    "AtomicWriteTest",
+    "BenchTest",
+    "CandidatesTest",
+    "CliTest",
+    "DaemonTest",
+    "DiscoverTest",
+    "IndexClientTest",
+    "RateLimiterTest",
+    "MetadataCacheTest",
     "FixTest",
     "FetchVersionsTest",
+    "IncludesTest",
+    "IncrementalStateTest",
+    "IndexTest",
+    "JsonStreamTest",
     "VersionIntervalsTest",
     "MarkerExtractTest",
+    "MultiIndexTest",
+    "SnapshotTest",
+    "StartupTest",
+    "StatsTest",
+    "WheelsTest",
 ]
@@ -0,0 +1,56 @@
+import os
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+
+from ..atomic import atomic_write
+
+
+class AtomicWriteTest(unittest.TestCase):
+    def setUp(self) -> None:
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        self.path = Path(td.name)
+
+    def test_replaces(self) -> None:
+        target = self.path / "requirements.txt"
+        target.write_text("old\n")
+        os.chmod(target, 0o640)
+        with atomic_write(target) as f:
+            f.write("new\n")
+            self.assertEqual("old\n", target.read_text())
+        self.assertEqual("new\n", target.read_text())
+        self.assertEqual(0o640, stat.S_IMODE(target.stat().st_mode))
+        self.assertEqual(["requirements.txt"], os.listdir(self.path))
+
+    def test_new_file(self) -> None:
+        old = os.umask(0o022)
+        self.addCleanup(os.umask, old)
+        with atomic_write(self.path / "new.bin", "wb") as f:
+            f.write(b"\x00")
+        self.assertEqual(b"\x00", (self.path / "new.bin").read_bytes())
+        self.assertEqual(0o644, stat.S_IMODE((self.path / "new.bin").stat().st_mode))
+
+    def test_symlink(self) -> None:
+        target = self.path / "real.txt"
+        target.write_text("old\n")
+        link = self.path / "requirements.txt"
+        link.symlink_to(target.name)
+        with atomic_write(link) as f:
+            f.write("new\n")
+        self.assertTrue(link.is_symlink())
+        self.assertEqual("new\n", target.read_text())
+        self.assertEqual(
+            ["real.txt", "requirements.txt"], sorted(os.listdir(self.path))
+        )
+
+    def test_failure_keeps_original(self) -> None:
+        target = self.path / "requirements.txt"
+        target.write_text("old\n")
+        with self.assertRaises(ValueError):
+            with atomic_write(target) as f:
+                f.write("partial")
+                raise ValueError()
+        self.assertEqual("old\n", target.read_text())
+        self.assertEqual(["requirements.txt"], os.listdir(self.path))
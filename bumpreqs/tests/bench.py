@@ -0,0 +1,51 @@
+import json
+import random
+import unittest
+
+from click.testing import CliRunner
+
+from ..bench import main, make_projects, make_requirements, summarize
+
+
+class BenchTest(unittest.TestCase):
+    def test_generators(self) -> None:
+        rng = random.Random(0)
+        projects = make_projects(20, 50, rng)
+        self.assertEqual(20, len(projects))
+        self.assertTrue(all(1 <= len(p) <= 50 for p in projects.values()))
+        text = make_requirements(100, sorted(projects), rng)
+        self.assertEqual(100, text.count("\n"))
+
+    def test_summarize(self) -> None:
+        s = summarize([0.001, 0.002, 0.003, 0.004], items=10)
+        self.assertEqual(4, s["samples"])
+        self.assertEqual(4000.0, s["throughput_per_s"])
+        self.assertEqual(3.0, s["p50_ms"])
+        self.assertEqual(4.0, s["max_ms"])
+
+    def test_smoke(self) -> None:
+        result = CliRunner().invoke(
+            main,
+            [
+                "--projects=5",
+                "--max-releases=20",
+                "--sizes=10",
+                "--tree-dirs=30",
+                "--repeat=1",
+            ],
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        stages = json.loads(result.output)["stages"]
+        self.assertEqual(
+            [
+                "marker_extract",
+                "vrange",
+                "discover",
+                "fetch_json",
+                "fetch_simple",
+                "fix_json_10",
+                "fix_simple_10",
+            ],
+            list(stages),
+        )
+        self.assertIn("p99_ms", stages["fix_json_10"])
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import patch
+
+from ..cache import CacheEntry, default_cache_dir, MetadataCache
+
+
+class MetadataCacheTest(unittest.TestCase):
+    def test_roundtrip(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d)
+            self.assertIsNone(cache.get("foo"))
+
+            chunks = [b'{"x":', b" 1}\n"]
+            entry = CacheEntry('"abc"', None)
+            self.assertEqual(chunks, list(cache.write("foo", entry, chunks)))
+            self.assertEqual(b'{"x": 1}\n', b"".join(cache.read("foo")))
+
+            stored = cache.get("foo")
+            assert stored is not None
+            self.assertEqual(entry, stored._replace(fetched_at=0.0))
+            self.assertTrue(cache.is_fresh(stored))
+            self.assertFalse(cache.is_fresh(entry))
+            self.assertEqual({"If-None-Match": '"abc"'}, entry.validators())
+
+    def test_touch(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d, ttl=60)
+            list(cache.write("foo", CacheEntry(None, None), [b"{}"]))
+            os.utime(Path(d, "foo.cache"), (0, 0))
+            stale = cache.get("foo")
+            assert stale is not None
+            self.assertFalse(cache.is_fresh(stale))
+
+            cache.touch("foo")
+            fresh = cache.get("foo")
+            assert fresh is not None
+            self.assertTrue(cache.is_fresh(fresh))
+
+    def test_partial_write(self) -> None:
+        def chunks() -> Iterator[bytes]:
+            yield b"{"
+            raise ValueError("connection dropped")
+
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d)
+            with self.assertRaises(ValueError):
+                list(cache.write("foo", CacheEntry(None, None), chunks()))
+            self.assertIsNone(cache.get("foo"))
+            self.assertEqual([], os.listdir(d))
+
+    def test_validators(self) -> None:
+        entry = CacheEntry(None, "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertEqual(
+            {"If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}, entry.validators()
+        )
+        self.assertEqual({}, entry._replace(last_modified=None).validators())
+
+    @patch.dict("os.environ", {"XDG_CACHE_HOME": "/xdg"})
+    def test_default_cache_dir(self) -> None:
+        self.assertEqual(Path("/xdg/bumpreqs"), default_cache_dir())
+
+    def test_corrupt(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d)
+            Path(d, "foo.cache").write_bytes(b"garbage")
+            self.assertIsNone(cache.get("foo"))
+
+    def test_evict_by_size(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d, max_size=400)
+            for name in ["a", "b", "c"]:
+                list(cache.write(name, CacheEntry(None, "then"), [b"x" * 100]))
+                time.sleep(0.01)
+
+            self.assertIsNone(cache.get("a"))
+            self.assertIsNotNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("c"))
+
+            # A fresh instance picks up the existing size from disk
+            cache = MetadataCache(d, max_size=400)
+            list(cache.write("d", CacheEntry(None, None), [b"x" * 100]))
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("d"))
@@ -0,0 +1,130 @@
+import unittest
+from typing import Any, Optional
+from unittest.mock import patch
+
+from packaging.version import Version
+
+from ..candidates import Candidates, parse_version
+from ..index import first_upload, ReleaseFile, Releases, upload_timestamp
+from ..vrange import overlaps, VersionIntervals
+
+
+def releases(*items: Any) -> Releases:
+    return {v: [ReleaseFile(f"x-{v}.tar.gz", rp)] for v, rp in items}
+
+
+class CandidatesTest(unittest.TestCase):
+    def test_order_and_legacy(self) -> None:
+        c = Candidates(
+            {
+                **releases(("1.0", None), ("2.0b1", None), ("1.10", None)),
+                "0.1-weird version": [ReleaseFile("x.tar.gz", None)],
+                "3.0": [],
+            }
+        )
+        self.assertEqual([Version("2.0b1"), Version("1.10"), Version("1.0")], list(c))
+        # Iterating again reuses the order already worked out
+        self.assertEqual([Version("2.0b1"), Version("1.10"), Version("1.0")], list(c))
+        self.assertEqual(Version("1.10"), c.latest())
+        self.assertEqual(Version("2.0b1"), c.latest(prereleases=True))
+        self.assertIsNone(parse_version("0.1-weird version"))
+
+    def test_requires_python(self) -> None:
+        r = releases(("1.0", ">=2.7"), ("2.0", ">=3.8"), ("3.0", ">=3.10"))
+        self.assertEqual(
+            Version("2.0"), Candidates(r, VersionIntervals.from_str("<3.9")).latest()
+        )
+        self.assertIsNone(Candidates(r, VersionIntervals.from_str("<2.7")).latest())
+        self.assertEqual(Version("3.0"), Candidates(r).latest())
+
+    @patch("bumpreqs.candidates.overlaps", side_effect=overlaps)
+    def test_early_exit(self, overlaps_mock: Any) -> None:
+        r = releases(*[(f"1.{i}", f">=3.{i % 12}") for i in range(2000)])
+        c = Candidates(r, VersionIntervals.from_str("<3.9"))
+        # 1.1999 needs >=3.7, which fits
+        self.assertEqual(Version("1.1999"), c.latest())
+        self.assertEqual(1, overlaps_mock.call_count)
+
+        c = Candidates(r, VersionIntervals.from_str("<3.4"))
+        # 1.1999, 1.1998, 1.1997 and 1.1996 need at least 3.4
+        self.assertEqual(Version("1.1995"), c.latest())
+        self.assertEqual(1 + 5, overlaps_mock.call_count)
+
+    @patch("bumpreqs.candidates.first_upload", side_effect=first_upload)
+    def test_as_of(self, first_upload_mock: Any) -> None:
+        r = {
+            "1.0": [ReleaseFile("x-1.0.tar.gz", None, "2020-01-01T00:00:00")],
+            # The wheel came later, but the release counts from its sdist
+            "1.1": [
+                ReleaseFile("x-1.1-py3-none-any.whl", None, "2022-01-01T00:00:00Z"),
+                ReleaseFile("x-1.1.tar.gz", None, "2021-01-01T00:00:00Z"),
+            ],
+            # A backport, uploaded after 2.0
+            "1.2": [ReleaseFile("x-1.2.tar.gz", None, "2023-06-01T00:00:00Z")],
+            "2.0": [ReleaseFile("x-2.0.tar.gz", None, "2023-01-01T00:00:00Z")],
+            "3.0": [ReleaseFile("x-3.0.tar.gz", None)],
+        }
+
+        def latest(when: str) -> Optional[Version]:
+            return Candidates(r, as_of=upload_timestamp(when)).latest()
+
+        self.assertEqual(Version("1.1"), latest("2021-06-01T00:00:00"))
+        self.assertEqual(Version("1.1"), latest("2021-01-01T00:00:00"))
+        self.assertEqual(Version("1.0"), latest("2020-12-31T23:59:59"))
+        self.assertEqual(Version("2.0"), latest("2023-05-01T00:00:00"))
+        # No upload time, so never known to have been out
+        self.assertEqual(Version("2.0"), latest("2099-01-01T00:00:00"))
+        self.assertIsNone(latest("2019-01-01T00:00:00"))
+        self.assertEqual(Version("3.0"), Candidates(r).latest())
+
+        # Only releases that could be the answer are looked at
+        first_upload_mock.reset_mock()
+        self.assertEqual(Version("2.0"), latest("2024-01-01T00:00:00"))
+        self.assertEqual(2, first_upload_mock.call_count)
+
+    def test_latest_for(self) -> None:
+        r = releases(
+            ("1.0", ">=2.7"),
+            ("2.0", ">=3.8"),
+            ("2.1", ">=3.9,<3.12"),
+            ("3.0a1", ">=3.10"),
+            ("3.0", ">=3.11"),
+        )
+        pythons = [
+            VersionIntervals.from_str(f"=={p}.*") for p in ("3.7", "3.9", "3.12")
+        ]
+        c = Candidates(r)
+        self.assertEqual(
+            ([Version("1.0"), Version("2.1"), Version("3.0")], Version("1.0")),
+            c.latest_for(pythons),
+        )
+        self.assertEqual(
+            ([Version("2.1"), Version("3.0")], Version("2.0")),
+            c.latest_for(pythons[1:]),
+        )
+        self.assertEqual(([], Version("3.0")), c.latest_for([], prereleases=True))
+        # The line's own constraint still applies
+        c = Candidates(r, VersionIntervals.from_str("<3.8"))
+        self.assertEqual(([Version("1.0")], Version("1.0")), c.latest_for(pythons[2:]))
+
+    def test_representatives(self) -> None:
+        r = releases(
+            ("1.0", None),
+            ("1.1", None),
+            ("2.0", ">=3.8"),
+            ("2.1a1", ">=3.8"),
+            ("3.0a1", ">=3.10"),
+        )
+        kept = Candidates(r).representatives()
+        self.assertEqual(
+            [("3.0a1", ">=3.10"), ("2.1a1", ">=3.8"), ("2.0", ">=3.8"), ("1.1", None)],
+            kept,
+        )
+        # Every choice comes out the same from just these
+        for constraint in (None, "<3.8", "<3.10", ">=3.10"):
+            vi = VersionIntervals.from_str(constraint) if constraint else None
+            for pre in (False, True):
+                self.assertEqual(
+                    Candidates(r, vi).latest(pre),
+                    Candidates(releases(*kept), vi).latest(pre),
+                )
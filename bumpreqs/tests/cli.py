@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from ..candidates import Candidates
+from ..cli import main
+from .core import fake_fetch_releases
+
+
+@patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+class CliTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.runner = CliRunner()
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        self.path = Path(td.name)
+        (self.path / "a.txt").write_text("foo==1.0\n")
+        (self.path / "b.txt").write_text("foo==1.0\nfoup\n")
+        self.args = ["--no-cache", str(self.path / "a.txt"), str(self.path / "b.txt")]
+
+    def test_no_filenames(self, fetch_releases_mock: Any) -> None:
+        result = self.runner.invoke(main, [])
+        self.assertEqual("Provide filenames\n", result.output)
+
+    def test_diff(self, fetch_releases_mock: Any) -> None:
+        result = self.runner.invoke(main, self.args)
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn("-foo==1.0\n+foo==1.2.3\n", result.output)
+        self.assertIn("+foup==1.2.3\n", result.output)
+        self.assertLess(
+            result.output.index(str(self.path / "a.txt")),
+            result.output.index(str(self.path / "b.txt")),
+        )
+        self.assertEqual("foo==1.0\n", (self.path / "a.txt").read_text())
+        # Shared across both files
+        self.assertEqual(2, fetch_releases_mock.call_count)
+
+    def test_write(self, fetch_releases_mock: Any) -> None:
+        result = self.runner.invoke(main, ["--write", *self.args])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertNotIn("+foo", result.output)
+        self.assertEqual("foo==1.2.3\n", (self.path / "a.txt").read_text())
+        self.assertEqual("foo==1.2.3\nfoup==1.2.3\n", (self.path / "b.txt").read_text())
+
+    def test_matrix(self, fetch_releases_mock: Any) -> None:
+        result = self.runner.invoke(
+            main, ["--python", "3.9", "--python", "3.12", "--split-markers", *self.args]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        # The fake has no requires_python, so there's nothing to split
+        self.assertIn("+foo==1.2.3\n", result.output)
+
+        for python in ("3", "banana", "3.12.1"):
+            result = self.runner.invoke(
+                main, ["--python", python, "--require-wheel", "win_amd64", *self.args]
+            )
+            self.assertEqual(2, result.exit_code)
+            self.assertIn(f"Invalid value for '--python': {python!r}", result.output)
+
+        result = self.runner.invoke(main, ["--split-markers", *self.args])
+        self.assertEqual(2, result.exit_code)
+        self.assertIn("needs at least one --python", result.output)
+
+    def test_write_failure(self, fetch_releases_mock: Any) -> None:
+        (self.path / "b.txt").write_text("foo==1.0\nfoo[\n")
+        result = self.runner.invoke(main, ["--write", *self.args])
+        self.assertNotEqual(0, result.exit_code)
+        # Never half written
+        self.assertEqual("foo==1.0\nfoo[\n", (self.path / "b.txt").read_text())
+        self.assertEqual(["a.txt", "b.txt"], sorted(os.listdir(self.path)))
+
+    def test_stats(self, fetch_releases_mock: Any) -> None:
+        stats_file = self.path / "stats.json"
+        result = self.runner.invoke(
+            main, ["--stats", "--stats-json", str(stats_file), *self.args]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn("Phases:", result.output)
+        phases = json.loads(stats_file.read_text())["phases"]
+        self.assertEqual(
+            {"read", "parse", "fetch", "render", "select", "diff", "total"},
+            set(phases),
+        )
+
+    def test_results_json(self, fetch_releases_mock: Any) -> None:
+        (self.path / "b.txt").write_text("# c\nfoo>=1.0\n")
+        results_file = self.path / "results.json"
+        result = self.runner.invoke(
+            main, ["--write", "--results-json", str(results_file), *self.args]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual("foo==1.2.3\n", (self.path / "a.txt").read_text())
+        results = json.loads(results_file.read_text())
+        self.assertEqual(
+            [str(self.path / "a.txt"), str(self.path / "b.txt")], list(results)
+        )
+        [a] = results[str(self.path / "a.txt")]
+        self.assertEqual(
+            ("foo", ["1.2.3"], True), (a["project"], a["new"], a["changed"])
+        )
+        [b] = results[str(self.path / "b.txt")]
+        self.assertEqual((2, "not a pin"), (b["lineno"], b["skipped"]))
+
+    def test_as_of(self, fetch_releases_mock: Any) -> None:
+        for args in (["--write"], []):
+            with patch("bumpreqs.core.Candidates", wraps=Candidates) as candidates:
+                result = self.runner.invoke(
+                    main, ["--as-of", "2024-01-01", *args, *self.args]
+                )
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertEqual(1704067200.0, candidates.call_args.args[3])
+
+        result = self.runner.invoke(
+            main,
+            ["--as-of", "2024-01-01", "--state", str(self.path / "s"), *self.args],
+        )
+        self.assertEqual(2, result.exit_code)
+        self.assertIn("--state doesn't keep", result.output)
+
+    def test_cache_dir(self, fetch_releases_mock: Any) -> None:
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": str(self.path / "xdg")}):
+            result = self.runner.invoke(main, self.args[1:])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIsNotNone(fetch_releases_mock.call_args.kwargs["index"].cache)
@@ -0,0 +1,171 @@
+import unittest
+from typing import Any, Dict, List, Optional
+from unittest.mock import Mock, patch
+
+import requests
+
+from ..client import (
+    _parse_retry_after,
+    BACKOFF_MAX,
+    CircuitBreaker,
+    default_client,
+    IndexClient,
+    IndexUnavailable,
+    RateLimiter,
+)
+
+
+class FakeResponse:
+    def __init__(self, status: int, headers: Optional[Dict[str, str]] = None) -> None:
+        self.status_code = status
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class IndexClientTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sleeps: List[float] = []
+        self.client = IndexClient(retries=2, sleep=self.sleeps.append)
+
+    def _respond(self, *responses: Any) -> Mock:
+        get = Mock(side_effect=responses)
+        self.client.session.get = get  # type: ignore[method-assign]
+        return get
+
+    def test_success(self) -> None:
+        ok = FakeResponse(200)
+        get = self._respond(ok)
+        self.assertIs(ok, self.client.get("http://x/", {"Accept": "y"}))
+        get.assert_called_once_with(
+            "http://x/", headers={"Accept": "y"}, stream=True, timeout=(5.0, 30.0)
+        )
+        self.assertEqual([], self.sleeps)
+
+    def test_not_retryable(self) -> None:
+        missing = FakeResponse(404)
+        self._respond(missing)
+        self.assertIs(missing, self.client.get("http://x/"))
+        self.assertFalse(missing.closed)
+
+    def test_retry_after(self) -> None:
+        busy = FakeResponse(429, {"Retry-After": "7"})
+        ok = FakeResponse(200)
+        self._respond(busy, ok)
+        self.assertIs(ok, self.client.get("http://x/"))
+        self.assertTrue(busy.closed)
+        self.assertEqual([7.0], self.sleeps)
+
+    def test_retries_exhausted(self) -> None:
+        responses = [FakeResponse(503), FakeResponse(502), FakeResponse(500)]
+        get = self._respond(*responses)
+        with patch("bumpreqs.client.random.uniform", side_effect=lambda a, b: b):
+            self.assertIs(responses[-1], self.client.get("http://x/"))
+        self.assertEqual(3, get.call_count)
+        self.assertEqual([0.5, 1.0], self.sleeps)
+
+    def test_connection_errors(self) -> None:
+        self._respond(requests.ConnectionError(), requests.Timeout(), FakeResponse(200))
+        self.assertEqual(200, self.client.get("http://x/").status_code)
+        self.assertEqual(2, len(self.sleeps))
+
+        self._respond(*[requests.ConnectionError()] * 3)
+        with self.assertRaises(requests.ConnectionError):
+            self.client.get("http://x/")
+
+    def test_breaker(self) -> None:
+        now = [0.0]
+        self.client = IndexClient(
+            retries=0,
+            sleep=self.sleeps.append,
+            breaker=CircuitBreaker(threshold=2, cooldown=10, clock=lambda: now[0]),
+        )
+        get = self._respond(
+            requests.ConnectionError(),
+            FakeResponse(404),
+            requests.Timeout(),
+            FakeResponse(503),
+            FakeResponse(503),
+            FakeResponse(200),
+        )
+        with self.assertRaises(requests.ConnectionError):
+            self.client.get("http://x/a")
+        # A 404 is an answer, so the count starts again
+        self.assertEqual(404, self.client.get("http://x/b").status_code)
+        with self.assertRaises(requests.Timeout):
+            self.client.get("http://x/c")
+        self.assertEqual(503, self.client.get("http://x/d").status_code)
+        with self.assertRaisesRegex(IndexUnavailable, "http://x/e after 2 failures"):
+            self.client.get("http://x/e")
+        self.assertEqual(4, get.call_count)
+
+        # One request goes through after the cooldown, and fails again
+        now[0] = 10
+        self.assertEqual(503, self.client.get("http://x/f").status_code)
+        with self.assertRaises(IndexUnavailable):
+            self.client.get("http://x/g")
+
+        now[0] = 20
+        self.assertEqual(200, self.client.get("http://x/h").status_code)
+        self._respond(FakeResponse(200))
+        self.assertEqual(200, self.client.get("http://x/i").status_code)
+
+    def test_breaker_probe(self) -> None:
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=1, cooldown=10, clock=lambda: now[0])
+        breaker.record(False)
+        now[0] = 10
+        breaker.check("http://x/probe")
+        # Only the one probe until it's answered
+        with self.assertRaises(IndexUnavailable):
+            breaker.check("http://x/other")
+        breaker.record(True)
+        breaker.check("http://x/other")
+
+    def test_parse_retry_after(self) -> None:
+        self.assertIsNone(_parse_retry_after(None))
+        self.assertIsNone(_parse_retry_after("soon"))
+        self.assertEqual(0.0, _parse_retry_after("-3"))
+        self.assertEqual(0.0, _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"))
+        self._respond(
+            FakeResponse(503, {"Retry-After": "Wed, 21 Oct 2099 07:28:00 GMT"}),
+            FakeResponse(200),
+        )
+        self.client.get("http://x/")
+        self.assertEqual([BACKOFF_MAX], self.sleeps)
+
+    def test_default_client(self) -> None:
+        self.assertIs(default_client(), default_client())
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_bucket(self) -> None:
+        now = [0.0]
+        sleeps: List[float] = []
+        limiter = RateLimiter(2, burst=2, clock=lambda: now[0], sleep=sleeps.append)
+        limiter.acquire()
+        limiter.acquire()
+        self.assertEqual([], sleeps)
+        # Bucket is empty, the next token is half a second away
+        limiter.acquire()
+        self.assertEqual([0.5], sleeps)
+        # and the one after that has to queue behind it
+        limiter.acquire()
+        self.assertEqual([0.5, 1.0], sleeps)
+
+        now[0] = 10.0
+        limiter.acquire()
+        self.assertEqual([0.5, 1.0], sleeps)
+
+    def test_client_uses_limiter(self) -> None:
+        sleeps: List[float] = []
+        client = IndexClient(max_rate=1000, sleep=sleeps.append)
+        assert client.rate_limiter is not None
+        client.session.get = Mock(  # type: ignore[method-assign]
+            return_value=FakeResponse(200)
+        )
+        with patch.object(client.rate_limiter, "acquire") as acquire:
+            client.get("http://x/")
+        acquire.assert_called_once_with()
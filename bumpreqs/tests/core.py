@@ -1,14 +1,23 @@
+import json
+import tempfile
+import threading
 import unittest
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional
 from unittest.mock import patch
 
 from packaging.version import Version
 
-from ..core import _fetch_versions, fix
+from ..cache import MetadataCache
+from ..candidates import Candidates, Matrix
+from ..client import BREAKER_THRESHOLD, DEFAULT_TIMEOUT, IndexClient
+from ..core import _fetch_releases, bump_many, fix, fix_iter, fix_many, Resolver
+from ..index import JsonIndex, ReleaseFile, Releases
+from ..state import IncrementalState
 from ..vrange import VersionIntervals
 
 VERSIONS = [("1.0", None), ("1.2", None), ("1.2.3", ">=3.8")]
 PRE_VERSIONS = [("1.2.4a0", ">=3.8"), ("1.2.4a1", ">=3.8")]
+NEWEST_FIRST = [Version(x) for x, y in reversed(VERSIONS)]
 FAKE_PROJECT_FOO_METADATA = {
     "releases": {
         str(k): [
@@ -29,22 +38,46 @@ PROJECTS = {
 }
 
 
+def fake_fetch_releases(project_name: str, **kwargs: Any) -> Releases:
+    return {
+        str(v): [ReleaseFile(f"{project_name}-{v}.tar.gz", None)]
+        for v in PROJECTS[project_name]
+    }
+
+
 class FakeResponse:
-    def __init__(self, status: int, metadata: Dict[Any, Any]) -> None:
+    def __init__(
+        self,
+        status: int,
+        metadata: Dict[Any, Any],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
         self._status = status
-        self._json = metadata
+        self.status_code = status
+        self.headers = headers or {}
+        self.content = json.dumps(metadata).encode()
 
     def raise_for_status(self) -> None:
         if self._status != 200:
             raise Exception(f"Status {self._status}")
 
-    def json(self) -> Dict[Any, Any]:
-        return self._json
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "FakeResponse":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
 
 
 class FixTest(unittest.TestCase):
-    @patch("bumpreqs.core._fetch_versions", side_effect=PROJECTS.get)
-    def test_basic(self, fetch_versions_mock: Any) -> None:
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_basic(self, fetch_releases_mock: Any) -> None:
         # leave comments alone
         self.assertEqual("  # comment", fix("  # comment"))
         self.assertEqual("  # comment\n", fix("  # comment\n"))
@@ -69,17 +102,17 @@ class FixTest(unittest.TestCase):
             fix('foo==1.2.2 ; python_version >= "3.6"\n'),
         )
 
-    @patch("bumpreqs.core._fetch_versions", side_effect=PROJECTS.get)
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
     @patch("bumpreqs.core.LOG.warning")
-    def test_git_version(self, warning_mock: Any, fetch_versions_mock: Any) -> None:
+    def test_git_version(self, warning_mock: Any, fetch_releases_mock: Any) -> None:
         url = "-e git+git://...#egg_info"
         self.assertEqual(url, fix(url))
         warning_mock.assert_called_with(
             "Not bumping option/url line for %r", "-e git+git://...#egg_info"
         )
 
-    @patch("bumpreqs.core._fetch_versions", side_effect=PROJECTS.get)
-    def test_pre_handling(self, fetch_versions_mock: Any) -> None:
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_pre_handling(self, fetch_releases_mock: Any) -> None:
         self.assertEqual("foup==1.2.4a1\n", fix("foup==1.2.4a0"))
         self.assertEqual("foup==1.2.4a1\n", fix("foup==1.2.4a1"))
         # current version doesn't need to exist
@@ -89,23 +122,41 @@ class FixTest(unittest.TestCase):
         # force with pre- intent
         self.assertEqual("foup==1.2.4a1\n", fix("foup>=1.0a1", force=True))
 
-    @patch("bumpreqs.core._fetch_versions", side_effect=lambda x, v=None: PROJECTS[x])
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
     @patch("bumpreqs.core.LOG.warning")
-    def test_fetch_messages(self, warning_mock: Any, fetch_versions_mock: Any) -> None:
+    def test_fetch_messages(self, warning_mock: Any, fetch_releases_mock: Any) -> None:
         self.assertEqual("nope==1.0", fix("nope==1.0"))
         warning_mock.assert_called_with(
             "Failed to fetch versions for %r: %s", "nope", "KeyError('nope')"
         )
 
-    @patch("bumpreqs.core._fetch_versions", side_effect=lambda x, v=None: PROJECTS[x])
     @patch("bumpreqs.core.LOG.warning")
-    def test_no_releases(self, warning_mock: Any, fetch_versions_mock: Any) -> None:
+    def test_index_unavailable(self, warning_mock: Any) -> None:
+        # Nothing listens on port 9, so every request is refused at once.
+        index = JsonIndex("http://127.0.0.1:9/pypi/", client=IndexClient(retries=0))
+        names = [f"p{i:02}" for i in range(20)]
+        results = bump_many(
+            {"": "".join(f"{n}==1.0\n" for n in names)}, concurrency=1, index=index
+        )[""]
+        self.assertTrue(all(r.skipped for r in results))
+        self.assertEqual(BREAKER_THRESHOLD + 1, warning_mock.call_count)
+        # The rest aren't tried, and are reported together
+        warning_mock.assert_called_with(
+            "Index unavailable, skipped %d projects: %s",
+            20 - BREAKER_THRESHOLD,
+            ", ".join(names[BREAKER_THRESHOLD:]),
+        )
+        self.assertIn("IndexUnavailable", results[-1].skipped or "")
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    @patch("bumpreqs.core.LOG.warning")
+    def test_no_releases(self, warning_mock: Any, fetch_releases_mock: Any) -> None:
         self.assertEqual("empty==1.0", fix("empty==1.0"))
         warning_mock.assert_called_with("No candidate versions for %r", "empty==1.0")
 
-    @patch("bumpreqs.core._fetch_versions", side_effect=lambda x, v=None: PROJECTS[x])
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
     @patch("bumpreqs.core.LOG.warning")
-    def test_url(self, warning_mock: Any, fetch_versions_mock: Any) -> None:
+    def test_url(self, warning_mock: Any, fetch_releases_mock: Any) -> None:
         self.assertEqual(
             "empty @ https://example.com/", fix("empty @ https://example.com/")
         )
@@ -113,53 +164,295 @@ class FixTest(unittest.TestCase):
             "Not bumping option/url line for %r", "empty @ https://example.com/"
         )
 
-    @patch("bumpreqs.core._fetch_versions", side_effect=lambda x, v=None: PROJECTS[x])
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
     @patch("bumpreqs.core.LOG.warning")
-    def test_old_python(self, warning_mock: Any, fetch_versions_mock: Any) -> None:
+    def test_old_python(self, warning_mock: Any, fetch_releases_mock: Any) -> None:
         # The mock doesn't know about py version
         self.assertEqual(
             'foo==1.2.3; python_version < "3.6"\n',
             fix("foo==1.0; python_version<'3.6'"),
         )
-        fetch_versions_mock.assert_called_with("foo", VersionIntervals.from_str("<3.6"))
+        fetch_releases_mock.assert_called_with("foo", index=None)
+
+    def test_as_of_without_times(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            state = IncrementalState(f"{d}/state.json")
+            with self.assertRaisesRegex(ValueError, "no upload times"):
+                Resolver(state=state, as_of=0.0)
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_fetches_each_project_once(self, fetch_releases_mock: Any) -> None:
+        text = "foo==1.0\n# c\nFoo==1.1  # again\nfoup==1.0\nfoo>=1\n"
+        expected = "foo==1.2.3\n# c\nFoo==1.2.3  # again\nfoup==1.2.3\nfoo>=1\n"
+        self.assertEqual(expected, fix(text))
+        self.assertEqual(
+            ["foo", "foup"], sorted(c.args[0] for c in fetch_releases_mock.mock_calls)
+        )
+        # The serial path produces identical output
+        self.assertEqual(expected, fix(text, concurrency=1))
+
+    @patch("bumpreqs.core._fetch_releases")
+    def test_fetches_once_whatever_the_markers(self, fetch_releases_mock: Any) -> None:
+        fetch_releases_mock.return_value = {
+            v: [ReleaseFile(f"foo-{v}.tar.gz", rp)] for v, rp in VERSIONS
+        }
+        text = "foo==1.0; python_version < '3.6'\nfoo==1.0; python_version >= '3.8'\n"
+        self.assertEqual(
+            'foo==1.2; python_version < "3.6"\nfoo==1.2.3; python_version >= "3.8"\n',
+            fix(text),
+        )
+        fetch_releases_mock.assert_called_once_with("foo", index=None)
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_fix_many(self, fetch_releases_mock: Any) -> None:
+        texts = {"a.txt": "foo==1.0\nfoup\n", "b.txt": "foup==1.0\n", "c.txt": ""}
+        self.assertEqual(
+            {
+                "a.txt": "foo==1.2.3\nfoup==1.2.3\n",
+                "b.txt": "foup==1.2.3\n",
+                "c.txt": "",
+            },
+            fix_many(texts),
+        )
+        self.assertEqual(2, fetch_releases_mock.call_count)
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    @patch("bumpreqs.core.LOG.warning")
+    def test_bump_many(self, warning_mock: Any, fetch_releases_mock: Any) -> None:
+        texts = {
+            "a.txt": "# c\nfoo==1.0\nfoo>=1.0\n-e .\nnope==1\nempty\n",
+            "b.txt": "Foo==1.2.3\nbar; python_version~='3.6'\n",
+        }
+        results = bump_many(texts)
+        self.assertEqual(
+            [
+                (1, None, "", (), None),
+                (2, "foo", "==1.0", ("1.2.3",), None),
+                (3, "foo", ">=1.0", (), "not a pin"),
+                (4, None, "", (), "option or url"),
+                (5, "nope", "==1", (), "fetch failed: KeyError('nope')"),
+                (6, "empty", "", (), "no candidates"),
+            ],
+            [r[:5] for r in results["a.txt"]],
+        )
+        self.assertEqual(
+            [
+                (1, "Foo", "==1.2.3", ("1.2.3",), None),
+                (2, "bar", "", (), "marker too complex"),
+            ],
+            [r[:5] for r in results["b.txt"]],
+        )
+        foo = results["a.txt"][1]
+        self.assertTrue(foo.changed)
+        self.assertFalse(results["b.txt"][0].changed)
+        self.assertEqual("foo==1.0\n", foo.line)
+        self.assertEqual("foo==1.2.3\n", foo.text)
+        self.assertGreaterEqual(foo.seconds, 0.0)
+        self.assertEqual(foo.seconds, results["b.txt"][0].seconds)
+        self.assertEqual(
+            {
+                "lineno": 2,
+                "project": "foo",
+                "old": "==1.0",
+                "new": ["1.2.3"],
+                "skipped": None,
+                "seconds": round(foo.seconds, 6),
+                "changed": True,
+            },
+            foo.to_json(),
+        )
+        self.assertEqual(
+            fix_many(texts), {k: "".join(r.text for r in v) for k, v in results.items()}
+        )
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_resolve_iter(self, fetch_releases_mock: Any) -> None:
+        with Resolver() as resolver:
+            results = list(resolver.resolve_iter(["foo==1.0\n", "\n", "foo\n"]))
+        self.assertEqual([1, 2, 3], [r.lineno for r in results])
+        self.assertEqual([("1.2.3",), (), ("1.2.3",)], [r.new for r in results])
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_fix_iter(self, fetch_releases_mock: Any) -> None:
+        started = threading.Event()
+
+        def fetch(*args: Any, **kwargs: Any) -> Releases:
+            started.set()
+            return fake_fetch_releases(*args, **kwargs)
+
+        fetch_releases_mock.side_effect = fetch
+
+        def lines() -> Iterator[str]:
+            yield "foo==1.0\n"
+            # The fetch starts without waiting for the rest of the input
+            self.assertTrue(started.wait(5))
+            yield "# c\n"
+            yield "foup==1.0  # again\n"
+            yield "Foo"
+
+        self.assertEqual(
+            ["foo==1.2.3\n", "# c\n", "foup==1.2.3  # again\n", "Foo==1.2.3\n"],
+            list(fix_iter(lines())),
+        )
+        self.assertEqual(2, fetch_releases_mock.call_count)
+
+    @patch("bumpreqs.core.STREAM_WINDOW", 2)
+    @patch("bumpreqs.core._fetch_releases")
+    def test_fix_iter_window(self, fetch_releases_mock: Any) -> None:
+        release = threading.Event()
+
+        def slow(*args: Any, **kwargs: Any) -> Releases:
+            release.wait(5)
+            return fake_fetch_releases(*args, **kwargs)
+
+        fetch_releases_mock.side_effect = slow
+        read = []
+
+        def lines() -> Iterator[str]:
+            for i in range(5):
+                read.append(i)
+                yield "foo\n" if i == 0 else f"# {i}\n"
+
+        it = fix_iter(lines())
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual("foo==1.2.3\n", next(it))
+        # Stopped reading once two lines were waiting behind foo
+        self.assertEqual([0, 1, 2], read)
+        self.assertEqual(["# 1\n", "# 2\n", "# 3\n", "# 4\n"], list(it))
+
+    @patch("bumpreqs.core._fetch_releases")
+    def test_matrix(self, fetch_releases_mock: Any) -> None:
+        fetch_releases_mock.return_value = {
+            "1.0": [ReleaseFile("", ">=3.7")],
+            "2.0": [ReleaseFile("", ">=3.9")],
+            "3.0": [ReleaseFile("", ">=3.11")],
+        }
+        matrix = Matrix(["3.12", "3.9", "3.10", "3.11"])
+        text = "foo==0.1  # c\nfoo==0.1; python_version < '3.11'\n"
+        self.assertEqual(
+            'foo==2.0  # c\nfoo==2.0; python_version < "3.11"\n',
+            fix(text, matrix=matrix),
+        )
+        self.assertEqual(
+            'foo==2.0; python_version < "3.11"  # c\n'
+            'foo==3.0; python_version >= "3.11"\n'
+            'foo==2.0; python_version < "3.11"\n',
+            fix(text, matrix=matrix._replace(split=True)),
+        )
+        [result] = bump_many({"": "foo\n"}, matrix=matrix._replace(split=True))[""]
+        self.assertEqual(("2.0", "3.0"), result.new)
+        self.assertEqual(
+            'foo==1.0; python_version < "3.9"\n'
+            'foo==2.0; python_version >= "3.9" and python_version < "3.11"\n'
+            'foo==3.0; python_version >= "3.11"\n',
+            fix("foo\n", matrix=Matrix(["3.8", "3.9", "3.10", "3.11"], True)),
+        )
+        self.assertEqual(
+            'foo==1.0; sys_platform == "win32" and python_version < "3.11"\n'
+            'foo==3.0; sys_platform == "win32" and python_version >= "3.11"\n',
+            fix("foo; sys_platform == 'win32'", matrix=Matrix(["3.8", "3.11"], True)),
+        )
+        # No release for 3.6, so not split
+        self.assertEqual(
+            "foo==0.1\n",
+            fix("foo==0.1\n", matrix=Matrix(["3.6", "3.11"], True)),
+        )
 
     @patch("bumpreqs.core.LOG.warning")
     def test_too_complicated(self, warning_mock: Any) -> None:
         self.assertEqual(
-            "foo==1.0; python_version<='3.6'",
-            fix("foo==1.0; python_version<='3.6'"),
+            "foo==1.0; python_version~='3.6'",
+            fix("foo==1.0; python_version~='3.6'"),
         )
         warning_mock.assert_called_with(
             "Python version comparison too complex for %r",
-            "foo==1.0; python_version<='3.6'",
+            "foo==1.0; python_version~='3.6'",
         )
 
 
 class FetchVersionsTest(unittest.TestCase):
-    @patch("bumpreqs.core.requests.get")
+    @patch("requests.Session.get")
     def test_success(self, get_mock: Any) -> None:
         get_mock.return_value = FakeResponse(200, FAKE_PROJECT_FOO_METADATA)
-        self.assertEqual([Version(x) for x, y in VERSIONS], _fetch_versions("foo"))
-        get_mock.assert_called_with("https://pypi.org/pypi/foo/json")
+        self.assertEqual(NEWEST_FIRST, list(Candidates(_fetch_releases("foo"))))
+        get_mock.assert_called_with(
+            "https://pypi.org/pypi/foo/json",
+            headers={},
+            stream=True,
+            timeout=DEFAULT_TIMEOUT,
+        )
 
-    @patch("bumpreqs.core.requests.get")
+    @patch("requests.Session.get")
     def test_recent_version(self, get_mock: Any) -> None:
         get_mock.return_value = FakeResponse(200, FAKE_PROJECT_FOO_METADATA)
         self.assertEqual(
-            [Version(x) for x, y in VERSIONS],
-            _fetch_versions("foo", VersionIntervals.from_str("<3.9")),
+            NEWEST_FIRST,
+            list(Candidates(_fetch_releases("foo"), VersionIntervals.from_str("<3.9"))),
         )
         self.assertEqual(
-            [Version(x) for x, y in VERSIONS],
-            _fetch_versions("foo", VersionIntervals.from_str(">=3.6")),
+            NEWEST_FIRST,
+            list(
+                Candidates(_fetch_releases("foo"), VersionIntervals.from_str(">=3.6"))
+            ),
+        )
+        get_mock.assert_called_with(
+            "https://pypi.org/pypi/foo/json",
+            headers={},
+            stream=True,
+            timeout=DEFAULT_TIMEOUT,
         )
-        get_mock.assert_called_with("https://pypi.org/pypi/foo/json")
 
-    @patch("bumpreqs.core.requests.get")
+    @patch("requests.Session.get")
     def test_older_version(self, get_mock: Any) -> None:
         get_mock.return_value = FakeResponse(200, FAKE_PROJECT_FOO_METADATA)
         self.assertEqual(
-            [Version("1.0"), Version("1.2")],
-            _fetch_versions("foo", VersionIntervals.from_str("<3.8")),
+            [Version("1.2"), Version("1.0")],
+            list(Candidates(_fetch_releases("foo"), VersionIntervals.from_str("<3.8"))),
+        )
+        get_mock.assert_called_with(
+            "https://pypi.org/pypi/foo/json",
+            headers={},
+            stream=True,
+            timeout=DEFAULT_TIMEOUT,
         )
-        get_mock.assert_called_with("https://pypi.org/pypi/foo/json")
+
+    @patch("requests.Session.get")
+    def test_cache_revalidation(self, get_mock: Any) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d, ttl=0)
+            index = JsonIndex(cache=cache)
+            get_mock.return_value = FakeResponse(
+                200, FAKE_PROJECT_FOO_METADATA, {"ETag": '"abc"'}
+            )
+            expected = NEWEST_FIRST
+            self.assertEqual(
+                expected, list(Candidates(_fetch_releases("foo", index=index)))
+            )
+            get_mock.assert_called_with(
+                "https://pypi.org/pypi/foo/json",
+                headers={},
+                stream=True,
+                timeout=DEFAULT_TIMEOUT,
+            )
+
+            # Expired, so the next fetch is conditional and a 304 reuses the body
+            get_mock.return_value = FakeResponse(304, {})
+            self.assertEqual(
+                expected, list(Candidates(_fetch_releases("Foo", index=index)))
+            )
+            get_mock.assert_called_with(
+                "https://pypi.org/pypi/Foo/json",
+                headers={"If-None-Match": '"abc"'},
+                stream=True,
+                timeout=DEFAULT_TIMEOUT,
+            )
+
+            # Fresh entries don't touch the network at all
+            cache.ttl = 60
+            get_mock.reset_mock()
+            self.assertEqual(
+                expected, list(Candidates(_fetch_releases("foo", index=index)))
+            )
+            get_mock.assert_not_called()
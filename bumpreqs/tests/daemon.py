@@ -0,0 +1,196 @@
+import json
+import socket
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from ..candidates import Matrix
+
+from ..cli import main
+from ..daemon import Daemon, DaemonError, fix_remote, is_running, WarmIndex
+from ..fake_index import FakeIndex
+from ..index import IndexOptions, JsonIndex
+from .index import PROJECTS
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self) -> None:
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        self.path = Path(td.name)
+        self.socket = str(self.path / "run" / "bumpreqs.sock")
+        self.fake = FakeIndex(PROJECTS)
+        self.fake.__enter__()
+        self.addCleanup(self.fake.__exit__)
+        self.options = IndexOptions(
+            concurrency=4,
+            cache_dir=None,
+            index_url=self.fake.url + "/pypi/",
+            index_format="json",
+            timeout=5.0,
+            retries=0,
+            max_rate=None,
+        )
+
+    def start(self) -> Daemon:
+        daemon = Daemon(self.socket)
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+
+        def stop() -> None:
+            daemon.shutdown()
+            thread.join()
+            daemon.server_close()
+
+        self.addCleanup(stop)
+        return daemon
+
+    def fetches(self) -> int:
+        return sum(self.fake.requests.values())
+
+    def test_warm_index(self) -> None:
+        index = WarmIndex(JsonIndex(self.fake.url + "/pypi/"), ttl=600)
+        a = index.fetch("foo")
+        self.assertIs(a, index.fetch("Foo"))
+        self.assertEqual(1, self.fetches())
+        self.assertEqual(1, index.serial("foo"))
+        self.assertEqual((2, {}), index.changelog(None))
+        index.ttl = 0
+        index.fetch("foo")
+        self.assertEqual(2, self.fake.requests["/pypi/foo/json"])
+        # Never answered from memory
+        index.ttl = 600
+        index.fetch_current("foo")
+        self.assertEqual(3, self.fake.requests["/pypi/foo/json"])
+
+    def test_fix_remote(self) -> None:
+        self.assertFalse(is_running(self.socket))
+        with self.assertRaises(OSError):
+            fix_remote(self.socket, {"a": "foo==1.0\n"}, self.options)
+
+        self.start()
+        self.assertTrue(is_running(self.socket))
+        texts = {"a": "foo==1.0\n", "b": "foo\nbar-baz\n"}
+        self.assertEqual(
+            {"a": "foo==2.0\n", "b": "foo==2.0\nbar-baz==0.1\n"},
+            fix_remote(self.socket, texts, self.options),
+        )
+        # Warm: nothing fetched the second time
+        n = self.fetches()
+        fix_remote(self.socket, texts, self.options, Matrix(["3.12"]))
+        self.assertEqual(n, self.fetches())
+
+        with self.assertLogs("bumpreqs.daemon", "WARNING"):
+            with self.assertRaisesRegex(DaemonError, "KeyError"):
+                fix_remote(
+                    self.socket, texts, self.options._replace(index_format="nope")
+                )
+
+    def test_fix_remote_timeout(self) -> None:
+        # Accepts connections (into its backlog) but never answers
+        Path(self.socket).parent.mkdir()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(listener.close)
+        listener.bind(self.socket)
+        listener.listen()
+        with self.assertRaises(socket.timeout):
+            fix_remote(self.socket, {"a": "foo==1.0\n"}, self.options, timeout=0.1)
+
+    def test_protocol_version(self) -> None:
+        self.start()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(self.socket)
+            s.sendall(b'{"version": 0}')
+            s.shutdown(socket.SHUT_WR)
+            with self.assertLogs("bumpreqs.daemon", "WARNING"):
+                response = json.loads(s.makefile("rb").read())
+        self.assertIn("Unsupported protocol 0", response["error"])
+
+    def test_already_running(self) -> None:
+        self.start()
+        with self.assertRaisesRegex(DaemonError, "Already serving"):
+            Daemon(self.socket)
+
+    def test_stale_socket(self) -> None:
+        daemon = Daemon(self.socket)
+        # As if killed without cleaning up
+        daemon.socket.close()
+        self.assertTrue(Path(self.socket).exists())
+        self.start()
+        self.assertTrue(is_running(self.socket))
+        self.assertEqual(0o600, Path(self.socket).stat().st_mode & 0o777)
+
+    def test_cli(self) -> None:
+        runner = CliRunner()
+        reqs = self.path / "requirements.txt"
+        reqs.write_text("foo==1.0\n")
+        args = [
+            "--no-cache",
+            "--index-url",
+            self.fake.url + "/pypi/",
+            "--socket",
+            self.socket,
+        ]
+
+        # No daemon: in-process
+        result = runner.invoke(main, [*args, str(reqs)])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn("+foo==2.0", result.output)
+        self.assertEqual(1, self.fetches())
+
+        self.start()
+        for _ in range(2):
+            result = runner.invoke(main, [*args, str(reqs)])
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn("+foo==2.0", result.output)
+        # Once more by the daemon, which remembered it for the second run
+        self.assertEqual(2, self.fetches())
+
+        result = runner.invoke(main, [*args, "--write", str(reqs)])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual("foo==2.0\n", reqs.read_text())
+        self.assertEqual(2, self.fetches())
+
+        reqs.write_text("foo==1.0\n")
+        result = runner.invoke(main, [*args, "--no-daemon", str(reqs)])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(3, self.fetches())
+
+    @patch("bumpreqs.cli.fix_remote", side_effect=DaemonError("broken"))
+    def test_cli_fallback(self, fix_remote_mock: Any) -> None:
+        reqs = self.path / "requirements.txt"
+        reqs.write_text("foo==1.0\n")
+        self.start()
+        result = CliRunner().invoke(
+            main,
+            [
+                "--no-cache",
+                "--index-url",
+                self.fake.url + "/pypi/",
+                "--socket",
+                self.socket,
+                str(reqs),
+            ],
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn("Daemon failed, running in-process", result.output)
+        self.assertIn("+foo==2.0", result.output)
+        fix_remote_mock.assert_called_once()
+
+    def test_serve(self) -> None:
+        with patch.object(Daemon, "serve_forever", side_effect=KeyboardInterrupt):
+            result = CliRunner().invoke(main, ["serve", "--socket", self.socket])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn(f"Serving on {self.socket}", result.output)
+        # Cleaned up after itself
+        self.assertFalse(Path(self.socket).exists())
+
+        self.start()
+        result = CliRunner().invoke(main, ["serve", "--socket", self.socket])
+        self.assertEqual(1, result.exit_code)
+        self.assertIn("Already serving", result.output)
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, List
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from ..cli import main
+from ..discover import discover, GitIgnore
+from .core import fake_fetch_releases
+
+
+class DiscoverTest(unittest.TestCase):
+    def setUp(self) -> None:
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        self.path = Path(td.name)
+        executor = ThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+        self.executor = executor
+
+    def write(self, name: str, text: str = "foo==1.0\n") -> str:
+        p = self.path / name
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text)
+        return str(p)
+
+    def found(self, **kwargs: Any) -> List[str]:
+        return [
+            os.path.relpath(f, self.path)
+            for f in discover(str(self.path), self.executor, **kwargs)
+        ]
+
+    def test_gitignore(self) -> None:
+        g = GitIgnore(
+            "/r",
+            [
+                "# comment\n",
+                "\n",
+                "build/\n",
+                "/top.txt\n",
+                "docs/*.txt\n",
+                "**/gen\n",
+                "*.txt\n",
+                "!keep.txt\n",
+                "[ab].in\n",
+                "\\#odd\n",
+                "/\n",
+            ],
+        )
+        for path, is_dir, expected in [
+            ("/r/build", True, True),
+            ("/r/x/build", True, True),
+            ("/r/build", False, None),
+            ("/r/top.txt", False, True),
+            ("/r/x/keep.txt", False, False),
+            ("/r/docs/a.txt", False, True),
+            ("/r/x/docs/c.in", False, None),
+            ("/r/x/y/gen", True, True),
+            ("/r/a.in", False, True),
+            ("/r/c.in", False, None),
+            ("/r/#odd", False, True),
+        ]:
+            with self.subTest(path):
+                self.assertEqual(expected, g.match(path, is_dir))
+
+        self.assertTrue(GitIgnore("/r", ["a/**\n"]).match("/r/a/b/c", False))
+        self.assertTrue(GitIgnore("/r", ["a/**/c\n"]).match("/r/a/c", False))
+        self.assertTrue(GitIgnore("/r", ["a**\n"]).match("/r/abc", False))
+        self.assertFalse(GitIgnore("/r", ["[!a].in\n"]).match("/r/a.in", False))
+        self.assertTrue(GitIgnore("/r", ["[!a].in\n"]).match("/r/b.in", False))
+        self.assertTrue(GitIgnore("/r", ["[\n"]).match("/r/[", False))
+        self.assertTrue(GitIgnore("/r", ["?.txt\n"]).match("/r/a.txt", False))
+        self.assertIsNone(GitIgnore("/r", ["?.txt\n"]).match("/r/ab.txt", False))
+
+    def test_discover(self) -> None:
+        self.write(".gitignore", "build/\n/vendor\nconstraints-*.txt\n")
+        self.write("requirements.txt")
+        self.write("requirements-dev.in")
+        self.write("MANIFEST.in")
+        self.write("constraints.txt")
+        self.write("constraints-old.txt")
+        self.write("build/requirements.txt")
+        self.write("vendor/requirements.txt")
+        self.write("a/vendor/requirements.txt")
+        self.write("a/.gitignore", "!constraints-*.txt\nrequirements-*.txt\n")
+        self.write("a/constraints-old.txt")
+        self.write("a/requirements-test.txt")
+        self.write(".git/requirements.txt")
+        (self.path / "requirements-dir.txt").mkdir()
+        os.symlink(self.path / "a", self.path / "link")
+
+        self.assertEqual(
+            [
+                "a/constraints-old.txt",
+                "a/vendor/requirements.txt",
+                "constraints.txt",
+                "requirements-dev.in",
+                "requirements.txt",
+            ],
+            self.found(),
+        )
+        self.assertEqual(
+            ["MANIFEST.in", "requirements-dev.in"], self.found(patterns=["*.in"])
+        )
+
+    def test_unreadable(self) -> None:
+        self.assertEqual([], discover(str(self.path / "missing"), self.executor))
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_cli(self, fetch_releases_mock: Any) -> None:
+        self.write("requirements.txt", "foo==1.0\n")
+        self.write("sub/requirements.txt", "foo==1.0\nfoup\n")
+        other = self.write("elsewhere.txt", "foup==0.1\n")
+
+        runner = CliRunner()
+        result = runner.invoke(
+            main,
+            ["--no-cache", "--write", "-R", str(self.path), str(self.path), other],
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual(
+            [
+                str(self.path / "requirements.txt"),
+                str(self.path / "sub" / "requirements.txt"),
+                other,
+            ],
+            result.output.splitlines(),
+        )
+        self.assertEqual(
+            "foo==1.2.3\nfoup==1.2.3\n",
+            (self.path / "sub" / "requirements.txt").read_text(),
+        )
+        self.assertEqual("foup==1.2.3\n", Path(other).read_text())
+        self.assertEqual(2, fetch_releases_mock.call_count)
+
+        result = runner.invoke(
+            main, ["--no-cache", "-R", "--pattern", "*.cfg", str(self.path)]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn("No requirements files found", result.output)
@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from ..cli import main
+from ..includes import find_cycles, includes, read_tree
+from .core import fake_fetch_releases
+
+
+class IncludesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        self.path = Path(td.name)
+        executor = ThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+        self.executor = executor
+
+    def write(self, name: str, text: str) -> str:
+        p = self.path / name
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text)
+        return str(p)
+
+    def test_includes(self) -> None:
+        self.assertEqual(
+            ["a.txt", "b.txt", "c.txt", "d.txt", "e.txt", "f.txt"],
+            includes(
+                "-r a.txt\n"
+                "-rb.txt\n"
+                "--requirement=c.txt  # comment\n"
+                "--requirement d.txt\n"
+                "-c e.txt\n"
+                "--constraint = f.txt\n"
+                "-r https://example.com/g.txt\n"
+                "-e .\n"
+                "# -r h.txt\n"
+                "foo==1.0\n"
+            ),
+        )
+
+    def test_read_tree(self) -> None:
+        top = self.write("top.txt", "-r sub/a.txt\n-c sub/b.txt\n-r missing.txt\n")
+        self.write("sub/a.txt", "-r b.txt\nfoo\n")
+        self.write("sub/b.txt", "-r ../sub/./a.txt\nbar\n")
+        with self.assertLogs("bumpreqs.includes", "WARNING") as logs:
+            texts, graph = read_tree([top], self.executor)
+
+        a = str(self.path / "sub" / "a.txt")
+        b = str(self.path / "sub" / "b.txt")
+        self.assertEqual([top, a, b], list(texts))
+        self.assertEqual("foo", texts[a].splitlines()[1])
+        self.assertEqual({top: [a, b], a: [b], b: [a]}, graph)
+        self.assertIn("missing.txt", logs.output[0])
+        self.assertIn(f"{a} -> {b} -> {a}", logs.output[1])
+
+    def test_read_tree_missing_top_level(self) -> None:
+        with self.assertRaises(FileNotFoundError):
+            read_tree([str(self.path / "nope.txt")], self.executor)
+
+    def test_find_cycles(self) -> None:
+        self.assertEqual([], find_cycles({"a": ["b", "c"], "b": ["c"], "c": []}))
+        self.assertEqual([["a", "a"]], find_cycles({"a": ["a"]}))
+        self.assertEqual(
+            [["b", "c", "b"], ["a", "b", "c", "a"]],
+            find_cycles({"a": ["b"], "b": ["c"], "c": ["b", "a"]}),
+        )
+
+    @patch("bumpreqs.core._fetch_releases", side_effect=fake_fetch_releases)
+    def test_cli(self, fetch_releases_mock: Any) -> None:
+        top = self.write("requirements.txt", "-r base.txt\n-c constraints.txt\nfoo\n")
+        self.write("base.txt", "foo==1.0\nfoup\n")
+        self.write("constraints.txt", "-r requirements.txt\nfoup==0.1\n")
+
+        result = CliRunner().invoke(main, ["--no-cache", top])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertNotIn("+foup", result.output)
+        fetch_releases_mock.reset_mock()
+
+        result = CliRunner().invoke(
+            main, ["--no-cache", "--write", "--follow-includes", top]
+        )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn(str(self.path / "constraints.txt"), result.output)
+        self.assertEqual(
+            "foo==1.2.3\nfoup==1.2.3\n", (self.path / "base.txt").read_text()
+        )
+        self.assertEqual(
+            "-r requirements.txt\nfoup==1.2.3\n",
+            (self.path / "constraints.txt").read_text(),
+        )
+        # One lookup per project across the whole tree
+        self.assertEqual(2, fetch_releases_mock.call_count)
@@ -0,0 +1,163 @@
+import tempfile
+import time
+import unittest
+from typing import Dict
+from unittest.mock import patch
+
+from ..cache import MetadataCache
+from ..client import IndexClient
+from ..core import fix
+from ..fake_index import FakeIndex, FakeProject
+from ..index import (
+    first_upload,
+    JsonIndex,
+    ProjectNotFound,
+    ReleaseFile,
+    SimpleIndex,
+    upload_timestamp,
+)
+from .core import FakeResponse
+
+PROJECTS: Dict[str, FakeProject] = {
+    "foo": {
+        "1.0": [("foo-1.0.tar.gz", None)],
+        "1.2": [
+            ("foo-1.2-py3-none-any.whl", ">=3.7"),
+            ("foo-1.2.tar.gz", ">=3.7"),
+        ],
+        "2.0": [("foo-2.0-py3-none-any.whl", ">=3.9")],
+        "0.9": [("foo-0.9-py2.7.egg", None)],
+        "old": [],
+    },
+    "Bar_Baz": {
+        "0.1": [("bar_baz-0.1.tar.gz", None)],
+    },
+}
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.fake = FakeIndex(PROJECTS)
+        self.fake.__enter__()
+        self.addCleanup(self.fake.__exit__)
+
+    def test_json(self) -> None:
+        index = JsonIndex(self.fake.url + "/pypi")
+        releases = index.fetch("foo")
+        self.assertEqual(["1.0", "1.2", "2.0", "0.9", "old"], list(releases))
+        self.assertEqual(
+            [ReleaseFile("foo-2.0-py3-none-any.whl", ">=3.9")], releases["2.0"]
+        )
+        self.assertEqual([], releases["old"])
+        self.assertEqual(1, self.fake.requests["/pypi/foo/json"])
+
+    def test_simple(self) -> None:
+        index = SimpleIndex(self.fake.url + "/simple/")
+        releases = index.fetch("foo")
+        # The egg and the release without files aren't visible
+        self.assertEqual(["1.0", "1.2", "2.0"], list(releases))
+        self.assertEqual(
+            [
+                ReleaseFile("foo-1.2-py3-none-any.whl", ">=3.7"),
+                ReleaseFile("foo-1.2.tar.gz", ">=3.7"),
+            ],
+            releases["1.2"],
+        )
+        self.assertEqual(["0.1"], list(index.fetch("Bar.Baz")))
+
+    def test_upload_times(self) -> None:
+        self.fake.upload_times = {"foo-1.2.tar.gz": "2020-01-01T00:00:00.123456Z"}
+        for index in (
+            JsonIndex(self.fake.url + "/pypi/"),
+            SimpleIndex(self.fake.url + "/simple/"),
+        ):
+            self.assertEqual(
+                [
+                    ReleaseFile("foo-1.2-py3-none-any.whl", ">=3.7"),
+                    ReleaseFile(
+                        "foo-1.2.tar.gz", ">=3.7", "2020-01-01T00:00:00.123456Z"
+                    ),
+                ],
+                index.fetch("foo")["1.2"],
+            )
+
+        self.assertEqual(1577836800.0, upload_timestamp("2020-01-01T00:00:00"))
+        self.assertEqual(1577836800.0, upload_timestamp("2020-01-01T00:00:00Z"))
+        self.assertEqual(1577836800.0, upload_timestamp("2020-01-01T01:00:00+01:00"))
+        self.assertEqual(
+            1577836800.5,
+            first_upload(
+                [
+                    ReleaseFile("a", None, "2020-01-02T00:00:00Z"),
+                    ReleaseFile("b", None),
+                    ReleaseFile("c", None, "2020-01-01T00:00:00.500000Z"),
+                ]
+            ),
+        )
+        self.assertIsNone(first_upload([ReleaseFile("a", None)]))
+
+    def test_missing(self) -> None:
+        for index in (
+            JsonIndex(self.fake.url + "/pypi/"),
+            SimpleIndex(self.fake.url + "/simple/"),
+        ):
+            with self.assertRaises(ProjectNotFound):
+                index.fetch("missing")
+
+    def test_server_error(self) -> None:
+        index = JsonIndex(client=IndexClient(retries=0))
+        with patch("requests.Session.get", return_value=FakeResponse(500, {})):
+            with self.assertRaisesRegex(Exception, "Status 500"):
+                index.fetch("foo")
+            # Not mistaken for a missing project
+            with self.assertRaisesRegex(Exception, "Status 500"):
+                index.fetch("foo")
+
+    def test_missing_remembered(self) -> None:
+        index = JsonIndex(self.fake.url + "/pypi/")
+        for _ in range(2):
+            with self.assertRaisesRegex(ProjectNotFound, r"Missing is not on .*404"):
+                index.fetch("Missing")
+        self.assertEqual(1, self.fake.requests["/pypi/Missing/json"])
+
+        index.missing_ttl = 0
+        with self.assertRaises(ProjectNotFound):
+            index.fetch("missing")
+        self.assertEqual(1, self.fake.requests["/pypi/missing/json"])
+
+    def test_missing_cached(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d, missing_ttl=60)
+            for _ in range(2):
+                # A new index each time, as in separate runs
+                index = JsonIndex(self.fake.url + "/pypi/", cache=cache)
+                with self.assertRaises(ProjectNotFound):
+                    index.fetch("missing")
+            self.assertEqual(1, self.fake.requests["/pypi/missing/json"])
+
+            # Once it's uploaded, it's found as soon as the entry expires,
+            # rather than after the usual ttl.
+            self.fake.update("missing", {"1.0": [("missing-1.0.tar.gz", None)]})
+            with patch("bumpreqs.cache.time.time", return_value=time.time() + 61):
+                index = JsonIndex(self.fake.url + "/pypi/", cache=cache)
+                self.assertEqual(["1.0"], list(index.fetch("missing")))
+            self.assertEqual(2, self.fake.requests["/pypi/missing/json"])
+
+    def test_fix_equivalent(self) -> None:
+        text = "foo==1.0\nbar-baz\nfoo==1.0; python_version < '3.8'\n"
+        expected = 'foo==2.0\nbar-baz==0.1\nfoo==1.2; python_version < "3.8"\n'
+        self.assertEqual(expected, fix(text, index=JsonIndex(self.fake.url + "/pypi")))
+        self.assertEqual(
+            expected, fix(text, index=SimpleIndex(self.fake.url + "/simple"))
+        )
+
+    def test_cache_separates_indexes(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            cache = MetadataCache(d, ttl=0)
+            json_index = JsonIndex(self.fake.url + "/pypi", cache=cache)
+            simple_index = SimpleIndex(self.fake.url + "/simple", cache=cache)
+            self.assertEqual(["1.0", "1.2", "2.0"], list(simple_index.fetch("foo")))
+            self.assertEqual(5, len(json_index.fetch("foo")))
+            # Revalidated with a 304 rather than mixed up with the other index
+            self.assertEqual(["1.0", "1.2", "2.0"], list(simple_index.fetch("foo")))
+            self.assertEqual(2, self.fake.requests["/simple/foo/"])
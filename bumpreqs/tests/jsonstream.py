@@ -0,0 +1,117 @@
+import json
+import unittest
+from typing import Any, Iterator, List
+
+from ..jsonstream import JsonStream
+
+DOC = {
+    "info": {"name": "foo", "description": 'snöwman ☃ "[{\\ ' * 20},
+    "last_serial": 1234567,
+    "releases": {
+        "1.0": [],
+        "1.1": [
+            {"filename": "foo-1.1.tar.gz", "size": 100, "yanked": False},
+            {"filename": "foo-1.1-py3-none-any.whl", "requires_python": None},
+        ],
+    },
+    "urls": [1.5, -2e3, True, None, "x", '"]}\\'],
+}
+
+
+def chunked(data: bytes, size: int) -> Iterator[bytes]:
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+def walk(stream: JsonStream) -> Any:
+    # Rebuilds the document using only the incremental api for the containers
+    # we descend into.
+    result: Any = {}
+    for key in stream.object_items():
+        if key == "releases":
+            result[key] = {}
+            for version in stream.object_items():
+                files: List[Any] = []
+                for _ in stream.array_items():
+                    files.append(stream.value())
+                result[key][version] = files
+        elif key in ("info", "last_serial"):
+            stream.skip()
+        else:
+            result[key] = stream.value()
+    stream.finish()
+    return result
+
+
+class JsonStreamTest(unittest.TestCase):
+    def test_every_chunk_size(self) -> None:
+        expected = dict(DOC)
+        del expected["info"], expected["last_serial"]
+        for indent in (None, 2):
+            data = json.dumps(DOC, indent=indent, ensure_ascii=False).encode()
+            for size in range(1, 40):
+                with self.subTest(indent=indent, size=size):
+                    self.assertEqual(expected, walk(JsonStream(chunked(data, size))))
+
+    def test_trailing_number(self) -> None:
+        stream = JsonStream([b"12", b"34", b"  "])
+        self.assertEqual(1234, stream.value())
+        stream.finish()
+        self.assertEqual(1234, JsonStream([b"12", b"34"]).value())
+
+    def test_split_numbers(self) -> None:
+        for chunks, expected in (
+            ([b'{"a": 1.', b"5}"], 1.5),
+            ([b'{"a": 1e', b"5}"], 1e5),
+            ([b'{"a": -', b"2E", b"+", b"3}"], -2e3),
+            ([b'{"a": 1', b".", b"25", b"}"], 1.25),
+        ):
+            with self.subTest(chunks=chunks):
+                stream = JsonStream(chunks)
+                values = [stream.value() for _ in stream.object_items()]
+                self.assertEqual([expected], values)
+                stream.finish()
+
+    def test_skip(self) -> None:
+        for chunks in (
+            [b'{"a": "x\\', b'"y", "b": 1}'],
+            [b'{"a": [{"b": "]"}, ', b"[]], ", b'"b": 1}'],
+            [b'{"a": tr', b'ue, "b": 1}'],
+        ):
+            with self.subTest(chunks=chunks):
+                stream = JsonStream(chunks)
+                for key in stream.object_items():
+                    if key == "a":
+                        stream.skip()
+                    else:
+                        self.assertEqual(1, stream.value())
+                stream.finish()
+
+    def test_empty_containers(self) -> None:
+        stream = JsonStream([b'{"a": [ ], "b": {}}'])
+        keys = []
+        for key in stream.object_items():
+            keys.append(key)
+            if key == "a":
+                self.assertEqual([], list(stream.array_items()))
+            else:
+                self.assertEqual([], list(stream.object_items()))
+        self.assertEqual(["a", "b"], keys)
+
+    def test_errors(self) -> None:
+        with self.assertRaisesRegex(ValueError, "Unexpected end"):
+            list(JsonStream([b"{ ", b" "]).object_items())
+        with self.assertRaisesRegex(ValueError, "Expected one of"):
+            list(JsonStream([b"[1]"]).object_items())
+        with self.assertRaisesRegex(ValueError, "Expected a key"):
+            list(JsonStream([b"{1: 2}"]).object_items())
+        with self.assertRaisesRegex(ValueError, "Extra data"):
+            stream = JsonStream([b"1 2"])
+            stream.value()
+            stream.finish()
+        with self.assertRaises(json.JSONDecodeError):
+            JsonStream([b"[nope]"]).value()
+        with self.assertRaisesRegex(ValueError, "Unexpected end"):
+            JsonStream([b'{"a": "b', b"c"]).skip()
+        with self.assertRaisesRegex(ValueError, "Expected a value"):
+            JsonStream([b" ]"]).skip()
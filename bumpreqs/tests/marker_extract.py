@@ -1,55 +1,106 @@
 import unittest
 
 from packaging.markers import Marker
+from packaging.version import Version
 
-from ..marker_extract import _extract_python_internal, extract_python
+from ..marker_extract import compile_marker, extract_python
 from ..vrange import TooComplicated
 
 
+def extract(marker: str) -> str:
+    return str(extract_python(Marker(marker)))
+
+
 class MarkerExtractTest(unittest.TestCase):
     def test_simple_behavior(self) -> None:
-        m = Marker(
-            "(python_version >= '3.3' and python_version < '4') and sys_platform=='linux'"
-        )
         self.assertEqual(
-            [
-                ("python_version", ">=", "3.3"),
-                ("python_version", "<", "4"),
-            ],
-            list(_extract_python_internal(m._markers)),
+            ">=3.3,<4.0",
+            extract(
+                "(python_version >= '3.3' and python_version < '4') "
+                "and sys_platform=='linux'"
+            ),
         )
 
-    def test_or_behavior_unfortunate(self) -> None:
-        # TODO: This isn't right, but it's what we do currently.  Only about 2%
-        # of projects that have version-dependent deps use 'or' and we can't see
-        # this in requires_python on the target project -- it would be on the
-        # project you're currently running against.
-        m = Marker("python_version >= '3.3' or python_version < '4'")
+    def test_or(self) -> None:
         self.assertEqual(
-            [
-                ("python_version", ">=", "3.3"),
-                ("python_version", "<", "4"),
-            ],
-            list(_extract_python_internal(m._markers)),
+            "None", extract("python_version >= '3.3' or python_version < '4'")
+        )
+        self.assertEqual(
+            "<3.6,>=3.9", extract("python_version < '3.6' or python_version >= '3.9'")
+        )
+        # "and" binds tighter than "or"
+        self.assertEqual(
+            ">=2.7,<3.0,>=3.6",
+            extract(
+                "python_version >= '2.7' and python_version < '3' "
+                "or python_version >= '3.6'"
+            ),
         )
-
-    def test_rhs_variable_flip(self) -> None:
-        m = Marker("'3.3' >= python_version")
         self.assertEqual(
-            [
-                ("python_version", "<", "3.3"),
-            ],
-            list(_extract_python_internal(m._markers)),
+            ">=3.6,<3.8",
+            extract(
+                "python_version >= '3.6' and "
+                "(python_version < '3.8' or python_version > '3.10') "
+                "and python_version < '3.10'"
+            ),
         )
+        # Could be true anywhere, on the right platform
+        self.assertEqual(
+            "None", extract("python_version < '3.8' or sys_platform == 'win32'")
+        )
+
+    def test_precision(self) -> None:
+        self.assertEqual("<3.7", extract("python_version <= '3.6'"))
+        self.assertEqual(">=3.7", extract("python_version > '3.6'"))
+        self.assertEqual(">=3.6,<3.7", extract("python_version == '3.6'"))
+        self.assertEqual("<3.6,>=3.7", extract("python_version != '3.6'"))
+        self.assertEqual(">=3.0", extract("python_version >= '3'"))
+        self.assertEqual(">=3.0,<4", extract("python_version == '3.*'"))
 
-    def test_rhs_variable_flip_toocomplicated(self) -> None:
-        m = Marker("'3.3' in python_version")
-        with self.assertRaises(TooComplicated):
-            list(_extract_python_internal(m._markers))
+        self.assertEqual("<3.6.1", extract("python_full_version <= '3.6'"))
+        self.assertEqual(">=3.6.1", extract("python_full_version > '3.6.0'"))
+        self.assertEqual(">=3.6.2,<3.6.3", extract("python_full_version == '3.6.2'"))
+        # python_version is only ever "3.8", which is less than "3.8.1"
+        self.assertEqual("<3.9", extract("python_version < '3.8.1'"))
+        self.assertEqual("<3.9", extract("python_version <= '3.8.1'"))
+        self.assertEqual(">=3.9", extract("python_version > '3.8.1'"))
+        self.assertEqual(">=3.9", extract("python_version >= '3.8.1'"))
+        self.assertEqual("NONE", extract("python_version == '3.8.1'"))
+        self.assertEqual("None", extract("python_version != '3.8.1'"))
+        self.assertEqual("<3.8", extract("python_version < '3.8.0'"))
+        self.assertEqual(">=3.8,<3.9", extract("python_version == '3.8.0'"))
+
+        vi = extract_python(Marker("python_full_version != '3.6.2'"))
+        assert vi is not None
+        self.assertFalse(vi.contains(Version("3.6.2")))
+        self.assertTrue(vi.contains(Version("3.6.3")))
+
+    def test_rhs_variable_flip(self) -> None:
+        self.assertEqual("<3.4", extract("'3.3' >= python_version"))
+        self.assertEqual(">=3.4", extract("'3.3' < python_version"))
+        self.assertEqual("<3.3", extract("'3.3' > python_version"))
+
+    def test_too_complicated(self) -> None:
+        for marker in (
+            "'3.3' in python_version",
+            "python_version ~= '3.3'",
+            "python_version < '3.8.1.2'",
+            "python_version < '3.8.1rc1'",
+            "python_full_version < '3.8.0rc1'",
+            "python_version in '3.7 3.8'",
+        ):
+            with self.subTest(marker), self.assertRaises(TooComplicated):
+                extract_python(Marker(marker))
 
     def test_extract_python(self) -> None:
-        m = Marker("sys_platform == 'linux'")
-        self.assertEqual(None, extract_python(m))
+        self.assertEqual(None, extract_python(None))
+        self.assertEqual(None, extract_python(Marker("sys_platform == 'linux'")))
+        self.assertEqual(None, extract_python(Marker("'linux' == sys_platform")))
+        self.assertEqual(
+            "NONE", extract("python_version < '3' and python_version >= '3'")
+        )
 
-        m = Marker("python_version >= '3.3' and python_version < '4'")
-        self.assertEqual(">=3.3,<4", str(extract_python(m)))
+    def test_memoized(self) -> None:
+        a = compile_marker(Marker("python_version < '3.11'"))
+        b = compile_marker(Marker('python_version<"3.11"'))
+        self.assertIs(a, b)
@@ -0,0 +1,230 @@
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from click.testing import CliRunner
+
+from ..cli import main
+from ..fake_index import FakeIndex, FakeProject
+from ..index import (
+    Index,
+    IndexOptions,
+    JsonIndex,
+    ProjectNotFound,
+    ReleaseFile,
+    Releases,
+)
+from ..multiindex import MultiIndex
+
+
+class StubIndex(Index):
+    def __init__(
+        self,
+        releases: Dict[str, Releases],
+        error: Optional[Exception] = None,
+        gate: Optional[threading.Event] = None,
+    ) -> None:
+        self.releases = releases
+        self.error = error
+        self.gate = gate
+        self.asked: List[str] = []
+        self.threads: List[threading.Thread] = []
+
+    def fetch(self, project_name: str) -> Releases:
+        self.asked.append(project_name)
+        self.threads.append(threading.current_thread())
+        if self.gate is not None:
+            self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        if project_name not in self.releases:
+            raise ProjectNotFound(project_name)
+        return self.releases[project_name]
+
+
+def files(*names: str) -> List[ReleaseFile]:
+    return [ReleaseFile(name, None) for name in names]
+
+
+PRIVATE = {
+    "corp": {"1.0": files("corp-1.0.tar.gz")},
+    "foo": {"9.0": files("foo-9.0.tar.gz")},
+}
+PUBLIC = {
+    "foo": {
+        "1.0": files("foo-1.0.tar.gz"),
+        "9.0": files("foo-9.0.tar.gz", "foo-9.0-py3-none-any.whl"),
+    }
+}
+
+
+class MultiIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    def test_first(self) -> None:
+        private, public = StubIndex(PRIVATE), StubIndex(PUBLIC)
+        index = MultiIndex([private, public])
+        self.assertEqual(PRIVATE["foo"], index.fetch("foo"))
+        self.assertEqual(PRIVATE["corp"], index.fetch("corp"))
+
+        index = MultiIndex([StubIndex({}), public])
+        self.assertEqual(PUBLIC["foo"], index.fetch("foo"))
+
+    def test_first_fails_closed(self) -> None:
+        # A public project with a private one's name mustn't be picked up just
+        # because the private index is down.
+        broken = StubIndex(PRIVATE, error=ValueError("down"))
+        index = MultiIndex([broken, StubIndex(PUBLIC)])
+        with self.assertRaisesRegex(ValueError, "down"):
+            index.fetch("foo")
+
+        index = MultiIndex([StubIndex({}), broken, StubIndex(PUBLIC)])
+        with self.assertRaisesRegex(ValueError, "down"):
+            index.fetch("foo")
+        # After the one that has it, it doesn't matter
+        index = MultiIndex([StubIndex(PRIVATE), broken])
+        self.assertEqual(PRIVATE["corp"], index.fetch("corp"))
+
+    def test_first_doesnt_wait(self) -> None:
+        slow = StubIndex(PUBLIC, gate=self.gate)
+        index = MultiIndex([StubIndex(PRIVATE), slow])
+        self.assertEqual(PRIVATE["corp"], index.fetch("corp"))
+
+    def test_merge(self) -> None:
+        index = MultiIndex([StubIndex(PRIVATE), StubIndex(PUBLIC)], "merge")
+        self.assertEqual(
+            {
+                "9.0": files("foo-9.0.tar.gz", "foo-9.0-py3-none-any.whl"),
+                "1.0": files("foo-1.0.tar.gz"),
+            },
+            index.fetch("foo"),
+        )
+        self.assertEqual(PRIVATE["corp"], index.fetch("corp"))
+        self.assertIsNone(index.serial("foo"))
+        self.assertIsNone(index.changelog(None))
+
+    def test_errors(self) -> None:
+        index = MultiIndex([StubIndex(PRIVATE), StubIndex(PUBLIC)])
+        with self.assertRaises(ProjectNotFound):
+            index.fetch("nope")
+
+        # Maybe it's on the one that failed
+        broken = StubIndex({}, error=ValueError("down"))
+        for policy in ("first", "merge"):
+            index = MultiIndex([StubIndex(PRIVATE), broken], policy)
+            with self.assertRaisesRegex(ValueError, "down"):
+                index.fetch("nope")
+        self.assertEqual(PRIVATE["corp"], index.fetch("corp"))
+
+        with self.assertRaises(ValueError):
+            MultiIndex([broken], "last")
+
+    def test_budget(self) -> None:
+        slow = StubIndex(PRIVATE, gate=self.gate)
+        index = MultiIndex([slow, StubIndex(PUBLIC)], "merge", budget=0.05)
+        self.assertEqual(PUBLIC["foo"], index.fetch("foo"))
+
+        # Not knowing whether the first has it is as bad as it failing
+        index = MultiIndex([slow, StubIndex(PUBLIC)], budget=0.05)
+        with self.assertRaisesRegex(TimeoutError, "StubIndex in 0.05s"):
+            index.fetch("foo")
+        with self.assertRaisesRegex(TimeoutError, "StubIndex in 0.05s"):
+            index.fetch("corp")
+
+        # The budget applies to a lone index too
+        with self.assertRaises(TimeoutError):
+            MultiIndex([slow], budget=0.05).fetch("corp")
+        # Still waiting, but not keeping the interpreter from exiting
+        self.assertTrue(all(t.daemon for t in slow.threads))
+
+    def test_pins(self) -> None:
+        private, public = StubIndex(PRIVATE), StubIndex(PUBLIC)
+        index = MultiIndex([public, private], pins={"Corp": [private]})
+        self.assertEqual(PRIVATE["corp"], index.fetch("corp"))
+        self.assertEqual(PUBLIC["foo"], index.fetch("foo"))
+        self.assertEqual(["foo"], public.asked)
+
+    def test_options(self) -> None:
+        options = IndexOptions(
+            concurrency=2,
+            cache_dir=None,
+            index_url=None,
+            index_format="json",
+            timeout=1.0,
+            retries=0,
+            max_rate=None,
+        )
+        self.assertIsInstance(options.make_index(), JsonIndex)
+
+        options = options._replace(
+            extra_index_urls=("http://private/pypi",),
+            index_pins=(("corp", "http://private/pypi/"),),
+        )
+        index = options.make_index()
+        assert isinstance(index, MultiIndex)
+        self.assertEqual(
+            (5.0, 1.0),
+            index.indexes[0].client.timeout,  # type: ignore[attr-defined]
+        )
+        budgeted = options._replace(index_budget=0.5).make_index()
+        self.assertEqual(
+            (0.5, 0.5),
+            budgeted.indexes[0].client.timeout,  # type: ignore[attr-defined]
+        )
+        self.assertEqual(
+            ["https://pypi.org/pypi/", "http://private/pypi/"],
+            [i.url for i in index.indexes],  # type: ignore[attr-defined]
+        )
+        self.assertEqual([index.indexes[1]], index.indexes_for("corp"))
+
+        # As it comes out the other end of a daemon's socket
+        roundtrip = IndexOptions.from_json(json.loads(json.dumps(options._asdict())))
+        self.assertEqual(options, roundtrip)
+        self.assertEqual(hash(options), hash(roundtrip))
+
+    def test_cli(self) -> None:
+        private: Dict[str, FakeProject] = {
+            "corp": {v: [(f"corp-{v}.tar.gz", None)] for v in ("1.0", "2.0")}
+        }
+        public: Dict[str, FakeProject] = {
+            "foo": {v: [(f"foo-{v}.tar.gz", None)] for v in ("1.0", "1.5")}
+        }
+        with FakeIndex(private) as fake_private, FakeIndex(public) as fake_public:
+            with tempfile.TemporaryDirectory() as d:
+                reqs = Path(d) / "requirements.txt"
+                reqs.write_text("corp==1.0\nfoo==1.0\n")
+                args = [
+                    "--no-cache",
+                    "--no-daemon",
+                    # Private first, so that foo always waits on its 404
+                    "--index-url",
+                    fake_private.url + "/pypi",
+                    "--extra-index-url",
+                    fake_public.url + "/pypi/",
+                ]
+                runner = CliRunner()
+                result = runner.invoke(
+                    main,
+                    [
+                        *args,
+                        "--pin-index",
+                        f"corp={fake_private.url}/pypi/",
+                        "--write",
+                        str(reqs),
+                    ],
+                )
+                self.assertEqual(0, result.exit_code, result.output)
+                self.assertEqual("corp==2.0\nfoo==1.5\n", reqs.read_text())
+                self.assertEqual(0, fake_public.requests["/pypi/corp/json"])
+                self.assertEqual(1, fake_private.requests["/pypi/foo/json"])
+
+                result = runner.invoke(
+                    main, [*args, "--pin-index", "corp=http://elsewhere/", str(reqs)]
+                )
+                self.assertEqual(2, result.exit_code)
+                self.assertIn("--pin-index", result.output)
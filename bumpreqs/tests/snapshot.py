@@ -0,0 +1,162 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from ..cli import main
+from ..core import fix, requirement_names
+from ..fake_index import FakeIndex
+from ..index import ProjectNotFound, ReleaseFile, upload_timestamp
+from ..multiindex import MultiIndex
+from ..snapshot import (
+    ENTRY,
+    HEADER,
+    OLD_MAGICS,
+    Snapshot,
+    SnapshotError,
+    SnapshotIndex,
+    write_snapshot,
+)
+from .index import PROJECTS
+
+RELEASES = {
+    "Foo.Bar": {
+        "1.0": [ReleaseFile("foo-1.0.tar.gz", None)],
+        "2.0": [
+            ReleaseFile("foo-2.0-py3-none-any.whl", ">=3.9", "2021-03-01T12:00:00"),
+            ReleaseFile("foo-2.0.tar.gz", ">=3.9", "2021-03-01T11:00:00.250000Z"),
+        ],
+        "old": [],
+    },
+    "baz": {"0.1": [ReleaseFile("baz-0.1.tar.gz", ">=3.7")]},
+}
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self) -> None:
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        self.path = Path(td.name)
+
+    def test_roundtrip(self) -> None:
+        write_snapshot(self.path / "s", RELEASES)
+        snapshot = Snapshot(self.path / "s")
+        self.addCleanup(snapshot.close)
+
+        self.assertEqual(2, len(snapshot))
+        self.assertEqual(["baz", "foo-bar"], list(snapshot.names()))
+        self.assertEqual(
+            {
+                "1.0": [ReleaseFile("", None)],
+                "2.0": [ReleaseFile("", ">=3.9", "2021-03-01T11:00:00.250000+00:00")],
+            },
+            snapshot.get("foo_bar"),
+        )
+        self.assertIn("Baz", snapshot)
+        self.assertNotIn("aaa", snapshot)
+        self.assertNotIn("zzz", snapshot)
+        self.assertEqual([], list(Path(self.path).glob("*.tmp")))
+
+    def test_empty_snapshot(self) -> None:
+        write_snapshot(self.path / "s", {})
+        snapshot = Snapshot(self.path / "s")
+        self.addCleanup(snapshot.close)
+        self.assertEqual(0, len(snapshot))
+        self.assertIsNone(snapshot.get("foo"))
+
+    def test_failed_write(self) -> None:
+        (self.path / "dir").mkdir()
+        with self.assertRaises(OSError):
+            write_snapshot(self.path / "dir", RELEASES)
+        self.assertEqual([], list(Path(self.path).glob("*.tmp")))
+
+    def test_old_format(self) -> None:
+        # As snapshots were before they had upload times
+        key, data = b"baz", b"0.1\t>=3.7\n"
+        offset = HEADER.size + ENTRY.size
+        (self.path / "s").write_bytes(
+            HEADER.pack(OLD_MAGICS[0], 1)
+            + ENTRY.pack(offset, len(key), offset + len(key), len(data))
+            + key
+            + data
+        )
+        snapshot = Snapshot(self.path / "s")
+        self.addCleanup(snapshot.close)
+        self.assertEqual({"0.1": [ReleaseFile("", ">=3.7")]}, snapshot.get("baz"))
+
+    def test_bad_file(self) -> None:
+        (self.path / "empty").write_bytes(b"")
+        with self.assertRaisesRegex(SnapshotError, "is empty"):
+            Snapshot(self.path / "empty")
+        (self.path / "other").write_text("foo==1.0\n")
+        with self.assertRaisesRegex(SnapshotError, "not a bumpreqs snapshot"):
+            Snapshot(self.path / "other")
+
+    def test_fix(self) -> None:
+        write_snapshot(self.path / "s", RELEASES)
+        index = SnapshotIndex(self.path / "s")
+        self.addCleanup(index.snapshot.close)
+        self.assertEqual(
+            'foo.bar==2.0\nfoo.bar==1.0; python_version < "3.9"\nbaz==0.1\nqux\n',
+            fix(
+                "foo.bar\nfoo.bar==0.1 ; python_version < '3.9'\nbaz\nqux\n",
+                index=index,
+            ),
+        )
+        with self.assertRaisesRegex(ProjectNotFound, "qux is not in the snapshot"):
+            index.fetch("qux")
+        # So another index can answer for it instead
+        write_snapshot(self.path / "t", {"qux": RELEASES["Foo.Bar"]})
+        other = SnapshotIndex(self.path / "t")
+        self.addCleanup(other.snapshot.close)
+        self.assertEqual("qux==2.0\n", fix("qux\n", index=MultiIndex([index, other])))
+
+        # 1.0 has no upload time, and 2.0's sdist was uploaded a quarter of a
+        # second after 11:00
+        for when, expected in [
+            ("2021-03-01T11:00:00", "foo.bar\n"),
+            ("2021-03-01T11:00:01", "foo.bar==2.0\n"),
+        ]:
+            self.assertEqual(
+                expected, fix("foo.bar\n", index=index, as_of=upload_timestamp(when))
+            )
+
+    def test_requirement_names(self) -> None:
+        self.assertEqual(
+            ["foo", "Bar", "baz"],
+            requirement_names("foo==1\n# hi\n-e .\nBar>=2\nfoo\nbaz ; os_name=='nt'\n"),
+        )
+
+    def test_cli(self) -> None:
+        runner = CliRunner()
+        output = self.path / "s"
+        reqs = self.path / "requirements.txt"
+        reqs.write_text("foo==1.0\n")
+
+        with FakeIndex(PROJECTS) as fake:
+            result = runner.invoke(
+                main,
+                [
+                    "snapshot",
+                    "--no-cache",
+                    "--index-url",
+                    fake.url + "/pypi/",
+                    "-o",
+                    str(output),
+                    "-r",
+                    str(reqs),
+                    "bar-baz",
+                    "missing",
+                ],
+            )
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn("Skipping missing", result.output)
+        self.assertIn("Wrote 2 projects", result.output)
+
+        result = runner.invoke(main, ["--write", "--snapshot", str(output), str(reqs)])
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertEqual("foo==2.0\n", reqs.read_text())
+
+        result = runner.invoke(main, ["snapshot", "-o", str(output)])
+        self.assertEqual("Provide projects or requirements files\n", result.output)
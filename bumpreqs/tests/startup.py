@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+from typing import Dict, List
+
+# Generous, since it's wall time on whatever machine runs the tests; a typical
+# `bumpreqs --help` imports bumpreqs.cli in well under a third of this.
+IMPORT_BUDGET_US = 250_000
+
+# Only needed once there are requirements to parse, a diff to show, or a
+# request to make.
+HEAVY_MODULES = [
+    "bumpreqs.core",
+    "moreorless",
+    "packaging.markers",
+    "packaging.requirements",
+    "requests",
+    "xmlrpc.client",
+]
+
+ROOT = Path(__file__).parents[2]
+
+
+def import_times(*args: str) -> Dict[str, int]:
+    """Cumulative microseconds by module, from running `bumpreqs *args`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "bumpreqs", *args],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+    )
+    assert proc.returncode == 0, proc.stderr
+    times = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+class StartupTest(unittest.TestCase):
+    def check(self, args: List[str]) -> None:
+        times = import_times(*args)
+        for name in HEAVY_MODULES:
+            self.assertNotIn(name, times)
+        self.assertLess(times["bumpreqs.cli"], IMPORT_BUDGET_US)
+
+    def test_help(self) -> None:
+        self.check(["--help"])
+
+    def test_nothing_to_do(self) -> None:
+        self.check([])
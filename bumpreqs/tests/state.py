@@ -0,0 +1,162 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from ..cache import MetadataCache
+from ..cli import main
+from ..core import fix
+from ..fake_index import FakeIndex
+from ..index import JsonIndex, SimpleIndex
+from ..snapshot import SnapshotIndex, write_snapshot
+from ..state import IncrementalState
+from .index import PROJECTS
+
+TEXT = "foo==1.0\nbar-baz\nfoo==1.0; python_version < '3.8'\nfoo==1.0rc1\n"
+
+
+class IncrementalStateTest(unittest.TestCase):
+    def setUp(self) -> None:
+        td = tempfile.TemporaryDirectory()
+        self.addCleanup(td.cleanup)
+        self.path = Path(td.name)
+        self.fake = FakeIndex(PROJECTS)
+        self.fake.__enter__()
+        self.addCleanup(self.fake.__exit__)
+
+    def fetches(self) -> int:
+        return sum(n for path, n in self.fake.requests.items() if path != "/pypi")
+
+    def test_serials(self) -> None:
+        cache = MetadataCache(self.path, ttl=0)
+        index = JsonIndex(self.fake.url + "/pypi", cache=cache)
+        self.assertIsNone(index.serial("foo"))
+        index.fetch("foo")
+        self.assertEqual(1, index.serial("foo"))
+        uncached = SimpleIndex(self.fake.url + "/simple")
+        uncached.fetch("bar-baz")
+        self.assertEqual(2, uncached.serial("bar_baz"))
+        # Revalidated, and then straight from the cache
+        index.fetch("foo")
+        self.assertEqual(1, index.serial("Foo"))
+        cache.ttl = 600
+        index.fetch("foo")
+        self.assertEqual(1, index.serial("foo"))
+
+    def test_changelog(self) -> None:
+        index = JsonIndex(self.fake.url + "/pypi/")
+        self.assertEqual((2, {}), index.changelog(None))
+        self.assertEqual((2, {"bar-baz": 2}), index.changelog(1))
+        self.fake.update("Foo", {"3.0": [("foo-3.0.tar.gz", None)]})
+        self.fake.update("Foo", {"3.1": [("foo-3.1.tar.gz", None)]})
+        self.assertEqual((4, {"foo": 4}), index.changelog(2))
+        self.assertEqual((4, {}), index.changelog(4))
+
+    def test_no_changelog(self) -> None:
+        self.assertIsNone(SimpleIndex(self.fake.url + "/simple/").changelog(None))
+        with self.assertLogs("bumpreqs.index", "WARNING"):
+            self.assertIsNone(JsonIndex(self.fake.url + "/elsewhere/").changelog(1))
+
+    def test_fix(self) -> None:
+        index = JsonIndex(self.fake.url + "/pypi")
+        expected = (
+            'foo==2.0\nbar-baz==0.1\nfoo==1.2; python_version < "3.8"\nfoo==2.0\n'
+        )
+
+        state = IncrementalState(self.path / "state.json")
+        self.assertEqual(expected, fix(TEXT, index=index, state=state))
+        # foo is fetched once, whatever its python constraint
+        self.assertEqual(2, self.fetches())
+        state.save()
+
+        # Nothing changed, so nothing is fetched
+        state = IncrementalState(self.path / "state.json")
+        self.assertEqual(2, state.serial)
+        self.assertEqual(expected, fix(TEXT, index=index, state=state))
+        self.assertEqual(2, self.fetches())
+        state.save()
+
+        self.fake.update(
+            "foo",
+            {
+                "1.5": [("foo-1.5.tar.gz", None)],
+                "2.0": [("foo-2.0.tar.gz", ">=3.9")],
+                "3.0rc1": [("foo-3.0rc1.tar.gz", None)],
+            },
+        )
+        state = IncrementalState(self.path / "state.json")
+        self.assertEqual(
+            "foo==2.0\nbar-baz==0.1\n"
+            'foo==1.5; python_version < "3.8"\nfoo==3.0rc1\n',
+            fix(TEXT, index=index, state=state),
+        )
+        self.assertEqual(3, self.fetches())
+        self.assertEqual(3, state.serial)
+        self.assertEqual(
+            [("3.0rc1", None), ("2.0", ">=3.9"), ("1.5", None)],
+            state.releases("foo"),
+        )
+
+    def test_fix_with_stale_cache(self) -> None:
+        cache = MetadataCache(self.path / "cache", ttl=600)
+        index = JsonIndex(self.fake.url + "/pypi", cache=cache)
+        index.fetch("foo")
+        self.fake.update("foo", {"3.0": [("foo-3.0.tar.gz", None)]})
+
+        # A fresh cache entry from before the state's serial isn't trusted...
+        state = IncrementalState(self.path / "state.json")
+        self.assertEqual("foo==3.0\n", fix("foo==1.0\n", index=index, state=state))
+        state.save()
+        # ...so what's recorded is current, without the cache.
+        state = IncrementalState(self.path / "state.json")
+        index = JsonIndex(self.fake.url + "/pypi")
+        self.assertEqual("foo==3.0\n", fix("foo==1.0\n", index=index, state=state))
+
+    def test_fix_without_changelog(self) -> None:
+        # Still recorded, but never trusted
+        index = SimpleIndex(self.fake.url + "/simple/")
+        state = IncrementalState(self.path / "state.json")
+        fix(TEXT, index=index, state=state)
+        fix(TEXT, index=index, state=state)
+        self.assertEqual(4, self.fetches())
+        self.assertIsNone(state.serial)
+        self.assertEqual(["bar-baz", "foo"], sorted(state.projects))
+
+        self.assertEqual(set(), state.sync(10, {}))
+
+    def test_fix_from_snapshot(self) -> None:
+        write_snapshot(
+            self.path / "snap", {"foo": JsonIndex(self.fake.url + "/pypi").fetch("foo")}
+        )
+        index = SnapshotIndex(self.path / "snap")
+        self.addCleanup(index.snapshot.close)
+        state = IncrementalState(self.path / "state.json")
+        self.assertEqual("foo==2.0\n", fix("foo\n", index=index, state=state))
+        self.assertEqual({}, state.projects)
+
+    def test_unreadable(self) -> None:
+        (self.path / "state.json").write_text("{")
+        self.assertIsNone(IncrementalState(self.path / "state.json").serial)
+        (self.path / "state.json").write_text('{"version": 0, "serial": 5}')
+        self.assertIsNone(IncrementalState(self.path / "state.json").serial)
+
+    def test_cli(self) -> None:
+        reqs = self.path / "requirements.txt"
+        reqs.write_text("foo==1.0\n")
+        state_file = self.path / "state" / "bumpreqs.json"
+        args = [
+            "--no-cache",
+            "--index-url",
+            self.fake.url + "/pypi/",
+            "--state",
+            str(state_file),
+            str(reqs),
+        ]
+        runner = CliRunner()
+        for _ in range(2):
+            result = runner.invoke(main, args)
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn("+foo==2.0", result.output)
+        self.assertEqual(1, self.fetches())
+        self.assertTrue(state_file.exists())
@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+from typing import Any, Dict, List, Tuple
+
+from .. import stats
+from ..cache import MetadataCache
+from ..core import fix
+from ..fake_index import FakeIndex, FakeProject
+from ..index import JsonIndex
+from ..stats import Stats
+
+PROJECTS: Dict[str, FakeProject] = {
+    "foo": {"1.0": [("foo-1.0.tar.gz", None)]},
+    "bar": {"2.0": [("bar-2.0.tar.gz", ">=3.8")]},
+}
+
+
+class StatsTest(unittest.TestCase):
+    def test_hooks(self) -> None:
+        events: List[Tuple[str, Dict[str, Any]]] = []
+
+        def hook(event: str, data: Dict[str, Any]) -> None:
+            events.append((event, data))
+
+        self.assertFalse(stats.enabled())
+        with stats.timed("nobody"):
+            pass
+
+        stats.add_hook(hook)
+        try:
+            self.assertTrue(stats.enabled())
+            with stats.timed("somebody"):
+                pass
+            stats.emit("retry", url="u", reason=503)
+        finally:
+            stats.remove_hook(hook)
+
+        self.assertEqual(["phase", "retry"], [e for e, d in events])
+        self.assertEqual("somebody", events[0][1]["name"])
+        self.assertFalse(stats.enabled())
+
+    def test_fix(self) -> None:
+        with tempfile.TemporaryDirectory() as d, FakeIndex(PROJECTS) as fake:
+            index = JsonIndex(fake.url + "/pypi", cache=MetadataCache(d))
+            with Stats() as first:
+                self.assertEqual("foo==1.0\nbar==2.0\n", fix("foo\nbar\n", index=index))
+            with Stats() as second:
+                fix("foo\n", index=index)
+
+        data = first.to_json()
+        self.assertEqual({"parse", "fetch", "render", "select"}, set(data["phases"]))
+        self.assertEqual(2, data["fetch"]["count"])
+        self.assertGreater(data["fetch"]["bytes"], 0)
+        self.assertEqual({"hits": 0, "revalidated": 0, "misses": 2}, data["cache"])
+        self.assertEqual("network", data["projects"]["foo"]["source"])
+        self.assertIn("Fetches: 2 projects", first.summary())
+        self.assertNotIn("Cache:", first.summary())
+
+        self.assertEqual(
+            {"hits": 1, "revalidated": 0, "misses": 0}, second.to_json()["cache"]
+        )
+        self.assertIn("(100% hit rate)", second.summary())
+
+    def test_empty(self) -> None:
+        s = Stats()
+        s("retry", {"url": "u", "reason": 500})
+        self.assertEqual(1, s.to_json()["fetch"]["retries"])
+        self.assertIsNone(s.to_json()["fetch"]["p50_s"])
+        self.assertNotIn("latency", s.summary())
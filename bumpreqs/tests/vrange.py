@@ -1,8 +1,49 @@
+import random
 import unittest
+from typing import List
 
 from packaging.specifiers import Specifier, SpecifierSet
-
-from ..vrange import TooComplicated, VersionIntervals
+from packaging.version import Version
+
+from ..vrange import (
+    _compile,
+    compile_specifier,
+    overlaps,
+    TooComplicated,
+    VersionIntervals,
+)
+
+
+def random_versions(rng: random.Random, n: int) -> List[Version]:
+    # Final releases only; the interval model doesn't try to reproduce pep 440's
+    # special cases for pre, post and local versions.
+    return [
+        Version(".".join(str(rng.randrange(5)) for _ in range(rng.randint(1, 3))))
+        for _ in range(n)
+    ]
+
+
+def random_specifier(rng: random.Random) -> str:
+    clauses = []
+    for _ in range(rng.randint(1, 3)):
+        a, b, c = rng.randrange(5), rng.randrange(5), rng.randrange(5)
+        clauses.append(
+            rng.choice(
+                [
+                    f"<{a}.{b}",
+                    f">={a}.{b}",
+                    f"<{a}",
+                    f">={a}.{b}.{c}",
+                    f"=={a}.*",
+                    f"=={a}.{b}.*",
+                    f"!={a}.*",
+                    f"!={a}.{b}.*",
+                    f"=={a}.{b}.{c}",
+                    f"=={a}.{b}",
+                ]
+            )
+        )
+    return ",".join(clauses)
 
 
 class VersionIntervalsTest(unittest.TestCase):
@@ -54,6 +95,64 @@ class VersionIntervalsTest(unittest.TestCase):
         self.assertEqual("NONE", str(c))
         self.assertFalse(c)
 
+    def test_union_overlapping(self) -> None:
+        a = VersionIntervals.from_str(">=1,<3")
+        b = VersionIntervals.from_str(">=2,<4")
+        self.assertEqual(">=1,<4", str(a.union(b)))
+        self.assertEqual(">=2,<3", str(a.intersect(b)))
+        self.assertEqual(str(a), str(a.union(a)))
+        self.assertEqual("NONE", str(VersionIntervals([]).intersect(a)))
+        self.assertEqual(str(a), str(VersionIntervals([]).union(a)))
+
+    def test_contains(self) -> None:
+        a = VersionIntervals.from_str(">=2.6, !=3.0.*, !=3.1.*, !=3.2.*, <4")
+        self.assertFalse(a.contains(Version("2.5")))
+        self.assertTrue(a.contains(Version("2.6")))
+        self.assertFalse(a.contains(Version("3.0")))
+        self.assertFalse(a.contains(Version("3.2.9")))
+        self.assertTrue(a.contains(Version("3.3")))
+        self.assertFalse(a.contains(Version("4")))
+        self.assertFalse(VersionIntervals([]).contains(Version("1")))
+        self.assertTrue(VersionIntervals().contains(Version("1")))
+
+        versions = [Version(v) for v in ["4", "3.3", "2.5", "3.0", "2.7", "3.3"]]
+        self.assertEqual(
+            [Version("3.3"), Version("2.7"), Version("3.3")], a.filter(versions)
+        )
+
+    def test_differential(self) -> None:
+        rng = random.Random(1234)
+        for _ in range(300):
+            spec = random_specifier(rng)
+            try:
+                vi = VersionIntervals.from_str(spec)
+            except TooComplicated:
+                continue
+            ss = SpecifierSet(spec)
+            versions = random_versions(rng, 30)
+            expected = [v for v in versions if ss.contains(v, prereleases=True)]
+            with self.subTest(spec=spec):
+                self.assertEqual(
+                    expected, [v for v in versions if vi.contains(v)], str(vi)
+                )
+                self.assertEqual(expected, vi.filter(versions))
+
+    def test_differential_combine(self) -> None:
+        rng = random.Random(5678)
+        for _ in range(300):
+            s1, s2 = random_specifier(rng), random_specifier(rng)
+            try:
+                a, b = VersionIntervals.from_str(s1), VersionIntervals.from_str(s2)
+            except TooComplicated:
+                continue
+            ss1, ss2 = SpecifierSet(s1), SpecifierSet(s2)
+            for v in random_versions(rng, 30):
+                in1 = ss1.contains(v, prereleases=True)
+                in2 = ss2.contains(v, prereleases=True)
+                with self.subTest(s1=s1, s2=s2, v=v):
+                    self.assertEqual(in1 and in2, a.intersect(b).contains(v))
+                    self.assertEqual(in1 or in2, a.union(b).contains(v))
+
     def test_simplify(self) -> None:
         a = VersionIntervals.from_str("<3.7")
         b = VersionIntervals.from_str(">=3.7,<4")
@@ -70,3 +169,33 @@ class VersionIntervalsTest(unittest.TestCase):
     def test_not_equal_no_star(self) -> None:
         with self.assertRaises(TooComplicated):
             VersionIntervals.from_str("!=1.2.3")
+
+    def test_hash(self) -> None:
+        self.assertEqual(
+            hash(VersionIntervals.from_str(">=3.7")),
+            hash(VersionIntervals.from_str(">=3.7.0")),
+        )
+
+    def test_compile_specifier(self) -> None:
+        a = compile_specifier(">=3.6,<4")
+        self.assertEqual(">=3.6,<4", str(a))
+        self.assertIs(a, compile_specifier(">=3.6,<4"))
+
+        misses = _compile.cache_info().misses
+        with self.assertRaises(TooComplicated):
+            compile_specifier("<=3.6")
+        with self.assertRaises(TooComplicated):
+            compile_specifier("<=3.6")
+        self.assertEqual(misses + 1, _compile.cache_info().misses)
+
+    def test_overlaps(self) -> None:
+        constraint = VersionIntervals.from_str("<3.8")
+        self.assertTrue(overlaps(constraint, ">=3.6"))
+        self.assertFalse(overlaps(constraint, ">=3.8"))
+
+        hits = overlaps.cache_info().hits
+        self.assertFalse(overlaps(VersionIntervals.from_str("<3.8"), ">=3.8"))
+        self.assertEqual(hits + 1, overlaps.cache_info().hits)
+
+        with self.assertRaises(TooComplicated):
+            overlaps(constraint, "~=3.6")
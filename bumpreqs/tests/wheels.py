@@ -0,0 +1,166 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from click.testing import CliRunner
+
+from ..candidates import Candidates
+from ..cli import main
+from ..core import fix, Resolver
+from ..fake_index import FakeIndex
+from ..index import JsonIndex, ReleaseFile
+from ..state import IncrementalState
+from ..wheels import expand_platform, supported_tags, wheel_tags, WheelTargets
+
+X86 = "foo-{}-cp311-cp311-manylinux_2_17_x86_64.manylinux2014_x86_64.whl"
+ARM = "foo-{}-cp311-cp311-manylinux_2_28_aarch64.whl"
+PURE = "foo-{}-py3-none-any.whl"
+SDIST = "foo-{}.tar.gz"
+
+
+def release(version: str, *names: str) -> List[ReleaseFile]:
+    return [ReleaseFile(n.format(version), None) for n in names]
+
+
+class WheelsTest(unittest.TestCase):
+    def test_expand_platform(self) -> None:
+        x86 = expand_platform("manylinux_2_28_x86_64")
+        self.assertEqual("manylinux_2_28_x86_64", x86[0])
+        for p in ("manylinux_2_17_x86_64", "manylinux2014_x86_64", "manylinux1_x86_64"):
+            self.assertIn(p, x86)
+        self.assertEqual("linux_x86_64", x86[-1])
+
+        arm = expand_platform("manylinux2014_aarch64")
+        self.assertEqual(["manylinux_2_17_aarch64", "manylinux2014_aarch64"], arm[:2])
+        self.assertNotIn("manylinux1_aarch64", arm)
+        self.assertNotIn("manylinux_2_18_aarch64", arm)
+
+        self.assertIn("musllinux_1_1_x86_64", expand_platform("musllinux_1_2_x86_64"))
+        self.assertIn("macosx_11_0_universal2", expand_platform("macosx_11_0_arm64"))
+        self.assertEqual(["win_amd64"], expand_platform("win_amd64"))
+
+    def test_supported_tags(self) -> None:
+        tags = supported_tags("manylinux_2_28_aarch64", "3.11")
+        self.assertIsInstance(tags, frozenset)
+        for tag in (
+            "cp311-cp311-manylinux_2_17_aarch64",
+            "cp38-abi3-manylinux2014_aarch64",
+            "py3-none-manylinux_2_28_aarch64",
+            "py3-none-any",
+        ):
+            self.assertIn(tag, tags)
+        self.assertNotIn("cp312-cp312-manylinux_2_17_aarch64", tags)
+        self.assertNotIn("cp311-cp311-manylinux_2_17_x86_64", tags)
+        self.assertNotIn("cp311-cp311-manylinux_2_31_aarch64", tags)
+        self.assertIs(tags, supported_tags("manylinux_2_28_aarch64", "3.11"))
+
+    def test_wheel_tags(self) -> None:
+        self.assertEqual(
+            {
+                "cp311-cp311-manylinux_2_17_x86_64",
+                "cp311-cp311-manylinux2014_x86_64",
+            },
+            wheel_tags(X86.format("1.0")),
+        )
+        self.assertEqual(
+            {"py2-none-any", "py3-none-any"},
+            wheel_tags("foo-1.0-1build-py2.py3-none-any.whl"),
+        )
+        self.assertEqual(frozenset(), wheel_tags(SDIST.format("1.0")))
+        self.assertEqual(frozenset(), wheel_tags("foo-py3-none-any.whl"))
+
+    def test_supports(self) -> None:
+        arm = WheelTargets(["manylinux_2_28_aarch64"], ["3.11"])
+        both = WheelTargets(
+            ["manylinux_2_28_aarch64", "manylinux_2_28_x86_64"], ["3.11"]
+        )
+        self.assertEqual(
+            [("manylinux_2_28_aarch64", "3.11"), ("manylinux_2_28_x86_64", "3.11")],
+            both.targets,
+        )
+        self.assertTrue(arm.supports(release("1.0", SDIST, ARM)))
+        self.assertTrue(arm.supports(release("1.0", PURE)))
+        self.assertFalse(arm.supports(release("1.0", SDIST, X86)))
+        self.assertFalse(both.supports(release("1.0", ARM)))
+        self.assertTrue(both.supports(release("1.0", ARM, SDIST, X86)))
+        self.assertFalse(
+            WheelTargets(["win_amd64"], ["3.12"]).supports(release("1.0", X86))
+        )
+        # Not built for 3.12
+        self.assertFalse(
+            WheelTargets(["manylinux_2_28_aarch64"], ["3.12"]).supports(
+                release("1.0", ARM)
+            )
+        )
+
+    def test_candidates(self) -> None:
+        releases = {
+            "3.0": release("3.0", SDIST, X86),
+            "2.0": release("2.0", SDIST, X86, ARM),
+            "1.5": release("1.5", SDIST),
+            "1.0": release("1.0", PURE),
+        }
+        arm = WheelTargets(["manylinux_2_28_aarch64"], ["3.11"])
+        self.assertEqual("3.0", str(Candidates(releases).latest()))
+        self.assertEqual("2.0", str(Candidates(releases, wheels=arm).latest()))
+        self.assertEqual(
+            ["2.0", "1.0"], [str(v) for v in Candidates(releases, wheels=arm)]
+        )
+        win = WheelTargets(["win_amd64"], ["3.11"])
+        self.assertEqual("1.0", str(Candidates(releases, wheels=win).latest()))
+
+    def test_no_state(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            state = IncrementalState(Path(d) / "state.json")
+            with self.assertRaises(ValueError):
+                Resolver(state=state, wheels=WheelTargets(["win_amd64"], ["3.11"]))
+
+    def test_fix_and_cli(self) -> None:
+        projects: Dict[str, Dict[str, List[Tuple[str, Optional[str]]]]] = {
+            "foo": {
+                "1.0": [(PURE.format("1.0"), None)],
+                "2.0": [(ARM.format("2.0"), None), (SDIST.format("2.0"), None)],
+                "3.0": [(X86.format("3.0"), None), (SDIST.format("3.0"), None)],
+            }
+        }
+        with FakeIndex(projects) as fake:
+            index = JsonIndex(fake.url + "/pypi/")
+            arm = WheelTargets(["manylinux_2_28_aarch64"], ["3.11"])
+            self.assertEqual("foo==3.0\n", fix("foo==1.0\n", index=index))
+            self.assertEqual("foo==2.0\n", fix("foo==1.0\n", index=index, wheels=arm))
+
+            with tempfile.TemporaryDirectory() as d:
+                reqs = Path(d) / "requirements.txt"
+                reqs.write_text("foo==1.0\n")
+                runner = CliRunner()
+                args = ["--no-cache", "--no-daemon", "--index-url", fake.url + "/pypi/"]
+                result = runner.invoke(
+                    main,
+                    [
+                        *args,
+                        "--write",
+                        "--python",
+                        "3.11",
+                        "--require-wheel",
+                        "manylinux_2_28_aarch64",
+                        "--require-wheel",
+                        "win_amd64",
+                        str(reqs),
+                    ],
+                )
+                self.assertEqual(0, result.exit_code, result.output)
+                self.assertEqual("foo==1.0\n", reqs.read_text())
+
+                result = runner.invoke(
+                    main, [*args, "--require-wheel", "win_amd64", str(reqs)]
+                )
+                self.assertEqual(0, result.exit_code, result.output)
+                self.assertNotIn("+foo", result.output)
+
+                result = runner.invoke(
+                    main,
+                    [*args, "--require-wheel", "x", "--state", str(reqs), str(reqs)],
+                )
+                self.assertEqual(2, result.exit_code)
+                self.assertIn("--require-wheel needs filenames", result.output)
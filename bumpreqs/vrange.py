@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+import functools
+from bisect import bisect_right
+
+from typing import Iterable, List, Optional, Tuple
 
 from packaging.specifiers import Specifier, SpecifierSet
 from packaging.version import Version
@@ -17,6 +20,11 @@ MAX = Version("999!1")
 Event = Tuple[Version, int]
 EventList = List[Event]
 
+# A project has thousands of releases but only a handful of distinct
+# requires_python strings, so these comfortably hold a whole run.
+COMPILE_CACHE_SIZE = 4096
+OVERLAP_CACHE_SIZE = 16384
+
 
 class TooComplicated(Exception):
     pass
@@ -25,16 +33,29 @@ class TooComplicated(Exception):
 class VersionIntervals:
     """
     Envision version constraints as intervals on a line.
+
+    These are stored as a sorted list of boundaries, alternating between the
+    (inclusive) start and (exclusive) end of each interval, so membership is a
+    bisect and combining two of them is a single merge pass.
     """
 
+    __slots__ = ("_bounds",)
+
     def __init__(self, events: Optional[EventList] = None) -> None:
         if events is not None:
-            self._events = events[:]
+            self._bounds = [v for v, ev in events]
         else:
-            self._events = [
-                (MIN, IN),
-                (MAX, OUT),
-            ]
+            self._bounds = [MIN, MAX]
+
+    @classmethod
+    def _from_bounds(cls, bounds: List[Version]) -> VersionIntervals:
+        t = cls.__new__(cls)
+        t._bounds = bounds
+        return t
+
+    @property
+    def _events(self) -> EventList:
+        return [(v, OUT if i % 2 else IN) for i, v in enumerate(self._bounds)]
 
     @classmethod
     def from_specifier(cls, specifier: Specifier) -> VersionIntervals:
@@ -105,61 +126,75 @@ class VersionIntervals:
         else:
             raise TooComplicated(specifier.operator)
 
-        self._events = self._intersect(self._events + tmp)
+        self._bounds = self._merge(self._bounds, [v for v, ev in tmp], 2)
 
         return self
 
-    def intersect(self, other: VersionIntervals) -> VersionIntervals:
-        t = VersionIntervals(
-            self._intersect(self._events + other._events),
-        )
-        return t
-
-    @classmethod
-    def _intersect(self, other: EventList) -> EventList:
-        new_events: EventList = []
-        state = 0
-        # Need "OUT" handled before "IN"
-        for v, ev in sorted(other, key=lambda i: (i[0], i[1])):
-            old_state = state
-            state += ev
-            if state == 2:
-                new_events.append((v, ev))
-            elif old_state == 2:
-                new_events.append((v, ev))
+    def contains(self, version: Version) -> bool:
+        # An odd number of boundaries at or below `version` means we stopped
+        # inside an interval.
+        return bisect_right(self._bounds, version) % 2 == 1
+
+    def filter(self, versions: Iterable[Version]) -> List[Version]:
+        """
+        The members of `versions` that are contained, in their original order.
+
+        This sorts them once and walks the boundaries alongside, rather than
+        doing a separate search per version.
+        """
+        vs = list(versions)
+        keep = [False] * len(vs)
+        bounds = self._bounds
+        k = 0
+        for i in sorted(range(len(vs)), key=vs.__getitem__):
+            while k < len(bounds) and bounds[k] <= vs[i]:
+                k += 1
+            keep[i] = k % 2 == 1
+        return [v for v, ok in zip(vs, keep) if ok]
 
-        assert state == 0
-        return new_events
+    def intersect(self, other: VersionIntervals) -> VersionIntervals:
+        return self._from_bounds(self._merge(self._bounds, other._bounds, 2))
 
     def union(self, other: VersionIntervals) -> VersionIntervals:
-        t = VersionIntervals(
-            self._union(self._events + other._events),
-        )
-        return t
-
-    @classmethod
-    def _union(self, other: EventList) -> EventList:
-        new_events: EventList = []
+        return self._from_bounds(self._merge(self._bounds, other._bounds, 1))
+
+    @staticmethod
+    def _merge(a: List[Version], b: List[Version], depth: int) -> List[Version]:
+        """
+        Sweeps the boundaries of `a` and `b` in order, keeping the places where
+        the number of intervals we're inside crosses `depth` (2 for
+        intersection, 1 for union).
+        """
+        new_bounds: List[Version] = []
         state = 0
-        # Need "OUT" handled before "IN"
-        for v, ev in sorted(other, key=lambda i: (i[0], i[1])):
+        i = j = 0
+        while i < len(a) or j < len(b):
+            # Need "OUT" handled before "IN"
+            if j == len(b) or (
+                i < len(a)
+                and (a[i] < b[j] or (a[i] == b[j] and i % 2 == 1 and j % 2 == 0))
+            ):
+                v, ev = a[i], OUT if i % 2 else IN
+                i += 1
+            else:
+                v, ev = b[j], OUT if j % 2 else IN
+                j += 1
+
             old_state = state
             state += ev
-            if state >= 1:
-                if new_events and new_events[-1] == (v, -ev):
-                    del new_events[-1]
+            if (ev == IN and state == depth) or (ev == OUT and old_state == depth):
+                if ev == IN and new_bounds and new_bounds[-1] == v:
+                    # [x, v) followed by [v, y) is just [x, y)
+                    del new_bounds[-1]
                 else:
-                    new_events.append((v, ev))
-            elif old_state >= 1:
-                new_events.append((v, ev))
+                    new_bounds.append(v)
 
-        assert state == 0
-        return new_events
+        return new_bounds
 
     def __str__(self) -> str:
         buf: List[str] = []
 
-        if self._events == []:
+        if not self._bounds:
             return "NONE"
 
         for v, ev in self._events:
@@ -176,7 +211,37 @@ class VersionIntervals:
         return ",".join(buf)
 
     def __eq__(self, other: object) -> bool:
-        return isinstance(other, VersionIntervals) and self._events == other._events
+        return isinstance(other, VersionIntervals) and self._bounds == other._bounds
+
+    def __hash__(self) -> int:
+        return hash(tuple(self._bounds))
 
     def __bool__(self) -> bool:
-        return bool(self._events)
+        return bool(self._bounds)
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _compile(s: str) -> Optional[VersionIntervals]:
+    try:
+        return VersionIntervals.from_str(s)
+    except TooComplicated:
+        return None
+
+
+def compile_specifier(s: str) -> VersionIntervals:
+    """
+    Like `VersionIntervals.from_str` but memoized, so the result is shared and
+    must not be modified.
+    """
+    vi = _compile(s)
+    if vi is None:
+        raise TooComplicated(s)
+    return vi
+
+
+@functools.lru_cache(maxsize=OVERLAP_CACHE_SIZE)
+def overlaps(constraint: VersionIntervals, requires_python: str) -> bool:
+    """
+    Whether any python in `constraint` satisfies `requires_python`.
+    """
+    return bool(constraint.intersect(compile_specifier(requires_python)))
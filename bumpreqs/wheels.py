@@ -0,0 +1,132 @@
+"""
+Whether a release ships a wheel that installs on the platforms we deploy to,
+for `--require-wheel`.
+"""
+
+import functools
+import itertools
+import re
+from typing import FrozenSet, List, Sequence
+
+from packaging.tags import compatible_tags, cpython_tags, mac_platforms
+
+from .index import ReleaseFile
+
+# The manylinux names from before PEP 600, and the glibc they stand for
+LEGACY_MANYLINUX = {"manylinux1": 5, "manylinux2010": 12, "manylinux2014": 17}
+# ...and the architectures each was defined for
+LEGACY_MANYLINUX_ARCHS = {
+    "manylinux1": {"x86_64", "i686"},
+    "manylinux2010": {"x86_64", "i686"},
+    "manylinux2014": {"x86_64", "i686", "aarch64", "ppc64", "ppc64le", "s390x"},
+}
+
+PERENNIAL_RE = re.compile(r"^(?P<libc>manylinux|musllinux)_(\d+)_(\d+)_(?P<arch>.+)$")
+LEGACY_RE = re.compile(r"^(?P<name>manylinux(?:1|2010|2014))_(?P<arch>.+)$")
+MACOSX_RE = re.compile(r"^macosx_(\d+)_(\d+)_(?P<arch>.+)$")
+
+# Distinct tag triples seen in wheel filenames; projects with thousands of
+# files use only a handful between them.
+TAG_CACHE_SIZE = 4096
+
+
+class WheelTargets:
+    """
+    Platforms (like "manylinux_2_28_aarch64" or "win_amd64") and CPython
+    versions (like "3.11"), every combination of which a release must have a
+    wheel for.
+
+    The tags each combination accepts are worked out once, as a frozenset of
+    strings, so checking a file is a few set lookups.
+    """
+
+    def __init__(self, platforms: Sequence[str], pythons: Sequence[str]) -> None:
+        self.targets = [(p, py) for p in platforms for py in pythons]
+        self._supported = [supported_tags(p, py) for p, py in self.targets]
+
+    def supports(self, files: Sequence[ReleaseFile]) -> bool:
+        """Whether `files` include a wheel for every target."""
+        missing = list(self._supported)
+        for f in files:
+            tags = wheel_tags(f.filename)
+            if tags:
+                missing = [s for s in missing if s.isdisjoint(tags)]
+                if not missing:
+                    return True
+        return not missing
+
+
+@functools.lru_cache(maxsize=None)
+def supported_tags(platform: str, python: str) -> FrozenSet[str]:
+    """
+    Every tag, as "interpreter-abi-platform", that pip on this CPython and
+    platform would install, in no particular order.
+    """
+    version = tuple(int(x) for x in python.split(".")[:2])
+    platforms = expand_platform(platform)
+    interpreter = f"cp{version[0]}{version[1]}"
+    return frozenset(
+        str(t)
+        for t in itertools.chain(
+            cpython_tags(version, platforms=platforms),
+            compatible_tags(version, interpreter, platforms),
+        )
+    )
+
+
+def expand_platform(platform: str) -> List[str]:
+    """
+    `platform` and the older platform tags that it can also install, such as
+    manylinux_2_17_x86_64 (and manylinux2014_x86_64) for manylinux_2_28_x86_64.
+    """
+    m = LEGACY_RE.match(platform)
+    if m:
+        name = m.group("name")
+        platform = f"manylinux_2_{LEGACY_MANYLINUX[name]}_{m.group('arch')}"
+
+    m = PERENNIAL_RE.match(platform)
+    if m:
+        libc, major, minor, arch = m.group("libc", 2, 3, "arch")
+        expanded = []
+        for i in range(int(minor), -1, -1):
+            expanded.append(f"{libc}_{major}_{i}_{arch}")
+            for name, glibc in LEGACY_MANYLINUX.items():
+                if (
+                    libc == "manylinux"
+                    and major == "2"
+                    and glibc == i
+                    and arch in LEGACY_MANYLINUX_ARCHS[name]
+                ):
+                    expanded.append(f"{name}_{arch}")
+        # What pip itself would build there, for indexes other than pypi
+        expanded.append(f"linux_{arch}")
+        return expanded
+
+    m = MACOSX_RE.match(platform)
+    if m:
+        return list(mac_platforms((int(m.group(1)), int(m.group(2))), m.group("arch")))
+
+    return [platform]
+
+
+def wheel_tags(filename: str) -> FrozenSet[str]:
+    """The tags a wheel filename claims, or none if it isn't one."""
+    if not filename.endswith(".whl"):
+        return frozenset()
+    parts = filename[:-4].split("-")
+    # name-version[-build]-python-abi-platform
+    if len(parts) not in (5, 6):
+        return frozenset()
+    python, abi, platform = parts[-3:]
+    return _expand_tags(python, abi, platform)
+
+
+@functools.lru_cache(maxsize=TAG_CACHE_SIZE)
+def _expand_tags(python: str, abi: str, platform: str) -> FrozenSet[str]:
+    # "cp311.cp312" and friends are compressed sets of tags
+    return frozenset(
+        f"{i}-{a}-{p}"
+        for i in python.split(".")
+        for a in abi.split(".")
+        for p in platform.split(".")
+    )